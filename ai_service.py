@@ -1,42 +1,461 @@
 import requests
+import asyncio
 import json
+import random
+import threading
+import time
+import database
+import context_builder
+import limits
+import metrics
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only needed for the ASGI serving mode
+    httpx = None
 
 OPENROUTER_API_KEY = ""
 API_URL = "https://openrouter.ai/api/v1/chat/completions"
 MODEL = "x-ai/grok-4.1-fast:free"
 
-def generate_mood_insight(mood_data, journal_entries):
+# Seconds to establish the TCP/TLS connection; read timeouts are set per call
+CONNECT_TIMEOUT = 3.05
+
+# Keep-alive connections held open to the upstream per process
+POOL_SIZE = 16
+
+# Concurrent upstream connections for the async client (ASGI mode)
+ASYNC_POOL_SIZE = 256
+
+# Retries on 429/5xx and on failures to connect, with full-jitter exponential
+# backoff. A read timeout is not retried: the upstream may already be running
+# (and billing) the non-idempotent completion.
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Canned replies for when the upstream is down or a call is shed
+FALLBACK_SUGGESTION = "Take a moment to breathe deeply. You're doing great by checking in with yourself."
+FALLBACK_JOURNAL_RESPONSE = "I appreciate you opening up. Remember, you're not alone in this journey."
+FALLBACK_INSIGHT = "I'm having trouble connecting right now, but I'm here for you. Your feelings are valid, and taking time to reflect is a powerful step toward well-being."
+
+# Suggestion cache: distinct (mood_type, intensity) keys kept, variants rotated
+# per key, variant lifetime in seconds, and whether variants persist to SQLite
+SUGGESTION_CACHE_SIZE = 256
+SUGGESTION_VARIANTS = 4
+SUGGESTION_TTL = 6 * 3600
+SUGGESTION_CACHE_PERSIST = True
+SUGGESTION_REFILL_WORKERS = 2
+
+# Mood types offered by the mood picker. Only these are cached (with intensity
+# clamped to 1-10), so client-supplied strings can't mint unbounded keys, each
+# with its own upstream refills and suggestion_cache rows.
+SUGGESTION_MOOD_TYPES = frozenset({'happy', 'calm', 'energetic', 'sad', 'anxious', 'angry', 'tired', 'neutral'})
+
+class AIUnavailableError(requests.exceptions.RequestException):
+    """Raised when the upstream is considered unhealthy and the call was not made
+    (circuit open) or every retry failed."""
+
+class AIOverloadedError(AIUnavailableError):
+    """Raised when admission control (see limits.py) sheds a call before it is
+    made; callers fall back to their canned replies, as for an outage."""
+
+def _shed(limit):
+    metrics.llm_shed.inc(limit)
+    raise AIOverloadedError(f"AI upstream {limit} limit reached")
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after a cool-down"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go upstream now; only one trial call while half-open"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+_STREAM_DONE = object()
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential delay in seconds, honouring a numeric Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after and str(retry_after).isdigit():
+        delay = max(delay, min(BACKOFF_MAX, float(retry_after)))
+    return delay
+
+def parse_stream_line(line):
     """
-    Generate personalized insights based on mood data and journal entries
-    
-    Args:
-        mood_data: List of recent mood entries
-        journal_entries: List of recent journal entries
-    
-    Returns:
-        str: AI-generated insight
+    Decode one line of an OpenRouter SSE stream
+
+    Returns the content delta (or None for keep-alives and empty deltas),
+    or _STREAM_DONE at the end of the stream.
     """
-    # Prepare context from mood data
-    mood_summary = []
-    for mood in mood_data[:5]:  # Last 5 moods
-        mood_summary.append(f"{mood['mood_type']} (intensity: {mood['intensity']}/10)")
-    
-    # Prepare context from journal entries
-    journal_summary = []
-    for entry in journal_entries[:3]:  # Last 3 entries
-        # Truncate long entries
-        content = entry['content'][:200] + "..." if len(entry['content']) > 200 else entry['content']
-        journal_summary.append(content)
+    # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments
+    if not line or not line.startswith('data:'):
+        return None
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return _STREAM_DONE
+    chunk = json.loads(data)
+    if 'error' in chunk:
+        raise AIUnavailableError(f"AI upstream stream error: {chunk['error']}")
+    choices = chunk.get('choices') or []
+    if choices:
+        return (choices[0].get('delta') or {}).get('content') or None
+    return None
+
+class AIClient:
+    """OpenRouter chat client sharing one keep-alive session per process"""
+
+    def __init__(self, api_url=API_URL, api_key=None, model=MODEL, pool_size=POOL_SIZE,
+                 max_retries=MAX_RETRIES, connect_timeout=CONNECT_TIMEOUT, breaker=None, limiter=None):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.limiter = limiter or limits.upstream
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _headers(self):
+        # Read the module key at call time so it can be configured after import
+        api_key = self.api_key if self.api_key is not None else OPENROUTER_API_KEY
+        headers = {"Content-Type": "application/json"}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    @contextmanager
+    def _slot(self):
+        """Hold a concurrency slot for one upstream call and admit it against
+        the global budget; raises AIOverloadedError when shed. The slot comes
+        first so a call refused one never spends a global token."""
+        if not self.limiter.acquire():
+            _shed('concurrency')
+        try:
+            allowed, _ = limits.global_llm.acquire()
+            if not allowed:
+                _shed('global')
+            yield
+        finally:
+            self.limiter.release()
+
+    def _post(self, body, read_timeout, stream=False):
+        """POST with retries (see _post_with_retries), recording latency and outcome"""
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = self._post_with_retries(body, read_timeout, stream)
+            outcome = 'ok'
+            return response
+        finally:
+            metrics.llm_latency.observe(time.perf_counter() - start, 'sync', str(stream).lower(), outcome)
+
+    def _post_with_retries(self, body, read_timeout, stream=False):
+        """
+        POST a request body with retries and return the successful response
+
+        Raises:
+            AIUnavailableError: circuit open, a read timeout or other error after
+                the request was sent, or retries exhausted on 429/5xx/connect errors
+            requests.exceptions.HTTPError: non-retryable 4xx response
+        """
+        if not self.breaker.allow():
+            metrics.llm_errors.inc('circuit_open')
+            raise AIUnavailableError("AI upstream circuit is open")
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                response = getattr(last_error, 'response', None)
+                retry_after = response.headers.get('Retry-After') if response is not None else None
+                time.sleep(backoff_delay(attempt - 1, retry_after))
+            try:
+                response = self.session.post(
+                    url=self.api_url,
+                    headers=self._headers(),
+                    data=json.dumps(body),
+                    timeout=(self.connect_timeout, read_timeout),
+                    stream=stream
+                )
+            except requests.exceptions.ConnectionError as e:
+                # Includes ConnectTimeout: nothing reached the upstream yet
+                metrics.llm_errors.inc('network')
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                metrics.llm_errors.inc('network')
+                self.breaker.record_failure()
+                raise AIUnavailableError(f"AI upstream unavailable: {e}") from e
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                metrics.llm_errors.inc(f'status_{response.status_code}')
+                last_error = requests.exceptions.HTTPError(
+                    f"{response.status_code} from AI upstream", response=response
+                )
+                response.close()
+                continue
+
+            # Client errors say nothing about upstream health, so they still
+            # count as a successful round trip for the breaker
+            self.breaker.record_success()
+            if response.status_code >= 400:
+                metrics.llm_errors.inc(f'status_{response.status_code}')
+            response.raise_for_status()
+            return response
+
+        self.breaker.record_failure()
+        metrics.llm_errors.inc('unavailable')
+        raise AIUnavailableError(f"AI upstream unavailable: {last_error}") from last_error
+
+    def _body(self, messages, options):
+        body = {"model": self.model, "messages": messages, "reasoning": {"enabled": True}}
+        body.update(options)
+        return body
+
+    def chat(self, messages, read_timeout=30, **options):
+        """Send a chat completion request and return the decoded JSON body"""
+        with self._slot():
+            return self._post(self._body(messages, options), read_timeout).json()
+
+    def stream_chat(self, messages, read_timeout=30, **options):
+        """
+        Send a streaming chat completion request and yield content deltas as
+        they arrive. Retries only apply before the first byte; a failure
+        mid-stream propagates to the caller.
+        """
+        options["stream"] = True
+        # The slot is held until the stream ends, not just to its first byte
+        with self._slot():
+            response = self._post(self._body(messages, options), read_timeout, stream=True)
+            response.encoding = 'utf-8'
+
+            try:
+                # chunk_size=None hands over each network chunk as soon as it lands
+                for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                    delta = parse_stream_line(line)
+                    if delta is _STREAM_DONE:
+                        break
+                    if delta:
+                        yield delta
+            finally:
+                response.close()
+
+# Shared by every call in this process so connections are reused
+client = AIClient()
+
+@metrics.registry.collector
+def collect_metrics():
+    """Circuit breaker state, read at scrape time"""
+    state = client.breaker.state
+    return [('mindi_llm_circuit_state', 'gauge', 'Upstream circuit breaker state (1 = current)', ('state',),
+             [((name,), int(name == state)) for name in ('closed', 'half-open', 'open')])]
+
+class AsyncAIClient:
+    """
+    asyncio counterpart of AIClient for the ASGI serving mode (asgi.py)
+
+    Uses an httpx.AsyncClient so an in-flight upstream call costs a coroutine
+    rather than an OS thread. Shares the sync client's circuit breaker and
+    concurrency limiter so both paths agree on upstream health and load.
+    """
+
+    def __init__(self, api_url=API_URL, api_key=None, model=MODEL, pool_size=ASYNC_POOL_SIZE,
+                 max_retries=MAX_RETRIES, connect_timeout=CONNECT_TIMEOUT, breaker=None, limiter=None):
+        if httpx is None:
+            raise RuntimeError("httpx is required for the async AI client")
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or client.breaker
+        self.limiter = limiter or client.limiter
+        self._http = None
+
+    _headers = AIClient._headers
+    _body = AIClient._body
+
+    def _client(self):
+        # Created lazily so it binds to the event loop that first uses it
+        if self._http is None:
+            self._http = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.pool_size, max_keepalive_connections=self.pool_size
+            ))
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Async counterpart of AIClient._slot"""
+        if not await self.limiter.acquire_async():
+            _shed('concurrency')
+        try:
+            if limits.global_llm.blocking:
+                allowed, _ = await asyncio.to_thread(limits.global_llm.acquire)
+            else:
+                allowed, _ = limits.global_llm.acquire()
+            if not allowed:
+                _shed('global')
+            yield
+        finally:
+            self.limiter.release()
+
+    async def _send(self, body, read_timeout, stream=False):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            response = await self._send_with_retries(body, read_timeout, stream)
+            outcome = 'ok'
+            return response
+        finally:
+            metrics.llm_latency.observe(time.perf_counter() - start, 'async', str(stream).lower(), outcome)
+
+    async def _send_with_retries(self, body, read_timeout, stream=False):
+        if not self.breaker.allow():
+            metrics.llm_errors.inc('circuit_open')
+            raise AIUnavailableError("AI upstream circuit is open")
+
+        http = self._client()
+        last_error = None
+        retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(backoff_delay(attempt - 1, retry_after))
+            request = http.build_request(
+                'POST', self.api_url, headers=self._headers(), content=json.dumps(body),
+                timeout=httpx.Timeout(read_timeout, connect=self.connect_timeout)
+            )
+            try:
+                response = await http.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                metrics.llm_errors.inc('network')
+                last_error = e
+                retry_after = None
+                continue
+            except httpx.TransportError as e:
+                metrics.llm_errors.inc('network')
+                self.breaker.record_failure()
+                raise AIUnavailableError(f"AI upstream unavailable: {e}") from e
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                metrics.llm_errors.inc(f'status_{response.status_code}')
+                last_error = f"{response.status_code} from AI upstream"
+                retry_after = response.headers.get('Retry-After')
+                await response.aclose()
+                continue
+
+            self.breaker.record_success()
+            if response.is_error:
+                metrics.llm_errors.inc(f'status_{response.status_code}')
+                await response.aclose()
+                raise requests.exceptions.HTTPError(f"{response.status_code} from AI upstream")
+            return response
+
+        self.breaker.record_failure()
+        metrics.llm_errors.inc('unavailable')
+        raise AIUnavailableError(f"AI upstream unavailable: {last_error}")
+
+    async def chat(self, messages, read_timeout=30, **options):
+        """Send a chat completion request and return the decoded JSON body"""
+        async with self._slot():
+            response = await self._send(self._body(messages, options), read_timeout)
+            return response.json()
+
+    async def stream_chat(self, messages, read_timeout=30, **options):
+        """Async generator of content deltas from a streamed completion"""
+        options["stream"] = True
+        async with self._slot():
+            response = await self._send(self._body(messages, options), read_timeout, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    delta = parse_stream_line(line)
+                    if delta is _STREAM_DONE:
+                        break
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+
+async_client = AsyncAIClient() if httpx is not None else None
+
+def build_insight_prompt(mood_data, journal_entries, history_summary=None):
+    """Build the insight prompt from recent moods, journal entries and the
+    user's long-term summary, each section fitted to its token budget"""
+    sections = context_builder.insight_sections(mood_data, journal_entries, history_summary)
+    journal_summary = sections['journal_entries']
+    history = f"\nLonger-term patterns: {sections['summary']}\n" if sections['summary'] else ''
+    related = ''.join(f"\n- {entry}" for entry in sections['related_entries'])
+    related = f"\nRelated Earlier Entries:{related}\n" if related else ''
     
     # Create prompt for AI
     prompt = f"""You are Mindi, an empathetic AI mental health companion. Analyze the user's recent emotional patterns and provide supportive, actionable insights.
 
-Recent Moods: {', '.join(mood_summary) if mood_summary else 'No recent mood data'}
-
+Recent Moods: {sections['moods'] or 'No recent mood data'}
+{history}
 Recent Journal Entries:
 {chr(10).join(f"- {entry}" for entry in journal_summary) if journal_summary else 'No recent journal entries'}
-
+{related}
 Provide a warm, empathetic insight that:
 1. Acknowledges their emotional patterns
 2. Highlights any positive trends or strengths
@@ -44,42 +463,62 @@ Provide a warm, empathetic insight that:
 4. Keeps the tone supportive and non-judgmental
 
 Keep your response concise (2-3 paragraphs) and personal."""
+    context_builder.metrics.record_prompt('insight', [{"content": prompt}], sections['stats'])
+    return prompt
+
+def generate_mood_insight(mood_data, journal_entries, history_summary=None):
+    """
+    Generate personalized insights based on mood data and journal entries
+    
+    Args:
+        mood_data: List of recent mood entries
+        journal_entries: List of recent journal entries
+        history_summary: Optional rolling summary of the user's older history
+    
+    Returns:
+        tuple: (insight text, generated), where generated is False when the
+        upstream failed and the text is the canned FALLBACK_INSIGHT, which
+        must not be stored as the insight for this context
+    """
+    prompt = build_insight_prompt(mood_data, journal_entries, history_summary)
 
     try:
-        response = requests.post(
-            url=API_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            data=json.dumps({
-                "model": MODEL,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "reasoning": {"enabled": True}
-            }),
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'choices' in result and len(result['choices']) > 0:
-            insight = result['choices'][0]['message'].get('content', '')
-            return insight
-        else:
-            return "I'm here to support you on your journey. Keep tracking your moods and journaling - every entry helps build a clearer picture of your emotional well-being."
+        result = client.chat([{"role": "user", "content": prompt}], read_timeout=30)
+        context_builder.metrics.record_usage('insight', result.get('usage'))
+        return _insight_from_result(result)
             
     except requests.exceptions.RequestException as e:
         print(f"Error calling OpenRouter API: {e}")
-        return "I'm having trouble connecting right now, but I'm here for you. Your feelings are valid, and taking time to reflect is a powerful step toward well-being."
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return "Thank you for sharing your thoughts. Remember, emotional well-being is a journey, and you're doing great by staying mindful of your feelings."
+    return FALLBACK_INSIGHT, False
+
+def _insight_from_result(result):
+    """The (text, generated) pair for a chat completion; an empty one counts as failed"""
+    if result.get('choices'):
+        insight = result['choices'][0]['message'].get('content') or ''
+        if insight.strip():
+            return insight, True
+    return FALLBACK_INSIGHT, False
+
+def build_journal_messages(entry_content, conversation_history=None):
+    """Build the chat messages asking for a response to a journal entry.
+    Only the most recent history that fits its token budget is kept, and the
+    caller's history list is left untouched."""
+    sections = context_builder.journal_sections(entry_content, conversation_history)
+    messages = list(sections['history'])
+    
+    messages.append({
+        "role": "user",
+        "content": f"""As Mindi, an empathetic mental health companion, respond to this journal entry with warmth and understanding:
+
+"{sections['entry']}"
+
+Provide a supportive response that validates their feelings and offers gentle encouragement. Keep it brief and personal (2-3 sentences)."""
+    })
+    
+    context_builder.metrics.record_prompt('journal', messages, sections['stats'])
+    return messages
 
 def analyze_journal_entry(entry_content, conversation_history=None):
     """
@@ -92,37 +531,11 @@ def analyze_journal_entry(entry_content, conversation_history=None):
     Returns:
         dict: Contains 'response' and 'reasoning_details' for context preservation
     """
-    messages = []
-    
-    if conversation_history:
-        messages = conversation_history
-    
-    messages.append({
-        "role": "user",
-        "content": f"""As Mindi, an empathetic mental health companion, respond to this journal entry with warmth and understanding:
-
-"{entry_content}"
-
-Provide a supportive response that validates their feelings and offers gentle encouragement. Keep it brief and personal (2-3 sentences)."""
-    })
+    messages = build_journal_messages(entry_content, conversation_history)
     
     try:
-        response = requests.post(
-            url=API_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            data=json.dumps({
-                "model": MODEL,
-                "messages": messages,
-                "reasoning": {"enabled": True}
-            }),
-            timeout=30
-        )
-        
-        response.raise_for_status()
-        result = response.json()
+        result = client.chat(messages, read_timeout=30)
+        context_builder.metrics.record_usage('journal', result.get('usage'))
         
         if 'choices' in result and len(result['choices']) > 0:
             message = result['choices'][0]['message']
@@ -139,10 +552,295 @@ Provide a supportive response that validates their feelings and offers gentle en
     except Exception as e:
         print(f"Error analyzing journal entry: {e}")
         return {
-            'response': "I appreciate you opening up. Remember, you're not alone in this journey.",
+            'response': FALLBACK_JOURNAL_RESPONSE,
             'reasoning_details': None
         }
 
+# ===================================
+# Streaming Responses
+# ===================================
+
+def _stream_with_fallback(messages, fallback, read_timeout=30, outcome=None):
+    """Relay deltas from the upstream; if nothing was sent before a failure,
+    send the canned fallback instead so the client always gets a reply.
+    outcome['failed'] is set when the reply is the fallback or was cut short."""
+    sent = False
+    failed = False
+    try:
+        for delta in client.stream_chat(messages, read_timeout=read_timeout):
+            sent = True
+            yield delta
+    except Exception as e:
+        print(f"Error streaming from OpenRouter API: {e}")
+        failed = True
+    if not sent:
+        failed = True
+        yield fallback
+    if outcome is not None:
+        outcome['failed'] = failed
+
+def stream_mood_insight(mood_data, journal_entries, history_summary=None, outcome=None):
+    """
+    Stream a personalized insight as it is generated
+
+    Once the stream is exhausted, outcome['failed'] (if a dict is passed)
+    tells whether the text is FALLBACK_INSIGHT or was cut short, and so must
+    not be stored as the insight for this context.
+
+    Yields:
+        str: successive pieces of the insight text
+    """
+    prompt = build_insight_prompt(mood_data, journal_entries, history_summary)
+    return _stream_with_fallback([{"role": "user", "content": prompt}], FALLBACK_INSIGHT, outcome=outcome)
+
+def stream_journal_analysis(entry_content, conversation_history=None):
+    """
+    Stream an empathetic response to a journal entry as it is generated
+
+    Yields:
+        str: successive pieces of the response text
+    """
+    return _stream_with_fallback(
+        build_journal_messages(entry_content, conversation_history),
+        FALLBACK_JOURNAL_RESPONSE
+    )
+
+# ===================================
+# Async Variants (ASGI mode)
+# ===================================
+
+async def generate_mood_insight_async(mood_data, journal_entries, history_summary=None):
+    """Coroutine version of generate_mood_insight using the async client"""
+    prompt = build_insight_prompt(mood_data, journal_entries, history_summary)
+
+    try:
+        result = await async_client.chat([{"role": "user", "content": prompt}], read_timeout=30)
+        context_builder.metrics.record_usage('insight', result.get('usage'))
+        return _insight_from_result(result)
+            
+    except requests.exceptions.RequestException as e:
+        print(f"Error calling OpenRouter API: {e}")
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+    return FALLBACK_INSIGHT, False
+
+async def _stream_with_fallback_async(messages, fallback, read_timeout=30, outcome=None):
+    """Async counterpart of _stream_with_fallback"""
+    sent = False
+    failed = False
+    try:
+        async for delta in async_client.stream_chat(messages, read_timeout=read_timeout):
+            sent = True
+            yield delta
+    except Exception as e:
+        print(f"Error streaming from OpenRouter API: {e}")
+        failed = True
+    if not sent:
+        failed = True
+        yield fallback
+    if outcome is not None:
+        outcome['failed'] = failed
+
+def stream_mood_insight_async(mood_data, journal_entries, history_summary=None, outcome=None):
+    """Async generator version of stream_mood_insight"""
+    prompt = build_insight_prompt(mood_data, journal_entries, history_summary)
+    return _stream_with_fallback_async([{"role": "user", "content": prompt}], FALLBACK_INSIGHT, outcome=outcome)
+
+def stream_journal_analysis_async(entry_content, conversation_history=None):
+    """Async generator version of stream_journal_analysis"""
+    return _stream_with_fallback_async(
+        build_journal_messages(entry_content, conversation_history),
+        FALLBACK_JOURNAL_RESPONSE
+    )
+
+# ===================================
+# Suggestion Cache
+# ===================================
+
+class SuggestionCache:
+    """
+    LRU + TTL cache of suggestions keyed on (mood_type, intensity)
+
+    Each key holds up to `variants` distinct responses which are served in
+    rotation so repeat check-ins don't see the same sentence. When `persist`
+    is set, variants are also written to SQLite so they survive restarts and
+    are shared between worker processes.
+    """
+
+    def __init__(self, max_keys=SUGGESTION_CACHE_SIZE, variants=SUGGESTION_VARIANTS,
+                 ttl=SUGGESTION_TTL, persist=SUGGESTION_CACHE_PERSIST):
+        self.max_keys = max_keys
+        self.variants = variants
+        self.ttl = ttl
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self._entries = OrderedDict()   # key -> list of (text, created_at)
+        self._rotation = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        """Unexpired variants for a key (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        variants = [v for v in self._entries.get(key, []) if v[1] >= cutoff]
+        if variants:
+            self._entries[key] = variants
+        else:
+            self._entries.pop(key, None)
+        return variants
+
+    def get(self, key):
+        """Next cached variant for a key, or None on a miss"""
+        with self._lock:
+            variants = self._live(key)
+
+        if not variants and self.persist:
+            self._load(key)
+            with self._lock:
+                variants = self._live(key)
+
+        with self._lock:
+            metrics.record_cache('suggestions', bool(variants))
+            if not variants:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            index = self._rotation.get(key, 0) % len(variants)
+            self._rotation[key] = index + 1
+            return variants[index][0]
+
+    def add(self, key, text, created_at=None, save=True):
+        """Store a new variant; returns False if it duplicates an existing one"""
+        created_at = created_at or time.time()
+        with self._lock:
+            variants = self._live(key)
+            if any(existing == text for existing, _ in variants):
+                return False
+            variants.append((text, created_at))
+            # Keep the freshest variants when over the per-key limit
+            self._entries[key] = sorted(variants, key=lambda v: v[1])[-self.variants:]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                evicted, _ = self._entries.popitem(last=False)
+                self._rotation.pop(evicted, None)
+
+        if save and self.persist:
+            try:
+                database.save_cached_suggestion(key[0], key[1], text, created_at, self.variants)
+            except Exception as e:
+                print(f"Error persisting suggestion: {e}")
+        return True
+
+    def needs_refill(self, key):
+        with self._lock:
+            return len(self._live(key)) < self.variants
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'keys': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'refills': self.refills,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _load(self, key):
+        try:
+            rows = database.get_cached_suggestions(key[0], key[1], time.time() - self.ttl)
+        except Exception as e:
+            print(f"Error loading cached suggestions: {e}")
+            return
+        for text, created_at in rows:
+            self.add(key, text, created_at, save=False)
+
+suggestion_cache = SuggestionCache()
+_refill_executor = ThreadPoolExecutor(max_workers=SUGGESTION_REFILL_WORKERS, thread_name_prefix='suggestion-refill')
+_refilling = set()
+_refilling_lock = threading.Lock()
+
+def suggestion_key(mood_type, intensity):
+    """Normalized cache key, or None for a mood type outside
+    SUGGESTION_MOOD_TYPES or a non-numeric intensity"""
+    try:
+        key = (str(mood_type).strip().lower(), min(10, max(1, int(intensity))))
+    except (TypeError, ValueError):
+        return None
+    return key if key[0] in SUGGESTION_MOOD_TYPES else None
+
+def _request_suggestion(mood_type, intensity, **options):
+    """Ask the upstream for one suggestion; None if it returned no choices"""
+    prompt = f"""The user is feeling {mood_type} with an intensity of {intensity}/10. 
+    
+As Mindi, provide ONE brief, actionable suggestion (1-2 sentences) to support their emotional well-being right now. Be warm and encouraging."""
+
+    result = client.chat([{"role": "user", "content": prompt}], read_timeout=20, **options)
+    
+    if 'choices' in result and len(result['choices']) > 0:
+        return result['choices'][0]['message'].get('content', '') or None
+    return None
+
+def _refill_suggestions(key):
+    """Add one variant to a key (runs on the refill executor)
+
+    A single upstream call, matching the single user token the refill was
+    charged; a key reaches its full set of variants over several hits.
+    """
+    try:
+        if suggestion_cache.needs_refill(key):
+            # A higher temperature keeps the variants for a key from converging
+            text = _request_suggestion(key[0], key[1], temperature=1.0)
+            if text:
+                suggestion_cache.add(key, text)
+                suggestion_cache.refills += 1
+    except Exception as e:
+        print(f"Error refilling suggestions: {e}")
+    finally:
+        with _refilling_lock:
+            _refilling.discard(key)
+        database.close_db_connection()
+
+def schedule_refill(key):
+    """Refill a key in the background unless a refill is already running;
+    returns whether one was started"""
+    if not suggestion_cache.needs_refill(key):
+        return False
+    with _refilling_lock:
+        if key in _refilling:
+            return False
+        _refilling.add(key)
+    _refill_executor.submit(_refill_suggestions, key)
+    return True
+
+def get_cached_suggestion(mood_type, intensity):
+    """Cached suggestion for a mood, or None; never calls the upstream"""
+    key = suggestion_key(mood_type, intensity)
+    if key is None:
+        return None
+    return suggestion_cache.get(key)
+
+def refill_suggestions(user_id, mood_type, intensity):
+    """
+    Add one variant for a mood in the background after a cache hit
+
+    The refill makes one upstream call, charged to the user's LLM budget
+    (one token), and that call passes the global budget and concurrency
+    cap in AIClient.chat like any other. A miss is answered by a
+    mood_suggestion job, whose result seeds the key, so it never refills too.
+    Returns whether a refill was started.
+    """
+    key = suggestion_key(mood_type, intensity)
+    if key is None or not suggestion_cache.needs_refill(key):
+        return False
+    with _refilling_lock:
+        if key in _refilling:
+            return False
+    allowed, _ = limits.admit_user(user_id)
+    return allowed and schedule_refill(key)
+
 def get_personalized_suggestion(mood_type, intensity):
     """
     Get a quick personalized suggestion based on current mood
@@ -154,32 +852,21 @@ def get_personalized_suggestion(mood_type, intensity):
     Returns:
         str: Quick suggestion
     """
-    prompt = f"""The user is feeling {mood_type} with an intensity of {intensity}/10. 
-    
-As Mindi, provide ONE brief, actionable suggestion (1-2 sentences) to support their emotional well-being right now. Be warm and encouraging."""
+    key = suggestion_key(mood_type, intensity)
+    if key is not None:
+        cached = suggestion_cache.get(key)
+        if cached:
+            return cached
 
     try:
-        response = requests.post(
-            url=API_URL,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            data=json.dumps({
-                "model": MODEL,
-                "messages": [{"role": "user", "content": prompt}],
-                "reasoning": {"enabled": True}
-            }),
-            timeout=20
-        )
+        suggestion = _request_suggestion(mood_type, intensity)
         
-        response.raise_for_status()
-        result = response.json()
-        
-        if 'choices' in result and len(result['choices']) > 0:
-            return result['choices'][0]['message'].get('content', '')
+        if suggestion:
+            if key is not None:
+                suggestion_cache.add(key, suggestion)
+            return suggestion
         else:
-            return "Take a moment to breathe deeply. You're doing great by checking in with yourself."
+            return FALLBACK_SUGGESTION
             
     except Exception as e:
         print(f"Error getting suggestion: {e}")
@@ -0,0 +1,167 @@
+import math
+from datetime import date, timedelta
+from itertools import groupby
+import database
+import metrics
+
+# ===================================
+# Mood analytics
+#
+# Trends, heatmaps, streaks, transitions and volatility over a user's whole
+# history, each computed in one pass by SQLite window functions and
+# aggregates: per-day figures come from the mood_daily_rollup table (one row
+# per day and mood type), the rest from a single ordered scan of the user's
+# moods index plus any archived months. Results are cached per user until
+# their next write, so a dashboard re-render costs a cache lookup.
+# ===================================
+
+# Rolling average windows, in calendar days
+ROLLING_WINDOWS = (7, 30)
+
+# Heatmap rows follow SQLite's strftime('%w'): 0 is Sunday
+WEEKDAYS = ('Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat')
+
+_ROLLING_COLUMNS = ',\n       '.join(
+    f'ROUND(SUM(intensity_sum) OVER w{days} * 1.0 / SUM(checkins) OVER w{days}, 2) AS rolling_{days}'
+    for days in ROLLING_WINDOWS
+)
+_ROLLING_WINDOWS = ',\n       '.join(
+    f'w{days} AS (ORDER BY jd RANGE BETWEEN {days - 1} PRECEDING AND CURRENT ROW)'
+    for days in ROLLING_WINDOWS
+)
+
+# Per-day check-ins and average, rolling averages over calendar days (RANGE,
+# so missing days shrink the window instead of stretching it), the change from
+# the previous logged day, and a gaps-and-islands key that is constant across
+# a run of consecutive days
+DAILY_SQL = f'''
+    WITH daily AS (
+        SELECT day, julianday(day) AS jd, SUM(count) AS checkins, SUM(intensity_sum) AS intensity_sum
+        FROM mood_daily_rollup
+        WHERE user_id = ?
+        GROUP BY day
+    )
+    SELECT day, checkins,
+           ROUND(intensity_sum * 1.0 / checkins, 2) AS average,
+           {_ROLLING_COLUMNS},
+           intensity_sum * 1.0 / checkins
+               - LAG(intensity_sum * 1.0 / checkins) OVER (ORDER BY jd) AS change,
+           jd - ROW_NUMBER() OVER (ORDER BY jd) AS streak_key
+    FROM daily
+    WINDOW {_ROLLING_WINDOWS}
+    ORDER BY jd
+'''
+
+# Both scans below cover archived moods too (see database.MOOD_HISTORY_SQL)
+HEATMAP_SQL = f'''
+    SELECT CAST(strftime('%w', timestamp) AS INTEGER) AS weekday,
+           CAST(strftime('%H', timestamp) AS INTEGER) AS hour,
+           COUNT(*) AS checkins, SUM(intensity) AS intensity_sum
+    FROM ({database.MOOD_HISTORY_SQL})
+    GROUP BY weekday, hour
+'''
+
+# Consecutive check-ins in time order: mood pairs for the transition matrix,
+# and successive intensity changes for volatility
+SEQUENCE_SQL = f'''
+    SELECT previous_type, mood_type, COUNT(*) AS count,
+           SUM(intensity) AS intensity_sum, SUM(intensity * intensity) AS intensity_squares,
+           SUM((intensity - previous_intensity) * (intensity - previous_intensity)) AS change_squares
+    FROM (
+        SELECT mood_type, intensity,
+               LAG(mood_type) OVER (ORDER BY timestamp, id) AS previous_type,
+               LAG(intensity) OVER (ORDER BY timestamp, id) AS previous_intensity
+        FROM ({database.MOOD_HISTORY_SQL})
+    )
+    GROUP BY previous_type, mood_type
+'''
+
+def _streaks(daily, today=None):
+    """Current and longest run of consecutive check-in days"""
+    today = today or date.today()
+    runs = []
+    for _, days in groupby(daily, key=lambda row: row['streak_key']):
+        days = list(days)
+        runs.append((len(days), days[0]['day'], days[-1]['day']))
+
+    longest = max(runs, default=(0, None, None))
+    current = 0
+    # A streak is still current if the user checked in today or yesterday
+    if runs and runs[-1][2] >= (today - timedelta(days=1)).isoformat():
+        current = runs[-1][0]
+    return {'current': current, 'longest': longest[0], 'longest_start': longest[1], 'longest_end': longest[2]}
+
+def _heatmap(rows):
+    checkins = [[0] * 24 for _ in WEEKDAYS]
+    averages = [[None] * 24 for _ in WEEKDAYS]
+    for row in rows:
+        checkins[row['weekday']][row['hour']] = row['checkins']
+        averages[row['weekday']][row['hour']] = round(row['intensity_sum'] / row['checkins'], 2)
+    return {'weekdays': list(WEEKDAYS), 'checkins': checkins, 'average': averages}
+
+def _transitions(rows):
+    counts = {}
+    for row in rows:
+        if row['previous_type'] is not None:
+            counts.setdefault(row['previous_type'], {})[row['mood_type']] = row['count']
+    probabilities = {
+        previous: {mood: round(count / sum(following.values()), 3) for mood, count in following.items()}
+        for previous, following in counts.items()
+    }
+    return {'counts': counts, 'probabilities': probabilities}
+
+def _volatility(rows, daily):
+    """Spread of intensity, and RMSSD (root mean square of successive changes,
+    the usual mood-instability measure) across check-ins and across days"""
+    total = sum(row['count'] for row in rows)
+    if not total:
+        return {'std_dev': None, 'rmssd_checkins': None, 'rmssd_daily': None}
+    mean = sum(row['intensity_sum'] for row in rows) / total
+    mean_square = sum(row['intensity_squares'] for row in rows) / total
+    change_squares = sum(row['change_squares'] or 0 for row in rows)
+    daily_changes = [row['change'] for row in daily if row['change'] is not None]
+    return {
+        'std_dev': round(math.sqrt(max(mean_square - mean * mean, 0.0)), 3),
+        'rmssd_checkins': round(math.sqrt(change_squares / (total - 1)), 3) if total > 1 else None,
+        'rmssd_daily': (round(math.sqrt(sum(c * c for c in daily_changes) / len(daily_changes)), 3)
+                        if daily_changes else None),
+    }
+
+@metrics.timed_query
+def compute_mood_analytics(user_id, today=None):
+    """Analytics over the user's full mood history, in a single read transaction"""
+    conn = database.get_db_connection()
+    conn.execute('BEGIN')
+    try:
+        daily = conn.execute(DAILY_SQL, (user_id,)).fetchall()
+        heatmap = conn.execute(HEATMAP_SQL, (user_id, user_id)).fetchall()
+        sequence = conn.execute(SEQUENCE_SQL, (user_id, user_id)).fetchall()
+    finally:
+        conn.rollback()
+
+    rolling = [f'rolling_{days}' for days in ROLLING_WINDOWS]
+    return {
+        'checkins': sum(row['checkins'] for row in daily),
+        'days_logged': len(daily),
+        'first_day': daily[0]['day'] if daily else None,
+        'last_day': daily[-1]['day'] if daily else None,
+        'daily': [{'day': row['day'], 'checkins': row['checkins'], 'average': row['average'],
+                   **{key: row[key] for key in rolling}} for row in daily],
+        'heatmap': _heatmap(heatmap),
+        'streaks': _streaks(daily, today),
+        'transitions': _transitions(sequence),
+        'volatility': _volatility(sequence, daily),
+    }
+
+# ===================================
+# Per-User Memoization
+# ===================================
+
+def get_mood_analytics(user_id):
+    """Analytics for a user, recomputed only after a write (or a new day,
+    which moves the current streak); shared by every worker through the
+    database's shared cache"""
+    return database.shared_cache.get_or_compute(
+        'analytics', f'user:{user_id}', lambda: compute_mood_analytics(user_id),
+        suffix=date.today().isoformat()
+    )
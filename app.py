@@ -1,12 +1,115 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 import database
 import ai_service
+import jobs
+import transfer
+import context_builder
+import analytics
+import embeddings
+import limits
+import assets
+import metrics
+import sessions
+import retention
+import io
+import mimetypes
+import json
+import time
 from datetime import datetime
 from functools import wraps
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, recording how long each serialization takes"""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            metrics.json_latency.observe(time.perf_counter() - start)
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.secret_key = 'mindi-secret-key-change-in-production-2024'  # Change this in production!
 
+# Session data is kept server-side; the cookie only holds a signed session ID
+app.session_interface = sessions.ServerSessionInterface()
+
+# Return each request's pooled database connection when the app context ends
+app.teardown_appcontext(database.close_db_connection)
+
+# Templates link CSS/JS through the build manifest (see assets.py)
+app.add_template_global(assets.asset_url, 'asset_url')
+
+# How long an SSE job stream waits for a result before giving up (seconds)
+JOB_STREAM_TIMEOUT = 60
+
+def sse_event(data, event=None):
+    """Format one server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def sse_response(generator):
+    """Stream a generator of SSE frames without proxy buffering"""
+    return Response(stream_with_context(generator), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.before_request
+def start_job_workers():
+    """Make sure this process is draining the AI job queue and scheduling maintenance"""
+    jobs.pool.ensure_started()
+    retention.scheduler.ensure_started()
+
+# ===================================
+# Request Metrics
+# ===================================
+
+def _route_label():
+    # The URL rule, not the path, keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile_token = metrics.profiler.start(f"{request.method} {_route_label()}")
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe time to response headers (streamed bodies continue afterwards)"""
+    started = g.get('request_started')
+    if started is not None:
+        metrics.request_latency.observe(time.perf_counter() - started, request.method,
+                                        _route_label(), response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exception=None):
+    metrics.profiler.finish(g.pop('profile_token', None))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint for this worker process"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# ===================================
+# Static Assets
+# ===================================
+
+@app.route('/assets/<path:filename>')
+def hashed_asset(filename):
+    """Serve a built, content-hashed asset, precompressed when the client accepts it"""
+    path, encoding = assets.choose_variant(filename, request.headers.get('Accept-Encoding', ''))
+    response = send_from_directory(assets.DIST_DIR, path, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=assets.CACHE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # The URL changes whenever the content does, so never revalidate
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ===================================
 # Authentication Decorator
 # ===================================
@@ -80,6 +183,7 @@ def register():
             return jsonify({'error': 'Username or email already exists'}), 400
         
         # Auto-login after registration
+        session.regenerate()
         session['user_id'] = user_id
         session['username'] = username
         
@@ -89,6 +193,9 @@ def register():
             'user_id': user_id
         })
     
+    except database.HashingBusyError:
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 503
+    
     except Exception as e:
         print(f"Error during registration: {e}")
         return jsonify({'error': 'Registration failed'}), 500
@@ -111,6 +218,7 @@ def login():
             return jsonify({'error': 'Invalid username or password'}), 401
         
         # Create session
+        session.regenerate()
         session['user_id'] = user['id']
         session['username'] = user['username']
         
@@ -124,13 +232,19 @@ def login():
             }
         })
     
+    except database.HashingBusyError:
+        return jsonify({'error': 'Server is busy, please try again shortly'}), 503
+    
     except Exception as e:
         print(f"Error during login: {e}")
         return jsonify({'error': 'Login failed'}), 500
 
 @app.route('/api/logout', methods=['POST'])
 def logout():
-    """Logout user"""
+    """Logout user; with ?all=1, also end the user's sessions on other devices"""
+    user_id = session.get('user_id')
+    if user_id is not None and request.args.get('all'):
+        app.session_interface.revoke_user(user_id)
     session.clear()
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
@@ -154,13 +268,35 @@ def add_mood():
         user_id = session['user_id']
         mood_id = database.add_mood(user_id, mood_type, intensity, notes)
         
-        # Get AI suggestion
-        suggestion = ai_service.get_personalized_suggestion(mood_type, intensity)
+        # Most check-ins hit the suggestion cache and are answered inline
+        suggestion = ai_service.get_cached_suggestion(mood_type, intensity)
+        if suggestion:
+            ai_service.refill_suggestions(user_id, mood_type, intensity)
+            return jsonify({
+                'success': True,
+                'mood_id': mood_id,
+                'suggestion': suggestion
+            })
+        
+        # Over the user's LLM budget, answer with the canned suggestion at once
+        allowed, _ = limits.admit_user(user_id)
+        if not allowed:
+            return jsonify({
+                'success': True,
+                'mood_id': mood_id,
+                'suggestion': ai_service.FALLBACK_SUGGESTION
+            })
+        
+        # Otherwise it is generated in the background; poll /api/jobs/<job_id>
+        job_id = jobs.enqueue(user_id, 'mood_suggestion', {
+            'mood_type': mood_type,
+            'intensity': intensity
+        })
         
         return jsonify({
             'success': True,
             'mood_id': mood_id,
-            'suggestion': suggestion
+            'job_id': job_id
         })
     
     except Exception as e:
@@ -172,10 +308,14 @@ def add_mood():
 def get_moods():
     """Get recent mood entries"""
     try:
-        limit = request.args.get('limit', 10, type=int)
+        limit = database.clamp_page_size(request.args.get('limit', type=int), 10)
+        cursor = request.args.get('cursor')
         user_id = session['user_id']
-        moods = database.get_recent_moods(user_id, limit)
-        return jsonify({'moods': moods})
+        moods, next_cursor = database.get_moods_page(user_id, limit, cursor)
+        return jsonify({'moods': moods, 'next_cursor': next_cursor})
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     except Exception as e:
         print(f"Error getting moods: {e}")
@@ -186,15 +326,31 @@ def get_moods():
 def get_mood_stats():
     """Get mood statistics"""
     try:
-        days = request.args.get('days', 7, type=int)
+        days = request.args.get('days', '7')
+        if not days.isdigit() or int(days) < 1:
+            return jsonify({'error': 'days must be a positive integer'}), 400
+        days = min(int(days), database.MAX_STATS_DAYS)
+        
         user_id = session['user_id']
-        stats = database.get_mood_stats(user_id, days)
+        stats = database.get_mood_stats_cached(user_id, days)
         return jsonify({'stats': stats})
     
     except Exception as e:
         print(f"Error getting mood stats: {e}")
         return jsonify({'error': 'Failed to retrieve mood statistics'}), 500
 
+@app.route('/api/mood/analytics', methods=['GET'])
+@login_required
+def get_mood_analytics():
+    """Get trends, heatmaps, streaks, transitions and volatility over the full history"""
+    try:
+        user_id = session['user_id']
+        return jsonify({'analytics': analytics.get_mood_analytics(user_id)})
+    
+    except Exception as e:
+        print(f"Error getting mood analytics: {e}")
+        return jsonify({'error': 'Failed to retrieve mood analytics'}), 500
+
 # ===================================
 # Journal Routes (Protected)
 # ===================================
@@ -213,14 +369,24 @@ def add_journal():
         
         user_id = session['user_id']
         entry_id = database.add_journal_entry(user_id, content, mood_tags)
+        jobs.enqueue_embeddings(user_id)
         
-        # Get AI analysis
-        analysis = ai_service.analyze_journal_entry(content)
+        # Over the user's LLM budget, answer with the canned response at once
+        allowed, _ = limits.admit_user(user_id)
+        if not allowed:
+            return jsonify({
+                'success': True,
+                'entry_id': entry_id,
+                'ai_response': ai_service.FALLBACK_JOURNAL_RESPONSE
+            })
+        
+        # AI analysis is generated in the background; poll /api/jobs/<job_id>
+        job_id = jobs.enqueue(user_id, 'journal_analysis', {'content': content})
         
         return jsonify({
             'success': True,
             'entry_id': entry_id,
-            'ai_response': analysis['response']
+            'job_id': job_id
         })
     
     except Exception as e:
@@ -232,15 +398,93 @@ def add_journal():
 def get_journal_entries():
     """Get recent journal entries"""
     try:
-        limit = request.args.get('limit', 10, type=int)
+        limit = database.clamp_page_size(request.args.get('limit', type=int), 10)
+        cursor = request.args.get('cursor')
         user_id = session['user_id']
-        entries = database.get_recent_journal_entries(user_id, limit)
-        return jsonify({'entries': entries})
+        entries, next_cursor = database.get_journal_entries_page(user_id, limit, cursor)
+        return jsonify({'entries': entries, 'next_cursor': next_cursor})
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     except Exception as e:
         print(f"Error getting journal entries: {e}")
         return jsonify({'error': 'Failed to retrieve journal entries'}), 500
 
+@app.route('/api/journal/search', methods=['GET'])
+@login_required
+def search_journal():
+    """Full-text search over the user's journal entries"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query is required'}), 400
+    
+    try:
+        limit = database.clamp_page_size(request.args.get('limit', type=int), 10)
+        results = database.search_journal_entries(session['user_id'], query, limit)
+        return jsonify({'query': query, 'results': results})
+    
+    except ValueError:
+        return jsonify({'error': 'Search query has no searchable words'}), 400
+    
+    except Exception as e:
+        print(f"Error searching journal: {e}")
+        return jsonify({'error': 'Failed to search journal entries'}), 500
+
+@app.route('/api/journal/similar', methods=['GET'])
+@login_required
+def similar_journal_entries():
+    """Journal entries most similar to one entry (?entry_id=) or to free text (?q=)"""
+    user_id = session['user_id']
+    entry_id = request.args.get('entry_id', type=int)
+    query = request.args.get('q', '').strip()
+    if entry_id is None and not query:
+        return jsonify({'error': 'An entry_id or search query is required'}), 400
+    
+    try:
+        limit = database.clamp_page_size(request.args.get('limit', type=int), embeddings.SIMILAR_RESULTS)
+        exclude = []
+        if entry_id is not None:
+            entry = database.get_journal_entries_by_ids(user_id, [entry_id])
+            if not entry:
+                return jsonify({'error': 'Journal entry not found'}), 404
+            query = entry[0]['content']
+            exclude = [entry_id]
+        
+        results = embeddings.find_similar(user_id, query, limit, exclude)
+        return jsonify({'entry_id': entry_id, 'query': request.args.get('q'), 'results': results})
+    
+    except Exception as e:
+        print(f"Error finding similar journal entries: {e}")
+        return jsonify({'error': 'Failed to find similar journal entries'}), 500
+
+@app.route('/api/journal/stream', methods=['POST'])
+@login_required
+def add_journal_streaming():
+    """Add a journal entry and stream the AI response as server-sent events"""
+    data = request.get_json()
+    content = data.get('content')
+    mood_tags = data.get('mood_tags', [])
+    
+    if not content or len(content.strip()) == 0:
+        return jsonify({'error': 'Journal content is required'}), 400
+    
+    try:
+        entry_id = database.add_journal_entry(session['user_id'], content, mood_tags)
+        jobs.enqueue_embeddings(session['user_id'])
+        allowed, _ = limits.admit_user(session['user_id'])
+    except Exception as e:
+        print(f"Error adding journal entry: {e}")
+        return jsonify({'error': 'Failed to add journal entry'}), 500
+    
+    def generate():
+        deltas = ai_service.stream_journal_analysis(content) if allowed else [ai_service.FALLBACK_JOURNAL_RESPONSE]
+        for delta in deltas:
+            yield sse_event({'delta': delta})
+        yield sse_event({'entry_id': entry_id}, event='done')
+    
+    return sse_response(generate())
+
 # ===================================
 # Insights Routes (Protected)
 # ===================================
@@ -248,43 +492,211 @@ def get_journal_entries():
 @app.route('/api/insights', methods=['POST'])
 @login_required
 def generate_insights():
-    """Generate AI-powered insights"""
+    """Generate AI-powered insights, reusing the last one if nothing has changed"""
     try:
         user_id = session['user_id']
-        moods = database.get_recent_moods(user_id, 10)
-        journal_entries = database.get_recent_journal_entries(user_id, 5)
+        force = bool((request.get_json(silent=True) or {}).get('force'))
+        context, fingerprint, reusable = context_builder.prepare_insight(user_id, force)
+        
+        # Nothing logged since the last insight; pass {"force": true} to regenerate
+        if reusable:
+            return jsonify({
+                'success': True,
+                'insight_id': reusable['id'],
+                'insight': reusable['insight_text'],
+                'reused': True
+            })
         
         # Generate insight
-        insight_text = ai_service.generate_mood_insight(moods, journal_entries)
+        moods, journal_entries, history_summary = context
+        insight_text, generated = ai_service.generate_mood_insight(moods, journal_entries, history_summary)
         
-        # Save insight
-        entry_ids = [entry['id'] for entry in journal_entries]
-        insight_id = database.add_insight(user_id, insight_text, entry_ids)
+        # Save insight; a fallback is shown but never stored, so the next
+        # request tries the upstream again instead of reusing it
+        insight_id = None
+        if generated:
+            entry_ids = [entry['id'] for entry in journal_entries]
+            insight_id = database.add_insight(user_id, insight_text, entry_ids, fingerprint)
         
         return jsonify({
             'success': True,
             'insight_id': insight_id,
-            'insight': insight_text
+            'insight': insight_text,
+            'reused': False
         })
     
+    except context_builder.InsightRateLimited as e:
+        return jsonify({'error': 'Too many insights requested, please try again later'}), 429, \
+            {'Retry-After': str(e.retry_after)}
+    
+    except Exception as e:
+        print(f"Error generating insights: {e}")
+        return jsonify({'error': 'Failed to generate insights'}), 500
+
+@app.route('/api/insights/stream', methods=['POST'])
+@login_required
+def generate_insights_streaming():
+    """Stream a new AI insight as server-sent events, then save it"""
+    try:
+        user_id = session['user_id']
+        force = bool((request.get_json(silent=True) or {}).get('force'))
+        context, fingerprint, reusable = context_builder.prepare_insight(user_id, force)
+    except context_builder.InsightRateLimited as e:
+        return jsonify({'error': 'Too many insights requested, please try again later'}), 429, \
+            {'Retry-After': str(e.retry_after)}
     except Exception as e:
         print(f"Error generating insights: {e}")
         return jsonify({'error': 'Failed to generate insights'}), 500
+    
+    def replay():
+        # The stored insight arrives as a single delta
+        yield sse_event({'delta': reusable['insight_text']})
+        yield sse_event({'insight_id': reusable['id'], 'reused': True}, event='done')
+    
+    def generate():
+        # Only the pieces needed for the final insert are kept, not the frames
+        moods, journal_entries, history_summary = context
+        parts = []
+        outcome = {}
+        for delta in ai_service.stream_mood_insight(moods, journal_entries, history_summary, outcome):
+            parts.append(delta)
+            yield sse_event({'delta': delta})
+        
+        # A fallback or truncated reply is not stored (see generate_insights)
+        insight_id = None
+        if not outcome.get('failed'):
+            entry_ids = [entry['id'] for entry in journal_entries]
+            insight_id = database.add_insight(user_id, ''.join(parts), entry_ids, fingerprint)
+        yield sse_event({'insight_id': insight_id, 'reused': False}, event='done')
+    
+    return sse_response(replay() if reusable else generate())
 
 @app.route('/api/insights', methods=['GET'])
 @login_required
 def get_insights():
     """Get recent insights"""
     try:
-        limit = request.args.get('limit', 5, type=int)
+        limit = database.clamp_page_size(request.args.get('limit', type=int), 5)
+        cursor = request.args.get('cursor')
         user_id = session['user_id']
-        insights = database.get_recent_insights(user_id, limit)
-        return jsonify({'insights': insights})
+        insights, next_cursor = database.get_insights_page(user_id, limit, cursor)
+        return jsonify({'insights': insights, 'next_cursor': next_cursor})
+    
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     except Exception as e:
         print(f"Error getting insights: {e}")
         return jsonify({'error': 'Failed to retrieve insights'}), 500
 
+# ===================================
+# AI Job Routes (Protected)
+# ===================================
+
+def serialize_job(job):
+    """Public view of an AI job"""
+    return {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error']
+    }
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Get the status and result of a background AI job"""
+    try:
+        job = database.get_job(job_id, session['user_id'])
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(serialize_job(job))
+    
+    except Exception as e:
+        print(f"Error getting job: {e}")
+        return jsonify({'error': 'Failed to retrieve job'}), 500
+
+@app.route('/api/jobs/<int:job_id>/events', methods=['GET'])
+@login_required
+def stream_job(job_id):
+    """Server-sent events stream that emits the job once it finishes"""
+    user_id = session['user_id']
+    
+    def generate():
+        deadline = time.monotonic() + JOB_STREAM_TIMEOUT
+        while True:
+            job = database.get_job(job_id, user_id)
+            if job is None:
+                yield sse_event({'error': 'Job not found'}, event='error')
+                return
+            if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+                yield sse_event(serialize_job(job), event='job')
+                return
+            yield ': waiting\n\n'
+            time.sleep(0.5)
+    
+    return sse_response(generate())
+
+# ===================================
+# Import / Export Routes (Protected)
+# ===================================
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+@app.route('/api/import/<kind>', methods=['POST'])
+@login_required
+def import_data(kind):
+    """Import moods or journal entries from a CSV / NDJSON request body.
+    
+    The body is parsed as it arrives and committed in batches; progress is
+    streamed back as server-sent events, ending with a `done` summary.
+    """
+    if kind not in transfer.KINDS:
+        return jsonify({'error': f'Unknown data kind: {kind}'}), 404
+    
+    fmt = request.args.get('format') or ('ndjson' if 'ndjson' in (request.mimetype or '') else 'csv')
+    if fmt not in transfer.FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    user_id = session['user_id']
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    
+    def generate():
+        summary = None
+        try:
+            for summary in transfer.import_records(user_id, kind, lines, fmt):
+                yield sse_event({'imported': summary['imported'], 'skipped': summary['skipped']},
+                                event='progress')
+        except Exception as e:
+            print(f"Error importing {kind}: {e}")
+            yield sse_event({'error': 'Import failed', 'imported': summary['imported'] if summary else 0},
+                            event='error')
+            return
+        if kind == 'journal' and summary and summary['imported']:
+            jobs.enqueue_embeddings(user_id)
+        yield sse_event(summary, event='done')
+    
+    return sse_response(generate())
+
+@app.route('/api/export/<kind>', methods=['GET'])
+@login_required
+def export_data(kind):
+    """Download the user's full mood or journal history as CSV / NDJSON"""
+    if kind not in transfer.KINDS:
+        return jsonify({'error': f'Unknown data kind: {kind}'}), 404
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in transfer.FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    filename = f"mindi-{kind}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    return Response(
+        stream_with_context(transfer.export_records(session['user_id'], kind, fmt)),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 # ===================================
 # Dashboard Data Route (Protected)
 # ===================================
@@ -295,17 +707,20 @@ def get_dashboard_data():
     """Get all data for the dashboard"""
     try:
         user_id = session['user_id']
-        moods = database.get_recent_moods(user_id, 20)
-        journal_entries = database.get_recent_journal_entries(user_id, 5)
-        insights = database.get_recent_insights(user_id, 3)
-        stats = database.get_mood_stats(user_id, 7)
         
-        return jsonify({
-            'moods': moods,
-            'journal_entries': journal_entries,
-            'insights': insights,
-            'stats': stats
-        })
+        # Idle polls revalidate against the shared per-user version without touching the main DB
+        etag = database.get_dashboard_etag(user_id)
+        revalidated = request.if_none_match.contains(etag)
+        metrics.record_cache('dashboard_etag', revalidated)
+        if revalidated:
+            response = app.response_class(status=304)
+        else:
+            etag, data = database.get_dashboard_snapshot(user_id)
+            response = jsonify(data)
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     
     except Exception as e:
         print(f"Error getting dashboard data: {e}")
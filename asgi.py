@@ -0,0 +1,258 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from a2wsgi import WSGIMiddleware
+import database
+import ai_service
+import jobs
+import limits
+import context_builder
+import retention
+import metrics
+from app import app as flask_app, sse_event
+
+# ===================================
+# ASGI serving mode
+#
+#     uvicorn asgi:app --workers 2
+#
+# The LLM-bound routes below are native coroutines that await OpenRouter via
+# ai_service.async_client, so a slow upstream call holds a coroutine instead of
+# an OS thread. Blocking SQLite work is offloaded to a small thread pool. Every
+# other route is served by the Flask app on a2wsgi's thread pool, unchanged.
+# ===================================
+
+# Threads for blocking database calls made from async handlers
+DB_THREADS = 4
+
+# Threads serving the delegated (non-async) Flask routes
+WSGI_THREADS = 16
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='asgi-db')
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+async def run_db(func, *args):
+    """Run a blocking database function on the DB thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, func, *args)
+
+# ===================================
+# Request / Response Helpers
+# ===================================
+
+def load_session(scope):
+    """Look up the request's server-side session outside of a Flask request context"""
+    headers = dict(scope.get('headers') or [])
+    cookie = SimpleCookie(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookie.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return {}
+    return flask_app.session_interface.load(flask_app, morsel.value)
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return json.loads(body) if body else {}
+
+async def send_json(send, data, status=200, headers=()):
+    body = json.dumps(data).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_sse(send, frames):
+    """Relay an async generator of SSE frames as they are produced"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')],
+    })
+    async for frame in frames:
+        await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+# ===================================
+# Async Routes
+# ===================================
+
+async def read_force(receive):
+    """The optional {"force": true} of an insight request; a bad body counts as {}"""
+    try:
+        return bool((await read_json(receive)).get('force'))
+    except ValueError:
+        return False
+
+async def send_rate_limited(send, error):
+    await send_json(send, {'error': 'Too many insights requested, please try again later'}, 429,
+                    [(b'retry-after', str(error.retry_after).encode())])
+
+async def generate_insights(user_id, receive, send):
+    """Async POST /api/insights"""
+    force = await read_force(receive)
+    try:
+        context, fingerprint, reusable = await run_db(context_builder.prepare_insight, user_id, force)
+        if reusable:
+            await send_json(send, {
+                'success': True,
+                'insight_id': reusable['id'],
+                'insight': reusable['insight_text'],
+                'reused': True
+            })
+            return
+
+        moods, journal_entries, history_summary = context
+        insight_text, generated = await ai_service.generate_mood_insight_async(
+            moods, journal_entries, history_summary
+        )
+
+        # A fallback is shown but never stored, so it is not reused
+        insight_id = None
+        if generated:
+            entry_ids = [entry['id'] for entry in journal_entries]
+            insight_id = await run_db(database.add_insight, user_id, insight_text, entry_ids, fingerprint)
+    except context_builder.InsightRateLimited as e:
+        await send_rate_limited(send, e)
+        return
+    except Exception as e:
+        print(f"Error generating insights: {e}")
+        await send_json(send, {'error': 'Failed to generate insights'}, 500)
+        return
+
+    await send_json(send, {
+        'success': True,
+        'insight_id': insight_id,
+        'insight': insight_text,
+        'reused': False
+    })
+
+async def generate_insights_streaming(user_id, receive, send):
+    """Async POST /api/insights/stream"""
+    force = await read_force(receive)
+    try:
+        context, fingerprint, reusable = await run_db(context_builder.prepare_insight, user_id, force)
+    except context_builder.InsightRateLimited as e:
+        await send_rate_limited(send, e)
+        return
+    except Exception as e:
+        print(f"Error generating insights: {e}")
+        await send_json(send, {'error': 'Failed to generate insights'}, 500)
+        return
+
+    async def replay():
+        yield sse_event({'delta': reusable['insight_text']})
+        yield sse_event({'insight_id': reusable['id'], 'reused': True}, event='done')
+
+    async def frames():
+        moods, journal_entries, history_summary = context
+        parts = []
+        outcome = {}
+        async for delta in ai_service.stream_mood_insight_async(moods, journal_entries, history_summary, outcome):
+            parts.append(delta)
+            yield sse_event({'delta': delta})
+
+        insight_id = None
+        if not outcome.get('failed'):
+            entry_ids = [entry['id'] for entry in journal_entries]
+            insight_id = await run_db(database.add_insight, user_id, ''.join(parts), entry_ids, fingerprint)
+        yield sse_event({'insight_id': insight_id, 'reused': False}, event='done')
+
+    await send_sse(send, replay() if reusable else frames())
+
+async def add_journal_streaming(user_id, receive, send):
+    """Async POST /api/journal/stream"""
+    try:
+        data = await read_json(receive)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        await send_json(send, {'error': 'Request body must be a JSON object'}, 400)
+        return
+    content = data.get('content')
+    mood_tags = data.get('mood_tags', [])
+
+    if not content or len(content.strip()) == 0:
+        await send_json(send, {'error': 'Journal content is required'}, 400)
+        return
+
+    try:
+        entry_id = await run_db(database.add_journal_entry, user_id, content, mood_tags)
+        await run_db(jobs.enqueue_embeddings, user_id)
+        allowed, _ = await run_db(limits.admit_user, user_id)
+    except Exception as e:
+        print(f"Error adding journal entry: {e}")
+        await send_json(send, {'error': 'Failed to add journal entry'}, 500)
+        return
+
+    async def frames():
+        if not allowed:
+            yield sse_event({'delta': ai_service.FALLBACK_JOURNAL_RESPONSE})
+        else:
+            async for delta in ai_service.stream_journal_analysis_async(content):
+                yield sse_event({'delta': delta})
+        yield sse_event({'entry_id': entry_id}, event='done')
+
+    await send_sse(send, frames())
+
+# Routes served natively; all require a logged-in session
+ASYNC_ROUTES = {
+    ('POST', '/api/insights'): generate_insights,
+    ('POST', '/api/insights/stream'): generate_insights_streaming,
+    ('POST', '/api/journal/stream'): add_journal_streaming,
+}
+
+# ===================================
+# Application
+# ===================================
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            jobs.pool.ensure_started()
+            retention.scheduler.ensure_started()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if ai_service.async_client is not None:
+                await ai_service.async_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    handler = None
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await wsgi_app(scope, receive, send)
+        return
+
+    # Same request histogram as the Flask routes, observed at response start
+    started = time.perf_counter()
+    async def timed_send(message):
+        if message['type'] == 'http.response.start':
+            metrics.request_latency.observe(time.perf_counter() - started, scope['method'],
+                                            scope['path'], message['status'])
+        await send(message)
+
+    user_id = (await run_db(load_session, scope)).get('user_id')
+    if user_id is None:
+        await send_json(timed_send, {'error': 'Authentication required'}, 401)
+        return
+
+    await handler(user_id, receive, timed_send)
@@ -0,0 +1,250 @@
+import gzip
+import hashlib
+import json
+import os
+import sys
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # gzip-only when brotli is not installed
+    brotli = None
+
+# ===================================
+# Static asset pipeline
+#
+#     python assets.py
+#
+# Minifies static/css and static/js, names each output after a hash of its
+# content and writes it to static/dist/ alongside precompressed .gz (and .br
+# when brotli is installed) variants, plus manifest.json mapping source names
+# to hashed ones. Templates link assets through asset_url(), and app.py serves
+# /assets/ with the best variant the client accepts and an immutable
+# Cache-Control: a changed file gets a new URL, so a cached copy never needs
+# revalidating. Without a build, asset_url() falls back to the raw /static/ file.
+# ===================================
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Source directories (under static/) that are built
+SOURCE_DIRS = ('css', 'js')
+
+# Hex digits of the content hash kept in file names
+HASH_LENGTH = 10
+
+# Served variants, best first: (Accept-Encoding token, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# One year, the conventional maximum for immutable assets
+CACHE_MAX_AGE = 31536000
+
+# ===================================
+# Minifiers
+# ===================================
+
+def _scan_string(text, i, quote):
+    """Index just past the string or template literal starting at text[i]"""
+    i += 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+def _scan_regex(text, i):
+    """Index just past the regex literal starting at text[i] (flags included)"""
+    i += 1
+    in_class = False
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            break
+        elif char == '\n':
+            break
+        i += 1
+    while i < len(text) and text[i].isalpha():
+        i += 1
+    return i
+
+def minify_css(text):
+    """Drop comments and collapse whitespace, leaving strings untouched"""
+    out = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char in '"\'':
+            end = _scan_string(text, i, char)
+            out.append(text[i:end])
+            i = end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+        elif char.isspace():
+            while i < len(text) and text[i].isspace():
+                i += 1
+            if out and out[-1] not in '{};,: ':
+                out.append(' ')
+        elif char in '{};,':
+            # No token is separated by these, so surrounding spaces can go
+            if out and out[-1] == ' ':
+                out.pop()
+            if char == '}' and out and out[-1] == ';':
+                out.pop()
+            out.append(char)
+            i += 1
+        else:
+            # ':' is tightened after only, since 'a :hover' and 'a:hover' differ
+            out.append(char)
+            i += 1
+    return ''.join(out).strip()
+
+# A '/' after one of these (or at the start) begins a regex, not a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^') | {''}
+
+def minify_js(text):
+    """
+    Conservative JavaScript minifier
+
+    Removes comments, indentation, trailing whitespace and blank lines, but
+    keeps every line break so automatic semicolon insertion is unaffected.
+    Strings, template literals and regex literals are copied verbatim.
+    """
+    out = []
+    i = 0
+    at_line_start = True
+    last = ''
+    while i < len(text):
+        char = text[i]
+        if at_line_start and char in ' \t':
+            i += 1
+            continue
+        if char in '"\'`':
+            end = _scan_string(text, i, char)
+            out.append(text[i:end])
+            i, last, at_line_start = end, char, False
+        elif text.startswith('//', i):
+            while i < len(text) and text[i] != '\n':
+                i += 1
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            comment = text[i:len(text) if end < 0 else end + 2]
+            i += len(comment)
+            # A comment spanning lines still separates statements
+            if '\n' in comment:
+                out.append('\n')
+                at_line_start = True
+        elif char == '/' and (last in _REGEX_PRECEDERS or ''.join(out[-12:]).rstrip().endswith('return')):
+            end = _scan_regex(text, i)
+            out.append(text[i:end])
+            i, last, at_line_start = end, '/', False
+        elif char == '\n':
+            while out and out[-1] in (' ', '\t'):
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            i += 1
+            at_line_start = True
+        else:
+            out.append(char)
+            if not char.isspace():
+                last = char
+            i += 1
+            at_line_start = False
+    return ''.join(out).strip() + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+# ===================================
+# Build
+# ===================================
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Minify, hash and precompress every asset; returns the manifest.
+    Earlier builds' files are left in place so pages rendered before a deploy
+    can still load them."""
+    manifest = {}
+    for source_dir in SOURCE_DIRS:
+        for root, _, files in os.walk(os.path.join(static_dir, source_dir)):
+            for filename in sorted(files):
+                stem, ext = os.path.splitext(filename)
+                if ext not in MINIFIERS:
+                    continue
+                source = os.path.join(root, filename)
+                name = os.path.relpath(source, static_dir).replace(os.sep, '/')
+                with open(source, encoding='utf-8') as f:
+                    data = MINIFIERS[ext](f.read()).encode('utf-8')
+
+                digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+                hashed = f'{os.path.dirname(name)}/{stem}.{digest}{ext}'
+                target = os.path.join(dist_dir, hashed)
+                _write(target, data)
+                # mtime=0 keeps .gz output byte-identical across builds
+                _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(target + '.br', brotli.compress(data, quality=11))
+                manifest[name] = hashed
+
+    _write(os.path.join(dist_dir, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+# ===================================
+# Serving
+# ===================================
+
+_manifest = {'mtime': None, 'entries': {}}
+
+def load_manifest(path=MANIFEST_PATH):
+    """The build manifest, re-read only when the file changes"""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if mtime != _manifest['mtime']:
+        with open(path) as f:
+            _manifest['entries'] = json.load(f)
+        _manifest['mtime'] = mtime
+    return _manifest['entries']
+
+def asset_url(name):
+    """Jinja helper: versioned URL for a built asset, or the raw static file"""
+    hashed = load_manifest().get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('hashed_asset', filename=hashed)
+
+def choose_variant(filename, accept_encoding):
+    """(file to send, Content-Encoding or None) for a request's Accept-Encoding"""
+    accepted = {token.split(';')[0].strip() for token in accept_encoding.lower().split(',')}
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+if __name__ == '__main__':
+    manifest = build()
+    for name, hashed in sorted(manifest.items()):
+        raw = os.path.getsize(os.path.join(STATIC_DIR, name))
+        built = os.path.join(DIST_DIR, hashed)
+        sizes = f"{raw:>7,} -> {os.path.getsize(built):>7,} min -> {os.path.getsize(built + '.gz'):>6,} gz"
+        if brotli is not None:
+            sizes += f" -> {os.path.getsize(built + '.br'):>6,} br"
+        print(f"{name:<20} {sizes}")
+    print(f"Wrote {len(manifest)} assets to {os.path.relpath(DIST_DIR)}", file=sys.stderr)
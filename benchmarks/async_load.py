@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import uvicorn
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import database
+import ai_service
+import asgi
+import context_builder
+import limits
+from app import app as flask_app
+from benchmarks.fake_llm import FakeLLMServer
+
+# ===================================
+# Sync vs async serving under slow LLM calls
+#
+#     python -m benchmarks.async_load --latency 0.5 --concurrency 8 32 128
+#
+# Fires concurrent POST /api/insights {"force": true} from --users registered
+# users at the Flask app behind a fixed-size thread pool (like gunicorn
+# --threads N) and at asgi.app under uvicorn, both talking to a fake
+# OpenRouter with artificial latency. Rate limits are lifted unless
+# --keep-limits is given, so every request reaches the upstream.
+# ===================================
+
+# Far above any benchmark's load
+UNLIMITED = 10 ** 9
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server with a fixed worker thread pool, like a threaded gunicorn worker"""
+
+    request_queue_size = 1024
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=QuietRequestHandler)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='sync-worker')
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def start_sync_server(threads):
+    server = PooledWSGIServer('127.0.0.1', 0, flask_app, threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def start_async_server():
+    config = uvicorn.Config(asgi.app, host='127.0.0.1', port=0, log_level='warning', lifespan='on',
+                            backlog=4096, timeout_keep_alive=60)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, f'http://127.0.0.1:{port}'
+
+def lift_limits():
+    """Take the per-user and global LLM budgets, the hourly insight limit and
+    the upstream concurrency cap out of the way, so a run measures serving
+    rather than load shedding. Call before building the AI clients."""
+    limits.user_llm = limits.MemoryTokenBucket('llm-user', UNLIMITED, 1, UNLIMITED)
+    limits.global_llm = limits.MemoryTokenBucket('llm-global', UNLIMITED, 1, UNLIMITED)
+    limits.upstream = limits.ConcurrencyLimiter(UNLIMITED, UNLIMITED)
+    context_builder.INSIGHT_RATE_LIMIT = UNLIMITED
+
+def login_cookies(count):
+    """Register `count` benchmark users and return their session cookies"""
+    cookies = []
+    for n in range(count):
+        client = flask_app.test_client()
+        client.post('/api/register', json={
+            'username': f'bench{n}', 'email': f'bench{n}@example.com', 'password': 'benchmark'
+        })
+        cookies.append(client.get_cookie(flask_app.config['SESSION_COOKIE_NAME']).value)
+    return cookies
+
+async def run_load(base_url, cookies, concurrency, total):
+    """Send `total` requests with at most `concurrency` in flight, round-robin
+    over the users' cookies"""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    pool_limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+
+    async with httpx.AsyncClient(base_url=base_url, limits=pool_limits, timeout=300) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post('/api/insights', json={'force': True},
+                                                 headers={'Cookie': f'{cookie_name}={cookies[i % len(cookies)]}'})
+                    ok = response.status_code == 200
+                except httpx.TransportError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                if not ok:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.5, help='fake LLM seconds per call')
+    parser.add_argument('--sync-threads', type=int, default=8, help='worker threads for the sync path')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--rounds', type=int, default=3, help='requests per client slot')
+    parser.add_argument('--users', type=int, default=32, help='users the requests are spread over')
+    parser.add_argument('--keep-limits', action='store_true', help='leave rate limits and the upstream cap on')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mindi-bench-')
+    database.DATABASE_NAME = os.path.join(workdir, 'bench.db')
+    database.init_db()
+
+    if not args.keep_limits:
+        lift_limits()
+    fake = FakeLLMServer(latency=args.latency).start()
+    ai_service.client = ai_service.AIClient(api_url=fake.url, pool_size=max(args.concurrency))
+    ai_service.async_client = ai_service.AsyncAIClient(api_url=fake.url, breaker=ai_service.client.breaker)
+
+    cookies = login_cookies(args.users)
+    sync_server, sync_url = start_sync_server(args.sync_threads)
+    async_server, async_url = start_async_server()
+
+    print(f"Fake LLM latency {args.latency}s, sync path = {args.sync_threads} threads")
+    print(f"{'mode':<6} {'conc':>5} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'errors':>6}")
+    for concurrency in args.concurrency:
+        total = concurrency * args.rounds
+        for mode, url in (('sync', sync_url), ('async', async_url)):
+            result = asyncio.run(run_load(url, cookies, concurrency, total))
+            print(f"{mode:<6} {concurrency:>5} {result['throughput']:>8.1f} "
+                  f"{result['p50']:>7.2f} {result['p95']:>7.2f} {result['errors']:>6}")
+
+    sync_server.shutdown()
+    async_server.should_exit = True
+
+if __name__ == '__main__':
+    main()
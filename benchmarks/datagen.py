@@ -0,0 +1,128 @@
+import argparse
+import json
+import math
+import random
+import time
+import database
+
+# ===================================
+# Synthetic data generator
+#
+#     python -m benchmarks.datagen --users 200 --moods 500 --entries 100
+#
+# Fills a database (mindi.db unless --db is given) with N users, each with M
+# moods and K journal entries. Timestamps look like real use rather than an
+# even grid: check-ins cluster in the morning and evening, come in bursts a
+# few hours apart with occasional breaks of days or weeks, and each user's
+# history ends at a different point in the recent past. Moods drift around a
+# per-user baseline so streaks and transitions are not pure noise.
+#
+# Every user's password is PASSWORD, so load scenarios can log in as them.
+# ===================================
+
+PASSWORD = 'benchmark'
+
+MOOD_TYPES = ('happy', 'calm', 'grateful', 'excited', 'tired', 'anxious', 'sad', 'angry')
+
+# Share of check-ins around each time of day: (mean hour, spread in hours, weight)
+DAY_PEAKS = ((8.0, 1.5, 0.45), (13.0, 1.5, 0.15), (21.0, 1.5, 0.40))
+
+PHRASES = (
+    'Work was busy and the meeting ran long', 'Slept badly again', 'Went for a walk in the rain',
+    'Called my mother this evening', 'Felt anxious about the deadline', 'Coffee with a friend helped',
+    'Could not focus this afternoon', 'Grateful for a quiet morning', 'Argued with my partner',
+    'Finished the book I was reading', 'The commute was exhausting', 'Cooked dinner for the family',
+    'Ran five kilometres before work', 'Kept thinking about the interview', 'Weekend plans fell through',
+    'Meditated for ten minutes', 'Headache most of the day', 'Got good news from home',
+)
+
+def _time_of_day(rng):
+    mean, spread, _ = rng.choices(DAY_PEAKS, weights=[peak[2] for peak in DAY_PEAKS])[0]
+    return min(max(rng.gauss(mean, spread), 0.0), 23.99) * 3600
+
+def user_timestamps(count, rng, now, mean_gap_hours=20.0):
+    """`count` timestamps (oldest first) ending at a recent last-active time"""
+    last_active = now - rng.expovariate(1 / (5 * 86400))
+    moments = []
+    t = last_active
+    for _ in range(count):
+        day_start = t - (t % 86400)
+        moments.append(day_start + _time_of_day(rng))
+        # Mostly hours apart; one gap in ten is a break of days to weeks
+        mean_gap = mean_gap_hours * (12 if rng.random() < 0.1 else 1)
+        t -= rng.expovariate(1 / (mean_gap * 3600))
+    moments.sort()
+    return [time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(moment)) for moment in moments]
+
+def mood_rows(count, rng, now):
+    """(timestamp, mood_type, intensity, notes) rows drifting around a baseline"""
+    baseline = rng.randrange(len(MOOD_TYPES))
+    state = baseline
+    rows = []
+    for timestamp in user_timestamps(count, rng, now):
+        # Stay put, step to a neighbouring mood, or fall back to the baseline
+        roll = rng.random()
+        if roll < 0.15:
+            state = baseline
+        elif roll < 0.55:
+            state = min(max(state + rng.choice((-1, 1)), 0), len(MOOD_TYPES) - 1)
+        intensity = min(max(round(rng.gauss(4 + state * 0.6, 1.8)), 1), 10)
+        notes = rng.choice(PHRASES) if rng.random() < 0.3 else ''
+        rows.append((timestamp, MOOD_TYPES[state], intensity, notes))
+    return rows
+
+def journal_rows(count, rng, now):
+    """(timestamp, content, mood_tags_json) rows of a few sentences each"""
+    rows = []
+    for timestamp in user_timestamps(count, rng, now, mean_gap_hours=96.0):
+        sentences = max(1, round(rng.lognormvariate(math.log(4), 0.6)))
+        content = '. '.join(rng.choice(PHRASES) for _ in range(sentences)) + '.'
+        tags = rng.sample(MOOD_TYPES, rng.randint(0, 2))
+        rows.append((timestamp, content, json.dumps(tags)))
+    return rows
+
+def generate(users, moods, entries, seed=1, prefix='user'):
+    """Create the users and their history; returns the new users' (id, username)"""
+    rng = random.Random(seed)
+    now = time.time()
+    # One hash shared by every user: scrypt per user would dominate the run
+    password_hash = database.hash_password(PASSWORD)
+
+    conn = database.get_db_connection()
+    created = []
+    for n in range(users):
+        username = f'{prefix}{n}'
+        cursor = conn.execute(
+            'INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)',
+            (username, f'{username}@example.com', password_hash)
+        )
+        created.append((cursor.lastrowid, username))
+    conn.commit()
+
+    for user_id, _ in created:
+        database.insert_moods_batch(user_id, mood_rows(moods, rng, now))
+        if entries:
+            database.insert_journal_batch(user_id, journal_rows(entries, rng, now))
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic users and history')
+    parser.add_argument('--db', default=database.DATABASE_NAME)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--moods', type=int, default=500, help='moods per user')
+    parser.add_argument('--entries', type=int, default=100, help='journal entries per user')
+    parser.add_argument('--prefix', default='user', help='username prefix')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = args.db
+    database.init_db()
+    start = time.perf_counter()
+    created = generate(args.users, args.moods, args.entries, args.seed, args.prefix)
+    database.close_db_connection()
+    print(f"{len(created)} users, {len(created) * args.moods:,} moods, "
+          f"{len(created) * args.entries:,} journal entries in {time.perf_counter() - start:.1f}s "
+          f"(password '{PASSWORD}')")
+
+if __name__ == '__main__':
+    main()
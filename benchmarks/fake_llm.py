@@ -0,0 +1,159 @@
+import asyncio
+import json
+import random
+import threading
+
+# ===================================
+# Fake OpenRouter server
+#
+#     python -m benchmarks.fake_llm --port 8099 --latency 0.5
+#
+# Speaks just enough of the chat completions API for ai_service: a JSON
+# completion, or an SSE stream when the request sets "stream": true. Runs on
+# asyncio so thousands of concurrent slow calls cost no threads, keeping the
+# fake upstream out of the way of whatever is being measured.
+# ===================================
+
+class FakeLLMServer:
+    """Chat completions stub with configurable latency, jitter and error rate"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, error_rate=0.0,
+                 stream_chunks=8, reply="Take a slow breath and notice one thing you can see right now.",
+                 jitter=0.0, fail_first=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # The first fail_first requests get a 503 whatever the error rate
+        self.fail_first = fail_first
+        self.stream_chunks = stream_chunks
+        self.reply = reply
+        self.requests = 0
+        self.errors = 0
+        self._loop = None
+        self._server = None
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}/api/v1/chat/completions'
+
+    def start(self):
+        """Serve from a daemon thread with its own event loop and return self"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, name='fake-llm', daemon=True).start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            def shutdown():
+                self._server.close()
+                # End open keep-alive connections before the loop stops
+                for task in asyncio.all_tasks(self._loop):
+                    task.cancel()
+                self._loop.call_soon(self._loop.stop)
+
+            self._loop.call_soon_threadsafe(shutdown)
+
+    async def serve_forever(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        """One keep-alive connection: parse requests until the client hangs up"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = json.loads(await reader.readexactly(length) or b'{}') if length else {}
+                await self._respond(writer, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _delay(self):
+        """Latency for one call, spread uniformly by +/- jitter (a fraction)"""
+        return self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _respond(self, writer, body):
+        self.requests += 1
+        if self.requests <= self.fail_first or random.random() < self.error_rate:
+            self.errors += 1
+            await asyncio.sleep(self._delay() / 10)
+            self._write_json(writer, 503, {'error': {'message': 'fake upstream overloaded'}})
+        elif body.get('stream'):
+            await self._write_stream(writer)
+        else:
+            await asyncio.sleep(self._delay())
+            self._write_json(writer, 200, {
+                'choices': [{'message': {'role': 'assistant', 'content': self.reply}}],
+                'usage': {'prompt_tokens': 120, 'completion_tokens': 24, 'total_tokens': 144},
+            })
+        await writer.drain()
+
+    def _write_json(self, writer, status, data):
+        payload = json.dumps(data).encode()
+        reason = 'OK' if status == 200 else 'Service Unavailable'
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload
+        )
+
+    async def _write_stream(self, writer):
+        """Spread the reply over `stream_chunks` SSE events across the latency"""
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Transfer-Encoding: chunked\r\n\r\n')
+
+        words = self.reply.split(' ')
+        step = max(1, len(words) // self.stream_chunks)
+        pieces = [' '.join(words[i:i + step]) for i in range(0, len(words), step)]
+        latency = self._delay()
+        self._write_chunk(writer, ': OPENROUTER PROCESSING\n\n')
+        for i, piece in enumerate(pieces):
+            await asyncio.sleep(latency / len(pieces))
+            text = piece if i == 0 else ' ' + piece
+            self._write_chunk(writer, 'data: ' + json.dumps({'choices': [{'delta': {'content': text}}]}) + '\n\n')
+            await writer.drain()
+        self._write_chunk(writer, 'data: [DONE]\n\n')
+        writer.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, writer, text):
+        data = text.encode()
+        writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fake OpenRouter chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.0, help='latency spread as a fraction, e.g. 0.3')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of 503 responses')
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.latency, args.error_rate, jitter=args.jitter)
+    print(f"Fake LLM listening on {server.url}")
+    asyncio.run(server.serve_forever())
@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import database
+import transfer
+
+# ===================================
+# Bulk mood import
+#
+#     python -m benchmarks.import_bench --rows 1000000
+#
+# Streams a synthetic CSV through transfer.import_records (batched
+# executemany transactions) and compares it with the per-row add_mood path,
+# which commits once per mood.
+# ===================================
+
+MOOD_TYPES = ('happy', 'sad', 'anxious', 'calm', 'angry', 'excited', 'tired', 'grateful')
+
+def csv_lines(rows, seed=7):
+    """Yield a mood CSV one line at a time, as a file object would"""
+    rng = random.Random(seed)
+    start = time.time() - rows * 600
+    yield 'timestamp,mood_type,intensity,notes\r\n'
+    for i in range(rows):
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start + i * 600))
+        yield f'{timestamp},{rng.choice(MOOD_TYPES)},{rng.randint(1, 10)},\r\n'
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk mood import')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=transfer.IMPORT_BATCH_SIZE)
+    parser.add_argument('--single-rows', type=int, default=2000,
+                        help='rows inserted one at a time through add_mood for comparison')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mindi-import-')
+    database.DATABASE_NAME = os.path.join(workdir, 'import.db')
+    database.init_db()
+    user_id = database.create_user('bench', 'bench@example.com', 'benchmark')
+
+    start = time.perf_counter()
+    for summary in transfer.import_records(user_id, 'moods', csv_lines(args.rows), 'csv', args.batch_size):
+        pass
+    elapsed = time.perf_counter() - start
+    print(f"bulk import: {summary['imported']:,} rows in {elapsed:.1f}s "
+          f"({summary['imported'] / elapsed:,.0f} rows/s, batch {args.batch_size:,})")
+
+    start = time.perf_counter()
+    for i in range(args.single_rows):
+        database.add_mood(user_id, MOOD_TYPES[i % len(MOOD_TYPES)], 5)
+    elapsed = time.perf_counter() - start
+    print(f"add_mood:    {args.single_rows:,} rows in {elapsed:.1f}s "
+          f"({args.single_rows / elapsed:,.0f} rows/s, one commit per row)")
+
+    start = time.perf_counter()
+    exported = sum(chunk.count('\n') for chunk in transfer.export_records(user_id, 'moods', 'csv')) - 1
+    elapsed = time.perf_counter() - start
+    print(f"export:      {exported:,} rows in {elapsed:.1f}s ({exported / elapsed:,.0f} rows/s)")
+
+    database.close_db_connection()
+
+if __name__ == '__main__':
+    main()
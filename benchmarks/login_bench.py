@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import database
+
+# ===================================
+# Login throughput at a given scrypt cost
+#
+#     python -m benchmarks.login_bench --log2n 14 --threads 8 --seconds 5
+#
+# Hammers database.verify_user from many threads (a login storm) while one
+# thread keeps reading the dashboard, and reports login throughput, the
+# hashing pool's queue depth and how much the dashboard reads slowed down.
+# ===================================
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)] if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput benchmark')
+    parser.add_argument('--log2n', type=int, default=14, help='scrypt N as a power of two')
+    parser.add_argument('--workers', type=int, default=database.KDF_WORKERS, help='hashing pool size')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent login threads')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix='mindi-bench-'), 'bench.db')
+    database.SCRYPT_N = 2 ** args.log2n
+    database.hashing_pool = database.HashingPool(workers=args.workers, max_queue=args.threads)
+    database.init_db()
+    user_id = database.create_user('bench', 'bench@example.com', 'benchmark')
+    for i in range(50):
+        database.add_mood(user_id, 'calm', i % 10 + 1)
+
+    stop = threading.Event()
+    login_latencies = []
+    read_latencies = []
+    max_queue_depth = 0
+
+    def login_storm():
+        while not stop.is_set():
+            start = time.perf_counter()
+            database.verify_user('bench', 'benchmark')
+            login_latencies.append(time.perf_counter() - start)
+        database.close_db_connection()
+
+    def dashboard_reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            database.get_dashboard_data(user_id)
+            read_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+        database.close_db_connection()
+
+    # Baseline dashboard read latency with no logins running
+    reader = threading.Thread(target=dashboard_reader)
+    reader.start()
+    time.sleep(1.0)
+    stop.set()
+    reader.join()
+    baseline = list(read_latencies)
+    read_latencies.clear()
+    stop.clear()
+
+    threads = [threading.Thread(target=login_storm) for _ in range(args.threads)]
+    threads.append(threading.Thread(target=dashboard_reader))
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    while time.perf_counter() - start < args.seconds:
+        max_queue_depth = max(max_queue_depth, database.hashing_pool.stats()['queue_depth'])
+        time.sleep(0.01)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"scrypt N=2^{args.log2n}, pool={args.workers} workers, {args.threads} login threads")
+    print(f"logins/s        {len(login_latencies) / elapsed:8.1f}")
+    print(f"login p50/p95   {statistics.median(login_latencies) * 1000:8.1f} / "
+          f"{percentile(login_latencies, 0.95) * 1000:.1f} ms")
+    print(f"max queue depth {max_queue_depth:8d}")
+    print(f"dashboard p95   {percentile(baseline, 0.95) * 1000:8.2f} ms idle -> "
+          f"{percentile(read_latencies, 0.95) * 1000:.2f} ms during storm")
+
+if __name__ == '__main__':
+    main()
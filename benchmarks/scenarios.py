@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+import httpx
+import database
+import ai_service
+from app import app as flask_app
+from benchmarks import datagen
+from benchmarks.async_load import lift_limits, start_sync_server
+from benchmarks.fake_llm import FakeLLMServer
+
+# ===================================
+# Load scenarios against app.py
+#
+#     python -m benchmarks.scenarios --output run.json
+#     python -m benchmarks.scenarios --output new.json --baseline run.json
+#
+# Generates a dataset with benchmarks.datagen (or uses --db), serves app.py
+# from a fixed thread pool with ai_service pointed at the fake OpenRouter, and
+# runs each scenario as a closed loop of HTTP requests:
+#   dashboard    - logged-in users polling /api/dashboard with their ETag while
+#                  check-ins arrive in the background and invalidate it
+#   mood_spike   - a burst of POST /api/mood from many users at once
+#   insights     - POST /api/insights {"force": true}, each waiting on the
+#                  fake LLM
+#   login_storm  - concurrent POST /api/login (scrypt-bound)
+# Requests are spread over --sessions users. Rate limits are lifted unless
+# --keep-limits is given, so the LLM scenarios measure generation, not shedding.
+# Reports throughput and p50/p95/p99 latency per scenario and saves them with
+# the run's settings as JSON. With --baseline, compares against an earlier
+# run and exits non-zero when a scenario regressed beyond --tolerance.
+# ===================================
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    errors = sum(count for status, count in statuses.items() if status == 'transport' or status >= 500)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+async def drive(sessions, concurrency, total, request):
+    """Send `total` requests, at most `concurrency` in flight, spread over the
+    sessions; request(session) returns the HTTP status"""
+    latencies = []
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = await request(sessions[i % len(sessions)])
+            except httpx.TransportError:
+                status = 'transport'
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+# ===================================
+# Scenarios
+# ===================================
+
+def _cookie(session):
+    return {'Cookie': f"{flask_app.config['SESSION_COOKIE_NAME']}={session['cookie']}"}
+
+def _mood(rng):
+    return {'mood_type': rng.choice(datagen.MOOD_TYPES), 'intensity': rng.randint(1, 10)}
+
+async def dashboard(client, sessions, args, rng):
+    async def poll(session):
+        headers = _cookie(session)
+        if session.get('etag'):
+            headers['If-None-Match'] = session['etag']
+        response = await client.get('/api/dashboard', headers=headers)
+        session['etag'] = response.headers.get('ETag', session.get('etag'))
+        return response.status_code
+
+    async def check_ins(stop):
+        # Background writes so some polls miss the cache, like real traffic
+        while not stop.is_set():
+            await client.post('/api/mood', json=_mood(rng), headers=_cookie(rng.choice(sessions)))
+            await asyncio.sleep(1 / args.write_rate)
+
+    stop = asyncio.Event()
+    writer = asyncio.create_task(check_ins(stop)) if args.write_rate > 0 else None
+    try:
+        return await drive(sessions, args.concurrency, args.requests, poll)
+    finally:
+        stop.set()
+        if writer is not None:
+            await writer
+
+async def mood_spike(client, sessions, args, rng):
+    async def post(session):
+        response = await client.post('/api/mood', json=_mood(rng), headers=_cookie(session))
+        return response.status_code
+
+    return await drive(sessions, args.spike_concurrency, args.requests, post)
+
+async def insights(client, sessions, args, rng):
+    async def post(session):
+        response = await client.post('/api/insights', json={'force': True}, headers=_cookie(session))
+        return response.status_code
+
+    return await drive(sessions, args.concurrency, max(1, args.requests // 10), post)
+
+async def login_storm(client, sessions, args, rng):
+    async def login(session):
+        response = await client.post('/api/login', json={
+            'username': session['username'], 'password': datagen.PASSWORD
+        })
+        return response.status_code
+
+    return await drive(sessions, args.concurrency, max(1, args.requests // 10), login)
+
+SCENARIOS = {
+    'dashboard': dashboard,
+    'mood_spike': mood_spike,
+    'insights': insights,
+    'login_storm': login_storm,
+}
+
+async def run_scenarios(base_url, sessions, args):
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=max(args.concurrency, args.spike_concurrency))
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=300) as client:
+        for name in args.scenarios:
+            results[name] = await SCENARIOS[name](client, sessions, args, rng)
+            print_result(name, results[name])
+    return results
+
+# ===================================
+# Setup and Reporting
+# ===================================
+
+def prepare_database(args):
+    """Point database at --db, or generate a fresh dataset in a temp file"""
+    if args.db:
+        database.DATABASE_NAME = args.db
+        database.init_db()
+        return
+    database.DATABASE_NAME = os.path.join(tempfile.mkdtemp(prefix='mindi-scenarios-'), 'bench.db')
+    database.init_db()
+    start = time.perf_counter()
+    datagen.generate(args.users, args.moods, args.entries, args.seed)
+    database.close_db_connection()
+    print(f"dataset: {args.users} users x {args.moods} moods / {args.entries} entries "
+          f"({time.perf_counter() - start:.1f}s)")
+
+def log_in(count):
+    """Session cookies for the first `count` generated users"""
+    sessions = []
+    for n in range(count):
+        # A client per user: logging in on one rotates away its previous session
+        client = flask_app.test_client()
+        username = f'user{n}'
+        response = client.post('/api/login', json={'username': username, 'password': datagen.PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"could not log in as {username}: {response.get_json()}")
+        cookie = client.get_cookie(flask_app.config['SESSION_COOKIE_NAME']).value
+        sessions.append({'username': username, 'cookie': cookie})
+    return sessions
+
+def run_metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cpus': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+    }
+
+def print_result(name, result):
+    print(f"{name:<12} {result['requests']:>7} {result['throughput']:>9.1f} {result['p50_ms']:>8.1f} "
+          f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>6}")
+
+def compare(baseline, current, tolerance):
+    """Print per-scenario changes; returns the names of regressed scenarios"""
+    regressed = []
+    print(f"\n{'vs baseline':<12} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        changes = {key: (result[key] - before[key]) / before[key] if before[key] else 0.0
+                   for key in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms')}
+        worse = changes['throughput'] < -tolerance or changes['p95_ms'] > tolerance
+        if worse:
+            regressed.append(name)
+        print(f"{name:<12} " + ' '.join(f"{changes[key]:>+8.0%}" for key in changes)
+              + ('  REGRESSED' if worse else ''))
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description='Run load scenarios against app.py')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--db', help='use an existing database filled by benchmarks.datagen')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--moods', type=int, default=500, help='moods per generated user')
+    parser.add_argument('--entries', type=int, default=50, help='journal entries per generated user')
+    parser.add_argument('--sessions', type=int, default=20, help='users logged in for the scenarios')
+    parser.add_argument('--threads', type=int, default=8, help='server worker threads')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--spike-concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000,
+                        help='requests per scenario (a tenth for insights and logins)')
+    parser.add_argument('--write-rate', type=float, default=20.0, help='background check-ins/s while polling')
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--llm-jitter', type=float, default=0.3)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--keep-limits', action='store_true', help='leave rate limits and the upstream cap on')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare with the JSON results of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed fractional drop in throughput or rise in p95')
+    args = parser.parse_args()
+
+    prepare_database(args)
+    if not args.keep_limits:
+        lift_limits()
+    fake = FakeLLMServer(latency=args.llm_latency, jitter=args.llm_jitter, error_rate=args.llm_error_rate).start()
+    ai_service.client = ai_service.AIClient(api_url=fake.url, pool_size=args.threads)
+    sessions = log_in(min(args.sessions, args.users))
+    server, base_url = start_sync_server(args.threads)
+
+    results = {'meta': run_metadata(args)}
+    print(f"{'scenario':<12} {'requests':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    results['scenarios'] = asyncio.run(run_scenarios(base_url, sessions, args))
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(baseline, results, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
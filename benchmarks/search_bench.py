@@ -0,0 +1,127 @@
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+import database
+
+# ===================================
+# Journal search: FTS5 vs LIKE
+#
+#     python -m benchmarks.search_bench --entries 1000000 --users 1000
+#
+# Builds a synthetic corpus (Zipf-distributed vocabulary, a long tail of rare
+# words, one heavy user with years of history), then times the same per-user
+# queries through database.search_journal_entries and through the
+# `content LIKE '%...%'` scan it replaces.
+# ===================================
+
+COMMON_WORDS = (
+    'today felt work sleep tired happy anxious calm family friend walk talk '
+    'morning night stress better worse meeting coffee run breathe grateful '
+    'lonely excited worried deadline weekend dinner call mother father home '
+    'rain sun music read write think plan hope quiet busy slow heavy light'
+).split()
+
+def make_vocabulary(size, rng):
+    """Common mood words followed by a tail of synthetic rare words"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    tail = {''.join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(size)}
+    return COMMON_WORDS + sorted(tail)
+
+def generate_entries(count, users, heavy_entries, vocabulary, rng):
+    """Yield (user_id, timestamp, content) rows; user 1 is the heavy user"""
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    start = time.time() - 5 * 365 * 86400
+    for i in range(count):
+        user_id = 1 if i < heavy_entries else rng.randint(2, users)
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(20, 80))
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start + i * 150))
+        yield user_id, timestamp, ' '.join(words).capitalize() + '.'
+
+def build_corpus(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    conn = database._connect()
+    conn.executemany(
+        'INSERT INTO users (id, username, email, password_hash) VALUES (?, ?, ?, ?)',
+        ((uid, f'user{uid}', f'user{uid}@example.com', '-') for uid in range(1, args.users + 1))
+    )
+
+    start = time.perf_counter()
+    conn.executemany(
+        'INSERT INTO journal_entries (user_id, timestamp, content) VALUES (?, ?, ?)',
+        generate_entries(args.entries, args.users, args.heavy_entries, vocabulary, rng)
+    )
+    conn.commit()
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    conn.execute("INSERT INTO journal_fts (journal_fts) VALUES ('optimize')")
+    conn.commit()
+    optimize_time = time.perf_counter() - start
+    conn.close()
+    return vocabulary, insert_time, optimize_time
+
+def like_search(user_id, text, limit):
+    """The scan FTS5 replaces: every word must appear somewhere in the entry"""
+    words = text.replace('*', '').split()
+    sql = ('SELECT id, timestamp, content FROM journal_entries WHERE user_id = ?'
+           + ' AND content LIKE ?' * len(words) + ' ORDER BY timestamp DESC LIMIT ?')
+    conn = database.get_db_connection()
+    return conn.execute(sql, (user_id, *(f'%{w}%' for w in words), limit)).fetchall()
+
+def time_queries(search, user_id, queries, repeat):
+    latencies = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            search(user_id, query, 10)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark journal full-text search')
+    parser.add_argument('--entries', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--heavy-entries', type=int, default=50_000,
+                        help='entries belonging to user 1')
+    parser.add_argument('--vocabulary', type=int, default=20_000, help='rare-word tail size')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mindi-search-')
+    database.DATABASE_NAME = os.path.join(workdir, 'search.db')
+    database.init_db()
+
+    print(f"Building {args.entries:,} entries for {args.users:,} users...")
+    vocabulary, insert_time, optimize_time = build_corpus(args)
+    size_mb = os.path.getsize(database.DATABASE_NAME) / 1e6
+    print(f"insert (with FTS triggers) {insert_time:.1f}s, "
+          f"{args.entries / insert_time:,.0f} rows/s; optimize {optimize_time:.1f}s; db {size_mb:.0f} MB")
+
+    rare = vocabulary[-1]
+    query_sets = {
+        'common term': ['anxious', 'work', 'sleep'],
+        'two terms': ['anxious work', 'tired morning', 'calm walk'],
+        'prefix': ['anx*', 'wor*', 'gra*'],
+        'rare term': [rare],
+        'no match': ['zebra'],
+    }
+    typical_user = 2
+
+    print(f"{'query':<12} {'user':<8} {'fts p50':>9} {'fts p95':>9} {'like p50':>9} {'like p95':>9}  (ms)")
+    for label, queries in query_sets.items():
+        for user_label, user_id in (('heavy', 1), ('typical', typical_user)):
+            fts = time_queries(database.search_journal_entries, user_id, queries, args.repeat)
+            like = time_queries(like_search, user_id, queries, args.repeat)
+            print(f"{label:<12} {user_label:<8} {fts[0]:>9.2f} {fts[1]:>9.2f} {like[0]:>9.2f} {like[1]:>9.2f}")
+
+    database.close_db_connection()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import database
+
+# ===================================
+# Group commit vs per-call commit
+#
+#     python -m benchmarks.write_bench --threads 1 8 32 64 --synchronous FULL
+#
+# Concurrent threads call database.add_mood, first with each call committing
+# on its own connection, then through the group-commit writer. Every run also
+# checks the writer's guarantees and fails loudly if one is broken:
+#   - each caller's returned ID points at its own row (per-caller lastrowid)
+#   - IDs returned to one thread increase in call order (ordering)
+#   - a returned row is already visible to a separate connection (durability)
+#   - no write is lost or duplicated and the rollup agrees with the rows
+# ===================================
+
+def run_writers(user_id, threads, writes, verify_every):
+    latencies = []
+    results = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def writer(thread_no):
+        observer = sqlite3.connect(database.DATABASE_NAME)
+        local_latencies, local_results = [], []
+        try:
+            barrier.wait()
+            for i in range(writes):
+                start = time.perf_counter()
+                mood_id = database.add_mood(user_id, 'calm', 5, f'{thread_no}:{i}')
+                local_latencies.append(time.perf_counter() - start)
+                local_results.append((thread_no, i, mood_id))
+                if verify_every and i % verify_every == 0:
+                    row = observer.execute('SELECT notes FROM moods WHERE id = ?', (mood_id,)).fetchone()
+                    if row is None or row[0] != f'{thread_no}:{i}':
+                        raise AssertionError(f"mood {mood_id} not visible after add_mood returned")
+        except Exception as e:
+            errors.append(e)
+        finally:
+            observer.close()
+            database.close_db_connection()
+            with lock:
+                latencies.extend(local_latencies)
+                results.extend(local_results)
+
+    workers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+    return results, latencies, elapsed
+
+def verify(user_id, results, expected):
+    """Check per-caller IDs, per-thread ordering and completeness"""
+    conn = sqlite3.connect(database.DATABASE_NAME)
+    try:
+        rows = dict(conn.execute('SELECT id, notes FROM moods WHERE user_id = ?', (user_id,)))
+        assert len(results) == expected and len(rows) == expected, \
+            f"expected {expected} writes, got {len(results)} results and {len(rows)} rows"
+        last_id = {}
+        for thread_no, i, mood_id in sorted(results, key=lambda r: (r[0], r[1])):
+            assert rows.get(mood_id) == f'{thread_no}:{i}', f"mood {mood_id} belongs to another caller"
+            assert mood_id > last_id.get(thread_no, 0), f"thread {thread_no} saw IDs out of order"
+            last_id[thread_no] = mood_id
+        rollup = conn.execute('SELECT SUM(count) FROM mood_daily_rollup WHERE user_id = ?', (user_id,)).fetchone()[0]
+        assert rollup == expected, f"rollup counts {rollup} moods, expected {expected}"
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark group commit against per-call commit')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--writes', type=int, default=200, help='writes per thread')
+    parser.add_argument('--latency', type=float, default=database.GROUP_COMMIT_LATENCY)
+    parser.add_argument('--synchronous', default='NORMAL', choices=('OFF', 'NORMAL', 'FULL'),
+                        help='FULL makes every commit fsync, like rollback-journal deployments')
+    parser.add_argument('--verify-every', type=int, default=25,
+                        help='check visibility from another connection every N writes (0 = never)')
+    args = parser.parse_args()
+
+    database.CONNECTION_PRAGMAS = tuple(
+        (name, args.synchronous if name == 'synchronous' else value)
+        for name, value in database.CONNECTION_PRAGMAS
+    )
+    workdir = tempfile.mkdtemp(prefix='mindi-writes-')
+    database.DATABASE_NAME = os.path.join(workdir, 'writes.db')
+    database.init_db()
+    database.group_writer = database.GroupCommitWriter(latency=args.latency)
+
+    print(f"synchronous={args.synchronous}, group latency {args.latency * 1000:.1f} ms, "
+          f"{args.writes} writes per thread")
+    print(f"{'mode':<9} {'threads':>7} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'avg batch':>9}")
+    for threads in args.threads:
+        for group in (False, True):
+            database.GROUP_COMMIT = group
+            user_id = database.create_user(f'w{threads}{group}', f'w{threads}{group}@example.com', 'benchmark')
+            before = database.group_writer.stats()
+
+            results, latencies, elapsed = run_writers(user_id, threads, args.writes, args.verify_every)
+            verify(user_id, results, threads * args.writes)
+
+            after = database.group_writer.stats()
+            batches = after['batches'] - before['batches']
+            avg_batch = (after['writes'] - before['writes']) / batches if batches else 1.0
+            latencies.sort()
+            print(f"{'group' if group else 'per-call':<9} {threads:>7} {len(results) / elapsed:>9,.0f} "
+                  f"{statistics.median(latencies) * 1000:>7.2f} "
+                  f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>7.2f} {avg_batch:>9.1f}")
+
+    database.group_writer.stop()
+    print("guarantees verified: per-caller IDs, per-thread ordering, visibility on return, completeness")
+
+if __name__ == '__main__':
+    main()
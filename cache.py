@@ -0,0 +1,342 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import metrics
+
+# ===================================
+# Two-tier cache shared by worker processes
+#
+# Values are looked up in a per-process LRU first, then in a shared tier every
+# worker sees: a SQLite file next to the main database by default, or any
+# Redis-compatible client through RedisTier. Keys embed a version per scope
+# (e.g. one per user) held in the shared tier, so a write in one worker bumps
+# the version and every worker's old entries simply stop being looked up;
+# nothing has to be deleted or broadcast. Concurrent misses for one key are
+# computed once: threads wait for their process's leader, and other processes
+# wait on a short lease in the shared tier.
+# ===================================
+
+# Entries kept in each process's memory tier
+MEMORY_CACHE_ENTRIES = 2048
+
+# Default lifetime of an entry, in seconds
+CACHE_TTL = 3600
+
+# Size cap of the SQLite tier; the oldest entries go first when it is exceeded
+SHARED_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# SQLite tier writes between size checks
+EVICT_EVERY = 200
+
+# How long one process may hold a key's computation lease (seconds), and how
+# often others poll for its result meanwhile
+LEASE_SECONDS = 10.0
+LEASE_POLL_INTERVAL = 0.01
+
+def encode(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def decode(data):
+    return json.loads(data)
+
+# ===================================
+# Shared Tiers
+# ===================================
+
+class SQLiteTier:
+    """Shared tier in its own SQLite file, so cache writes never queue behind
+    the main database's write lock. `path` may be a callable, read when each
+    thread connects, so the file can follow a repointed main database."""
+
+    SCHEMA = (
+        '''
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            stored_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_cache_entries_stored ON cache_entries (stored_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO cache_versions (scope, version) VALUES ('epoch', abs(random()) % 4294967296)",
+    )
+
+    def __init__(self, path, max_bytes=SHARED_CACHE_MAX_BYTES, evict_every=EVICT_EVERY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        self._local = threading.local()
+
+    def _conn(self):
+        path = self.path() if callable(self.path) else self.path
+        # Connections are per thread and never cross a fork
+        key = (path, os.getpid())
+        if getattr(self._local, 'key', None) != key:
+            conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            # Fixed for the life of the file, so read once per connection
+            epoch = conn.execute("SELECT version FROM cache_versions WHERE scope = 'epoch'").fetchone()[0]
+            self._local.conn, self._local.key, self._local.epoch = conn, key, format(epoch, 'x')
+        return self._local.conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, size, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (key, value, len(value), now, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def add(self, key, value, ttl):
+        """Set only if the key is absent or expired; True if this call set it"""
+        now = time.time()
+        cursor = self._conn().execute(
+            '''
+            INSERT INTO cache_entries (key, value, size, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value, size = excluded.size,
+                stored_at = excluded.stored_at, expires_at = excluded.expires_at
+            WHERE expires_at <= excluded.stored_at
+            ''',
+            (key, value, len(value), now, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+
+    def version(self, scope):
+        row = self._conn().execute('SELECT version FROM cache_versions WHERE scope = ?', (scope,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, scope):
+        return self._conn().execute(
+            '''
+            INSERT INTO cache_versions (scope, version) VALUES (?, 1)
+            ON CONFLICT (scope) DO UPDATE SET version = version + 1
+            RETURNING version
+            ''',
+            (scope,)
+        ).fetchone()[0]
+
+    def epoch(self):
+        self._conn()
+        return self._local.epoch
+
+    def evict(self):
+        """Drop expired entries, then the oldest until under max_bytes"""
+        conn = self._conn()
+        conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (time.time(),))
+        excess = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache_entries').fetchone()[0] - self.max_bytes
+        if excess > 0:
+            # Free an extra tenth so the next writes don't trigger it again
+            conn.execute('''
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY stored_at) AS freed
+                        FROM cache_entries
+                    ) WHERE freed - size < ?
+                )
+            ''', (excess + self.max_bytes // 10,))
+
+    def entries(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+
+class RedisTier:
+    """
+    Shared tier over a Redis-compatible client (redis-py or a stand-in with
+    get / set(ex=, nx=) / delete / incr). Size is bounded by the server's
+    maxmemory policy; use volatile-lru so the TTL-less version counters are
+    never evicted.
+    """
+
+    def __init__(self, client, prefix='mindi:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(self.prefix + key, value, ex=max(1, int(ttl)), nx=True))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def version(self, scope):
+        return int(self.client.get(f'{self.prefix}version:{scope}') or 0)
+
+    def bump(self, scope):
+        return self.client.incr(f'{self.prefix}version:{scope}')
+
+    def epoch(self):
+        self.client.set(f'{self.prefix}epoch', secrets.token_hex(4), nx=True)
+        epoch = self.client.get(f'{self.prefix}epoch')
+        return epoch.decode() if isinstance(epoch, bytes) else epoch
+
+    def entries(self):
+        return None
+
+# ===================================
+# Cache
+# ===================================
+
+_MISSING = object()
+
+class Cache:
+    """Versioned two-tier cache; without a shared tier, versions and entries
+    are per process"""
+
+    def __init__(self, shared=None, max_entries=MEMORY_CACHE_ENTRIES, ttl=CACHE_TTL):
+        self.shared = shared
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()   # key -> (value, expires_at)
+        self._versions = {}
+        self._epoch = secrets.token_hex(4)
+        self._inflight = {}            # key -> Event set when its leader finishes
+        self._lock = threading.Lock()
+
+    @property
+    def epoch(self):
+        """Changes whenever versions may have restarted from zero, so a
+        version-based validator from before can never match again"""
+        return self.shared.epoch() if self.shared is not None else self._epoch
+
+    def version(self, scope):
+        if self.shared is not None:
+            return self.shared.version(scope)
+        return self._versions.get(scope, 0)
+
+    def bump(self, scope):
+        """Invalidate everything cached under a scope, in every process"""
+        if self.shared is not None:
+            return self.shared.bump(scope)
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+            return self._versions[scope]
+
+    def _memory_get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[1] <= time.monotonic():
+                del self._memory[key]
+                return _MISSING
+            self._memory.move_to_end(key)
+            return entry[0]
+
+    def _memory_set(self, key, value, ttl):
+        with self._lock:
+            self._memory[key] = (value, time.monotonic() + ttl)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key, ttl):
+        value = self._memory_get(key)
+        if value is _MISSING and self.shared is not None:
+            data = self.shared.get(key)
+            if data is not None:
+                value = decode(data)
+                self._memory_set(key, value, ttl)
+        return value
+
+    def get_or_compute(self, name, scope, compute, ttl=None, suffix=None, version=None):
+        """
+        The value of compute() for the scope's current version, computed at
+        most once per version across threads and (with a shared tier) processes.
+
+        `suffix` distinguishes variants under one name (e.g. a date range);
+        `version` saves a lookup when the caller has just read it. Values must
+        be JSON-serializable; treat the returned value as read-only.
+        """
+        ttl = ttl or self.ttl
+        # Read the version before computing: a write racing compute() bumps it
+        # afterwards, so a stale value is never filed under the newer version
+        if version is None:
+            version = self.version(scope)
+        key = f'{scope}:{version}:{name}' + (f':{suffix}' if suffix is not None else '')
+
+        value = self._lookup(key, ttl)
+        if value is not _MISSING:
+            metrics.record_cache(name, True)
+            return value
+        metrics.record_cache(name, False)
+
+        # Single flight within the process
+        with self._lock:
+            leader = key not in self._inflight
+            if leader:
+                self._inflight[key] = threading.Event()
+            done = self._inflight[key]
+        if not leader:
+            done.wait(LEASE_SECONDS)
+            value = self._lookup(key, ttl)
+            return value if value is not _MISSING else compute()
+
+        try:
+            value = self._compute_once(key, compute, ttl)
+            self._memory_set(key, value, ttl)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            done.set()
+
+    def _compute_once(self, key, compute, ttl):
+        """Compute a missing value, letting only one process at a time do so"""
+        if self.shared is None:
+            return compute()
+        lease = f'lease:{key}'
+        deadline = time.monotonic() + LEASE_SECONDS
+        while not self.shared.add(lease, b'1', LEASE_SECONDS):
+            # Another process is computing it; wait for its result
+            if time.monotonic() >= deadline:
+                return compute()
+            time.sleep(LEASE_POLL_INTERVAL)
+            data = self.shared.get(key)
+            if data is not None:
+                return decode(data)
+        try:
+            # The previous holder may have stored it just before letting go
+            data = self.shared.get(key)
+            if data is not None:
+                return decode(data)
+            value = compute()
+            self.shared.set(key, encode(value), ttl)
+            return value
+        finally:
+            self.shared.delete(lease)
+
+    def stats(self):
+        with self._lock:
+            memory = len(self._memory)
+        return {'memory_entries': memory, 'shared_entries': self.shared.entries() if self.shared else None}
@@ -0,0 +1,408 @@
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import database
+import embeddings
+import limits
+import metrics as metrics_registry
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# ===================================
+# Prompt context budgeting
+#
+# Measures prompt sections in tokens and fits them to fixed budgets, so the
+# size (and so the latency and cost) of every LLM call is bounded however
+# much history a user has. Long-term history reaches the prompt through a
+# rolling per-user summary kept in SQLite and folded forward incrementally.
+# ===================================
+
+# Token budgets for the insight prompt, per section
+SUMMARY_TOKENS = 200
+MOOD_TOKENS = 200
+JOURNAL_TOKENS = 600
+ENTRY_TOKENS = 150
+RELATED_TOKENS = 300
+
+# Rows loaded per insight; the budgets decide how many actually fit
+INSIGHT_MOODS = 30
+INSIGHT_ENTRIES = 10
+
+# Earlier entries similar to the newest ones, found through embeddings.py and
+# matched against this many of the newest entries
+RELATED_ENTRIES = 3
+RELATED_QUERY_ENTRIES = 3
+
+# Token budgets for the journal response prompt
+JOURNAL_ENTRY_PROMPT_TOKENS = 1200
+JOURNAL_HISTORY_TOKENS = 600
+
+# Rolling summary: months of per-month mood counts kept, theme terms stored and
+# shown, and how much older entries' themes fade with each new entry
+SUMMARY_MONTHS = 6
+SUMMARY_THEMES = 100
+SUMMARY_THEMES_SHOWN = 8
+THEME_DECAY = 0.97
+
+# Fresh (not reused) insights a user may generate per window (seconds)
+INSIGHT_RATE_LIMIT = 10
+INSIGHT_RATE_WINDOW = 3600
+
+# Characters per token for the fallback estimate (English prose averages ~4)
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger('mindi.prompts')
+
+_encoding = tiktoken.get_encoding('cl100k_base') if tiktoken else None
+
+# ===================================
+# Token Counting
+# ===================================
+
+def count_tokens(text):
+    """Number of tokens in text (estimated when tiktoken is not installed)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def truncate_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, at a word boundary, marking the cut with …"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        cut = _encoding.decode(_encoding.encode(text)[:max_tokens - 1])
+    else:
+        cut = text[:(max_tokens - 1) * CHARS_PER_TOKEN]
+    space = cut.rfind(' ')
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '…'
+
+def fit_items(items, budget, separator=', '):
+    """Keep items in order while their joined size stays within budget tokens"""
+    kept = []
+    used = 0
+    for item in items:
+        cost = count_tokens(item) + (count_tokens(separator) if kept else 0)
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return kept
+
+def fit_messages(messages, budget):
+    """The most recent chat messages that fit within budget tokens, oldest first"""
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        cost = count_tokens(message.get('content', '')) + 4  # role and framing
+        if used + cost > budget:
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return kept
+
+# ===================================
+# Prompt Sections
+# ===================================
+
+def insight_sections(mood_data, journal_entries, history_summary=None):
+    """Budgeted text for each part of the insight prompt, plus what was kept.
+    Entries carrying a `similarity` are related earlier entries, shown apart
+    from the recent ones under their own budget."""
+    mood_items = [f"{mood['mood_type']} (intensity: {mood['intensity']}/10)" for mood in mood_data]
+    moods = fit_items(mood_items, MOOD_TOKENS)
+
+    recent = [entry for entry in journal_entries if 'similarity' not in entry]
+    entry_items = [truncate_tokens(entry['content'], ENTRY_TOKENS) for entry in recent]
+    entries = fit_items(entry_items, JOURNAL_TOKENS, separator='\n- ')
+
+    related_items = [f"({entry['timestamp'][:10]}) {truncate_tokens(entry['content'], ENTRY_TOKENS)}"
+                     for entry in journal_entries if 'similarity' in entry]
+    related = fit_items(related_items, RELATED_TOKENS, separator='\n- ')
+
+    summary = truncate_tokens(history_summary, SUMMARY_TOKENS) if history_summary else ''
+
+    return {
+        'moods': ', '.join(moods),
+        'journal_entries': entries,
+        'related_entries': related,
+        'summary': summary,
+        'stats': {
+            'moods': f'{len(moods)}/{len(mood_items)}',
+            'journal_entries': f'{len(entries)}/{len(entry_items)}',
+            'related_entries': f'{len(related)}/{len(related_items)}',
+            'summary_tokens': count_tokens(summary),
+            'trimmed': (len(moods) < len(mood_items) or len(entries) < len(entry_items)
+                        or len(related) < len(related_items)
+                        or entry_items != [entry['content'] for entry in recent]
+                        or summary != (history_summary or '')),
+        },
+    }
+
+def journal_sections(entry_content, conversation_history=None):
+    """Budgeted entry text and conversation history for the journal prompt"""
+    history = fit_messages(list(conversation_history or []), JOURNAL_HISTORY_TOKENS)
+    entry = truncate_tokens(entry_content, JOURNAL_ENTRY_PROMPT_TOKENS)
+    return {
+        'entry': entry,
+        'history': history,
+        'stats': {
+            'history_messages': f'{len(history)}/{len(conversation_history or [])}',
+            'trimmed': entry != entry_content or len(history) < len(conversation_history or []),
+        },
+    }
+
+# ===================================
+# Rolling Per-User Summary
+# ===================================
+
+STOPWORDS = frozenset('''
+    about after again also always around because been before being could didn't
+    doesn't don't down even every feel feeling felt from going have just know
+    like little made make much need never only other really should some still
+    than that their them then there these they thing things think this though
+    through today very want was were what when where which while will with
+    would your yourself been into more most over such that's it's i'm i've
+'''.split())
+
+def empty_summary():
+    return {'moods': {'count': 0, 'intensity_sum': 0, 'types': {}},
+            'months': {}, 'journal': {'count': 0, 'themes': {}},
+            'first_day': None, 'last_day': None}
+
+def _fold_day(summary, day):
+    if day:
+        summary['first_day'] = min(summary['first_day'] or day, day)
+        summary['last_day'] = max(summary['last_day'] or day, day)
+
+def fold_moods(summary, moods, last_id=0):
+    """Add moods (oldest first) to the summary's running totals and per-month
+    counts; returns the highest mood ID folded"""
+    totals = summary['moods']
+    for mood in moods:
+        last_id = mood['id']
+        totals['count'] += 1
+        totals['intensity_sum'] += mood['intensity']
+        totals['types'][mood['mood_type']] = totals['types'].get(mood['mood_type'], 0) + 1
+        month = summary['months'].setdefault(mood['timestamp'][:7], {})
+        month[mood['mood_type']] = month.get(mood['mood_type'], 0) + 1
+        _fold_day(summary, mood['timestamp'][:10])
+
+    for month in sorted(summary['months'])[:-SUMMARY_MONTHS]:
+        del summary['months'][month]
+    return last_id
+
+def fold_journal_entries(summary, entries, last_id=0):
+    """Add journal entries (oldest first) to the decayed theme counts;
+    returns the highest entry ID folded"""
+    journal = summary['journal']
+    themes = Counter(journal['themes'])
+    # Rather than decaying every weight per entry, weigh each newer entry by a
+    # growing boost and divide once at the end (renormalizing before overflow)
+    boost = 1.0
+    for entry in entries:
+        last_id = entry['id']
+        journal['count'] += 1
+        boost /= THEME_DECAY
+        for term in set(re.findall(r"[a-z']{4,}", entry['content'].lower())) - STOPWORDS:
+            themes[term] += boost
+        if boost > 1e9 or len(themes) > 10 * SUMMARY_THEMES:
+            themes = Counter({term: weight / boost for term, weight in themes.most_common(2 * SUMMARY_THEMES)})
+            boost = 1.0
+        _fold_day(summary, entry['timestamp'][:10])
+
+    journal['themes'] = {term: round(weight / boost, 3) for term, weight in themes.most_common(SUMMARY_THEMES)}
+    return last_id
+
+def render_summary(summary):
+    """One short paragraph describing a user's long-term history"""
+    totals = summary['moods']
+    if not totals['count'] and not summary['journal']['count']:
+        return ''
+
+    lines = [f"History since {summary['first_day']} ({totals['count']} check-ins, "
+             f"{summary['journal']['count']} journal entries)."]
+    if totals['count']:
+        top = sorted(totals['types'].items(), key=lambda item: -item[1])[:3]
+        shares = ', '.join(f"{mood} ({count * 100 // totals['count']}%)" for mood, count in top)
+        lines.append(f"Most often {shares}; average intensity "
+                     f"{totals['intensity_sum'] / totals['count']:.1f}/10.")
+    if summary['months']:
+        months = ', '.join(f"{month} mostly {max(counts, key=counts.get)}"
+                           for month, counts in sorted(summary['months'].items()))
+        lines.append(f"By month: {months}.")
+    themes = list(summary['journal']['themes'])[:SUMMARY_THEMES_SHOWN]
+    if themes:
+        lines.append(f"Recurring journal themes: {', '.join(themes)}.")
+    return ' '.join(lines)
+
+def fold_summary(user_id):
+    """The stored summary with moods and entries added since the last refresh
+    folded in, unsaved; returns (summary, last_mood_id, last_entry_id, changed).
+    Untouched history is never re-read."""
+    stored = database.get_context_summary(user_id)
+    if stored:
+        summary, last_mood_id, last_entry_id = stored['summary'], stored['last_mood_id'], stored['last_entry_id']
+    else:
+        summary, last_mood_id, last_entry_id = empty_summary(), 0, 0
+
+    mood_id = fold_moods(summary, database.iter_moods_since(user_id, last_mood_id), last_mood_id)
+    entry_id = fold_journal_entries(
+        summary, database.iter_journal_entries_since(user_id, last_entry_id), last_entry_id
+    )
+    return summary, mood_id, entry_id, (mood_id, entry_id) != (last_mood_id, last_entry_id)
+
+def refresh_summary(user_id):
+    """Fold new moods and entries into the stored summary, save it and return
+    it rendered"""
+    summary, mood_id, entry_id, changed = fold_summary(user_id)
+    if changed:
+        database.save_context_summary(user_id, summary, mood_id, entry_id)
+    return render_summary(summary)
+
+def find_related_entries(user_id, recent_entries):
+    """Earlier entries most like the newest ones ("the last time I felt like
+    this"); a failed lookup only costs the prompt that section"""
+    if not recent_entries:
+        return []
+    text = '\n'.join(entry['content'] for entry in recent_entries[:RELATED_QUERY_ENTRIES])
+    try:
+        return embeddings.find_similar(user_id, text, RELATED_ENTRIES,
+                                       exclude=[entry['id'] for entry in recent_entries])
+    except Exception as e:
+        print(f"Error finding related journal entries: {e}")
+        return []
+
+# ===================================
+# Insight Reuse
+# ===================================
+
+class InsightRateLimited(Exception):
+    """Raised when a user has generated INSIGHT_RATE_LIMIT insights this window"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Insight rate limit reached; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+def context_fingerprint(moods, journal_entries, history_summary):
+    """Identify an insight's input by the recent mood and journal IDs and the
+    summary it was built from. Related entries are left out: they shift as
+    embeddings catch up, which would defeat reuse without the user logging
+    anything; the summary covers rows imported behind the recent ones."""
+    ids = f"m:{','.join(str(mood['id']) for mood in moods)};j:{','.join(str(entry['id']) for entry in journal_entries)}"
+    return hashlib.sha256(f"{ids};s:{history_summary or ''}".encode()).hexdigest()[:32]
+
+def prepare_insight(user_id, force=False):
+    """
+    Load an insight's context and decide whether it needs generating
+
+    Returns (context, fingerprint, reusable) where context is the
+    (moods, journal_entries, history_summary) triple and reusable is the
+    user's latest insight when it was built from the same context (always
+    None with force). Raises InsightRateLimited when a fresh insight would
+    exceed the user's hourly limit or LLM budget (see limits.py).
+
+    Only the reads needed for the fingerprint happen before those checks: the
+    summary write and the related-entry search are left to admitted requests,
+    and a reused insight's context carries no related entries.
+    """
+    moods = database.get_recent_moods(user_id, INSIGHT_MOODS)
+    journal_entries = database.get_recent_journal_entries(user_id, INSIGHT_ENTRIES)
+    summary, mood_id, entry_id, changed = fold_summary(user_id)
+    history_summary = render_summary(summary)
+    fingerprint = context_fingerprint(moods, journal_entries, history_summary)
+
+    if not force:
+        latest = database.get_recent_insights(user_id, 1)
+        if latest and latest[0]['context_hash'] == fingerprint:
+            return (moods, journal_entries, history_summary), fingerprint, latest[0]
+
+    now = datetime.now()
+    count, oldest = database.get_insight_rate(user_id, now - timedelta(seconds=INSIGHT_RATE_WINDOW))
+    if count >= INSIGHT_RATE_LIMIT:
+        reopens = datetime.fromisoformat(oldest) + timedelta(seconds=INSIGHT_RATE_WINDOW)
+        raise InsightRateLimited(max(1, int((reopens - now).total_seconds()) + 1))
+
+    # The short-term LLM budget shared with moods and journal entries
+    allowed, retry_after = limits.admit_user(user_id)
+    if not allowed:
+        raise InsightRateLimited(max(1, math.ceil(retry_after)))
+
+    if changed:
+        database.save_context_summary(user_id, summary, mood_id, entry_id)
+    context = (moods, journal_entries + find_related_entries(user_id, journal_entries), history_summary)
+    return context, fingerprint, None
+
+# ===================================
+# Prompt Metrics
+# ===================================
+
+class PromptMetrics:
+    """Per-kind prompt size totals, plus upstream-reported token usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def _kind(self, kind):
+        return self._kinds.setdefault(kind, {
+            'calls': 0, 'prompt_tokens': 0, 'max_prompt_tokens': 0, 'trimmed': 0,
+            'usage_prompt_tokens': 0, 'usage_completion_tokens': 0,
+        })
+
+    def record_prompt(self, kind, messages, stats):
+        """Record one outgoing prompt and log its size"""
+        tokens = sum(count_tokens(message.get('content', '')) for message in messages)
+        with self._lock:
+            totals = self._kind(kind)
+            totals['calls'] += 1
+            totals['prompt_tokens'] += tokens
+            totals['max_prompt_tokens'] = max(totals['max_prompt_tokens'], tokens)
+            totals['trimmed'] += bool(stats.get('trimmed'))
+        logger.info("prompt kind=%s tokens=%d %s", kind, tokens,
+                    ' '.join(f'{key}={value}' for key, value in stats.items()))
+        return tokens
+
+    def record_usage(self, kind, usage):
+        """Record the token counts the upstream reported for a completed call"""
+        if not usage:
+            return
+        with self._lock:
+            totals = self._kind(kind)
+            totals['usage_prompt_tokens'] += usage.get('prompt_tokens') or 0
+            totals['usage_completion_tokens'] += usage.get('completion_tokens') or 0
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(totals) for kind, totals in self._kinds.items()}
+
+metrics = PromptMetrics()
+
+@metrics_registry.registry.collector
+def collect_metrics():
+    """Prompt sizes and upstream token usage per prompt kind, read at scrape time"""
+    kinds = sorted(metrics.snapshot().items())
+    return [
+        ('mindi_prompts_total', 'counter', 'Prompts sent upstream', ('kind',),
+         [((kind,), totals['calls']) for kind, totals in kinds]),
+        ('mindi_prompts_trimmed_total', 'counter', 'Prompts cut down to fit their token budgets', ('kind',),
+         [((kind,), totals['trimmed']) for kind, totals in kinds]),
+        ('mindi_prompt_tokens_max', 'gauge', 'Largest prompt sent, in tokens', ('kind',),
+         [((kind,), totals['max_prompt_tokens']) for kind, totals in kinds]),
+        ('mindi_llm_tokens_total', 'counter', 'Tokens by prompt kind: prompt = as measured locally, '
+         'usage_* = as reported by the upstream', ('kind', 'type'),
+         [((kind, name), totals[key]) for kind, totals in kinds
+          for name, key in (('prompt', 'prompt_tokens'), ('usage_prompt', 'usage_prompt_tokens'),
+                            ('usage_completion', 'usage_completion_tokens'))]),
+    ]
@@ -1,14 +1,60 @@
 import sqlite3
-from datetime import datetime
+import os
+import re
+import time
+from datetime import datetime, timedelta
 import json
 import hashlib
+import hmac
+import base64
 import secrets
+import threading
+import queue
+import heapq
+from collections import OrderedDict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from flask import g, has_app_context
+import zlib
+import cache
+import metrics
+
+try:
+    import zstandard
+except ImportError:  # archives are written with zlib
+    zstandard = None
 
 DATABASE_NAME = 'mindi.db'
 
+# Idle connections kept open per process; extra connections are closed on release
+POOL_SIZE = 8
+
+# Send add_mood / add_journal_entry / add_insight through the group-commit
+# writer: one thread commits concurrent writes together instead of each
+# request committing (and contending for the write lock) on its own
+GROUP_COMMIT = False
+
+# How long a batch stays open after its first write (seconds), and its size cap
+GROUP_COMMIT_LATENCY = 0.005
+GROUP_COMMIT_MAX_BATCH = 256
+
+# Applied to every new connection. WAL lets readers proceed while a writer holds
+# the lock; synchronous=NORMAL is durable across app crashes in WAL mode.
+# auto_vacuum must come before journal_mode to apply to a new database file;
+# an existing file keeps its mode until a full VACUUM (see retention.py).
+CONNECTION_PRAGMAS = (
+    ('auto_vacuum', 'INCREMENTAL'),
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -16000),       # ~16 MB page cache (negative = KiB)
+    ('mmap_size', 134217728),     # 128 MB memory-mapped I/O
+    ('temp_store', 'MEMORY'),
+)
+
 def init_db():
     """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = _connect()
     cursor = conn.cursor()
     
     # Create users table
@@ -63,23 +109,816 @@ def init_db():
     ''')
     
     conn.commit()
+    run_migrations(conn)
     conn.close()
     print("Database initialized successfully!")
 
-def get_db_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DATABASE_NAME)
+# ===================================
+# Connection Pool
+# ===================================
+
+def _connect():
+    """Open a new connection with the standard pragmas applied"""
+    conn = sqlite3.connect(DATABASE_NAME, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    # Lets SQL read archived history through json_each (see MOOD_HISTORY_SQL)
+    conn.create_function('archive_json', 2, decompress_archive, deterministic=True)
+    return conn
+
+class ConnectionPool:
+    """Thread-safe pool of reusable SQLite connections"""
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._database = DATABASE_NAME
+
+    def acquire(self):
+        """Borrow an idle connection, or open a new one if none is free"""
+        with self._lock:
+            # DATABASE_NAME may be repointed (e.g. tests); drop stale connections
+            if self._database != DATABASE_NAME:
+                self._drain()
+                self._database = DATABASE_NAME
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return _connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._database == DATABASE_NAME and self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pool = ConnectionPool()
+_local = threading.local()
+
+def get_db_connection():
+    """Get the connection bound to the current request, or to the current thread
+    when called outside a Flask app context (background workers, CLI)."""
+    if has_app_context():
+        if 'db_conn' not in g:
+            g.db_conn = _pool.acquire()
+        return g.db_conn
+
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = _pool.acquire()
     return conn
 
+def close_db_connection(exception=None):
+    """Release the current request's or thread's connection back to the pool.
+    Registered as an app-context teardown handler in app.py."""
+    if has_app_context():
+        conn = g.pop('db_conn', None)
+    else:
+        conn = getattr(_local, 'conn', None)
+        _local.conn = None
+    if conn is not None:
+        _pool.release(conn)
+
 # ===================================
-# User Authentication Functions
+# Group Commit Writer
+# ===================================
+
+class _PendingWrite:
+    __slots__ = ('func', 'args', 'done', 'result', 'error')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class GroupCommitWriter:
+    """One writer thread that applies queued writes and commits them in batches.
+
+    Guarantees, for writes submitted through submit():
+      * Durability: submit() returns only after the transaction holding the
+        write has committed, so a returned ID is as durable as a per-call
+        commit under the same pragmas (WAL + synchronous=NORMAL: survives an
+        application crash, the last commits may be lost on power failure).
+      * Ordering: writes are applied in the order they were queued, so IDs
+        grow in submission order and a caller sees its own writes in order.
+      * Isolation: each write runs in its own SAVEPOINT; one that raises is
+        rolled back alone and its caller gets the exception. If the COMMIT
+        itself fails, every caller in that batch gets the error.
+    A batch takes every write that queued up while the previous batch was
+    committing and closes as soon as the queue runs dry, so a lone write is
+    committed immediately. Under a steady stream it closes `latency` seconds
+    after it opened, or at `max_batch` writes, bounding the added latency.
+    """
+
+    def __init__(self, latency=GROUP_COMMIT_LATENCY, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.latency = latency
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """Run func(conn, *args) in the next batch and return its result"""
+        self._ensure_started()
+        write = _PendingWrite(func, args)
+        self._queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def stop(self, timeout=None):
+        """Commit everything already queued, then stop the writer thread"""
+        if self._pid == os.getpid() and self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'writes': self.writes,
+            'avg_batch': self.writes / self.batches if self.batches else 0.0,
+        }
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so start once per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.latency
+        while len(batch) < self.max_batch and time.monotonic() < deadline:
+            try:
+                write = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if write is None:
+                self._queue.put(None)
+                break
+            batch.append(write)
+        return batch
+
+    def _run(self):
+        conn = None
+        database_name = None
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                if conn is None or database_name != DATABASE_NAME:
+                    if conn is not None:
+                        conn.close()
+                    conn, database_name = _connect(), DATABASE_NAME
+                self._commit(conn, batch)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, batch):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for write in batch:
+                conn.execute('SAVEPOINT group_write')
+                try:
+                    write.result = write.func(conn, *write.args)
+                    conn.execute('RELEASE group_write')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO group_write')
+                    conn.execute('RELEASE group_write')
+                    write.error = e
+            conn.commit()
+        except Exception as e:
+            print(f"Error committing write batch: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            for write in batch:
+                write.error = e
+
+        self.batches += 1
+        self.writes += len(batch)
+        for write in batch:
+            write.done.set()
+
+group_writer = GroupCommitWriter()
+
+def _write(func, *args):
+    """Apply func(conn, *args) and commit, directly or via the group writer"""
+    if GROUP_COMMIT:
+        return group_writer.submit(func, *args)
+
+    conn = get_db_connection()
+    try:
+        result = func(conn, *args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return result
+
+# ===================================
+# Schema Migrations
+# ===================================
+
+# Ordered, append-only list of (version, description, steps). A step is either
+# a SQL string or a callable taking the connection. Steps must be idempotent so
+# a partially applied upgrade can simply be re-run.
+
+def _add_column(table, column, definition):
+    """Migration step adding a column unless it is already there (SQLite has no
+    ADD COLUMN IF NOT EXISTS)"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return step
+
+MIGRATIONS = [
+    (1, 'Index per-user history by timestamp', [
+        'CREATE INDEX IF NOT EXISTS idx_moods_user_timestamp '
+        'ON moods (user_id, timestamp DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_journal_entries_user_timestamp '
+        'ON journal_entries (user_id, timestamp DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_insights_user_timestamp '
+        'ON insights (user_id, timestamp DESC)',
+    ]),
+    (2, 'Add per-day mood rollup for statistics', [
+        '''
+        CREATE TABLE IF NOT EXISTS mood_daily_rollup (
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            mood_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            intensity_sum INTEGER NOT NULL,
+            intensity_min INTEGER NOT NULL,
+            intensity_max INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, mood_type)
+        ) WITHOUT ROWID
+        ''',
+        # Backfill from existing history; REPLACE keeps a re-run idempotent
+        '''
+        INSERT OR REPLACE INTO mood_daily_rollup
+            (user_id, day, mood_type, count, intensity_sum, intensity_min, intensity_max)
+        SELECT user_id, substr(timestamp, 1, 10), mood_type,
+               COUNT(*), SUM(intensity), MIN(intensity), MAX(intensity)
+        FROM moods
+        GROUP BY user_id, substr(timestamp, 1, 10), mood_type
+        ''',
+    ]),
+    (3, 'Add persistent AI job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS ai_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_ai_jobs_status ON ai_jobs (status, id)',
+    ]),
+    (4, 'Add persistent AI suggestion cache', [
+        '''
+        CREATE TABLE IF NOT EXISTS suggestion_cache (
+            mood_type TEXT NOT NULL,
+            intensity INTEGER NOT NULL,
+            suggestion TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (mood_type, intensity, suggestion)
+        )
+        ''',
+    ]),
+    # Ascending (user_id, timestamp) keys end in the implicit rowid, so one
+    # backward index scan yields ORDER BY timestamp DESC, id DESC and the
+    # (timestamp, id) keyset seek without a sort. They replace version 1's
+    # DESC indexes, whose trailing rowid runs the wrong way for that order.
+    (5, 'Index per-user history for keyset pagination', [
+        'DROP INDEX IF EXISTS idx_moods_user_timestamp',
+        'DROP INDEX IF EXISTS idx_journal_entries_user_timestamp',
+        'DROP INDEX IF EXISTS idx_insights_user_timestamp',
+        'CREATE INDEX IF NOT EXISTS idx_moods_user_timestamp_id '
+        'ON moods (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_journal_entries_user_timestamp_id '
+        'ON journal_entries (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_insights_user_timestamp_id '
+        'ON insights (user_id, timestamp)',
+    ]),
+    # External-content FTS5 index over journal_entries: the text is stored
+    # once, in journal_entries, and read back through the view for snippets.
+    # `owner` holds a per-user token ("u42") so a search intersects posting
+    # lists inside FTS5 instead of ranking every user's matches then filtering.
+    (6, 'Add full-text search over journal entries', [
+        '''
+        CREATE VIEW IF NOT EXISTS journal_fts_source AS
+        SELECT id, content, 'u' || user_id AS owner FROM journal_entries
+        ''',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS journal_fts USING fts5(
+            content, owner,
+            content='journal_fts_source', content_rowid='id',
+            tokenize='porter unicode61', prefix='2 3'
+        )
+        ''',
+        # Rank on the text only; the owner token carries no relevance
+        "INSERT INTO journal_fts (journal_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS journal_fts_insert AFTER INSERT ON journal_entries BEGIN
+            INSERT INTO journal_fts (rowid, content, owner)
+            VALUES (new.id, new.content, 'u' || new.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS journal_fts_delete AFTER DELETE ON journal_entries BEGIN
+            INSERT INTO journal_fts (journal_fts, rowid, content, owner)
+            VALUES ('delete', old.id, old.content, 'u' || old.user_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS journal_fts_update AFTER UPDATE ON journal_entries BEGIN
+            INSERT INTO journal_fts (journal_fts, rowid, content, owner)
+            VALUES ('delete', old.id, old.content, 'u' || old.user_id);
+            INSERT INTO journal_fts (rowid, content, owner)
+            VALUES (new.id, new.content, 'u' || new.user_id);
+        END
+        ''',
+        # Backfill existing entries
+        "INSERT INTO journal_fts (journal_fts) VALUES ('rebuild')",
+    ]),
+    (7, 'Add rolling per-user context summary', [
+        '''
+        CREATE TABLE IF NOT EXISTS user_context_summary (
+            user_id INTEGER PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_mood_id INTEGER NOT NULL DEFAULT 0,
+            last_entry_id INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+    (8, 'Fingerprint the context each insight was generated from', [
+        _add_column('insights', 'context_hash', 'TEXT'),
+    ]),
+    (9, 'Add server-side session store', [
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)',
+    ]),
+    # One quantized vector per journal entry; `model` names the encoder that
+    # produced it, so switching encoders re-embeds entries instead of mixing
+    # incomparable vectors
+    (10, 'Add journal entry embeddings', [
+        '''
+        CREATE TABLE IF NOT EXISTS journal_embeddings (
+            entry_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            model TEXT NOT NULL,
+            vector BLOB NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_journal_embeddings_user_model '
+        'ON journal_embeddings (user_id, model, entry_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS journal_embeddings_delete AFTER DELETE ON journal_entries BEGIN
+            DELETE FROM journal_embeddings WHERE entry_id = old.id;
+        END
+        ''',
+    ]),
+    (11, 'Add shared rate limit buckets', [
+        '''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    # Rows past the retention horizon, one compressed chunk per user, table
+    # and month; see the History Archive section and retention.py
+    (12, 'Add compressed history archive', [
+        '''
+        CREATE TABLE IF NOT EXISTS history_archive (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            period TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            raw_bytes INTEGER NOT NULL,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, kind, period),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+]
+
+# Folds one or more moods into their (user, day, mood_type) rollup row
+MOOD_ROLLUP_UPSERT = '''
+    INSERT INTO mood_daily_rollup
+        (user_id, day, mood_type, count, intensity_sum, intensity_min, intensity_max)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, day, mood_type) DO UPDATE SET
+        count = count + excluded.count,
+        intensity_sum = intensity_sum + excluded.intensity_sum,
+        intensity_min = MIN(intensity_min, excluded.intensity_min),
+        intensity_max = MAX(intensity_max, excluded.intensity_max)
+'''
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def run_migrations(conn=None):
+    """Apply any pending migrations, one transaction per version.
+
+    Each version takes the write lock with BEGIN IMMEDIATE, so concurrent
+    workers starting against the same database apply it exactly once while
+    WAL readers keep serving from the previous snapshot.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+
+    try:
+        current = get_schema_version(conn)
+        conn.commit()
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                applied = conn.execute(
+                    'SELECT 1 FROM schema_version WHERE version = ?', (version,)
+                ).fetchone()
+                if not applied:
+                    for step in steps:
+                        if callable(step):
+                            step(conn)
+                        else:
+                            conn.execute(step)
+                    conn.execute(
+                        'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                        (version, description)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if not applied:
+                print(f"Applied migration {version}: {description}")
+        return get_schema_version(conn)
+    finally:
+        if own_conn:
+            conn.close()
+
+# ===================================
+# Query Plan Checks
+# ===================================
+
+# Queries on the dashboard path; each must be answered from an index
+HOT_QUERIES = {
+    'recent_moods': (
+        'SELECT * FROM moods WHERE user_id = ? '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    'recent_journal_entries': (
+        'SELECT * FROM journal_entries WHERE user_id = ? '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    'recent_insights': (
+        'SELECT * FROM insights WHERE user_id = ? '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    # Keyset pages: seek past the previous page's last (timestamp, id)
+    'moods_page': (
+        'SELECT * FROM moods WHERE user_id = ? AND (timestamp, id) < (?, ?) '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    'journal_entries_page': (
+        'SELECT * FROM journal_entries WHERE user_id = ? AND (timestamp, id) < (?, ?) '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    'insights_page': (
+        'SELECT * FROM insights WHERE user_id = ? AND (timestamp, id) < (?, ?) '
+        'ORDER BY timestamp DESC, id DESC LIMIT ?'
+    ),
+    # Ranked journal search; FTS5 applies ORDER BY rank itself, without a sort.
+    # The score is not selected: every bm25() call re-reads each term's full
+    # doclist for its IDF, so returning it would double the query's cost.
+    'journal_search': '''
+        SELECT e.id, e.timestamp, e.content, e.mood_tags,
+               snippet(journal_fts, 0, '[', ']', '…', 16) AS snippet
+        FROM journal_fts
+        JOIN journal_entries e ON e.id = journal_fts.rowid
+        WHERE journal_fts MATCH ?
+        ORDER BY journal_fts.rank
+        LIMIT ?
+    ''',
+    # Insights generated inside the rate-limit window, and the oldest of them
+    'insight_rate': (
+        'SELECT COUNT(*) AS count, MIN(timestamp) AS oldest FROM insights '
+        'WHERE user_id = ? AND timestamp >= ?'
+    ),
+    # Embedded vectors of a user's entries past an ID, for incremental loads
+    'journal_embeddings_since': (
+        'SELECT entry_id, vector FROM journal_embeddings '
+        'WHERE user_id = ? AND model = ? AND entry_id > ? ORDER BY entry_id'
+    ),
+    # Full-history exports, oldest first, streamed off the same indexes
+    'export_moods': (
+        'SELECT id, timestamp, mood_type, intensity, notes FROM moods '
+        'WHERE user_id = ? ORDER BY timestamp, id'
+    ),
+    'export_journal_entries': (
+        'SELECT id, timestamp, content, mood_tags FROM journal_entries '
+        'WHERE user_id = ? ORDER BY timestamp, id'
+    ),
+    # Archived chunks read back through history pages (newest first, for the
+    # months between the page's last row and the cursor) and exports (oldest first)
+    'archive_chunks': (
+        'SELECT codec, data FROM history_archive WHERE user_id = ? AND kind = ? '
+        'AND period <= ? AND period >= ? ORDER BY period DESC'
+    ),
+    'export_archive_chunks': (
+        'SELECT codec, data FROM history_archive WHERE user_id = ? AND kind = ? ORDER BY period'
+    ),
+    'mood_stats': '''
+        SELECT mood_type,
+               SUM(count) AS count,
+               CAST(SUM(intensity_sum) AS REAL) / SUM(count) AS avg_intensity,
+               MIN(intensity_min) AS min_intensity,
+               MAX(intensity_max) AS max_intensity
+        FROM mood_daily_rollup
+        WHERE user_id = ? AND day >= ?
+        GROUP BY mood_type
+    ''',
+}
+
+def explain_query(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row[3] for row in rows]
+
+def check_query_plans(conn=None):
+    """Verify every hot query is served from an index without a sort step.
+
+    Returns a dict of query name -> list of problems (empty when the plan is good).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+
+    try:
+        problems = {}
+        for name, sql in HOT_QUERIES.items():
+            plan = explain_query(conn, sql, (0,) * sql.count('?'))
+            issues = []
+            if not any('INDEX' in line or 'PRIMARY KEY' in line for line in plan):
+                issues.append('no index used')
+            # A GROUP BY b-tree over an index range is bounded; an ORDER BY sort is not
+            if any('TEMP B-TREE FOR ORDER BY' in line for line in plan):
+                issues.append('temp b-tree sort')
+            problems[name] = [f"{issue} ({' | '.join(plan)})" for issue in issues]
+        return problems
+    finally:
+        if own_conn:
+            conn.close()
+
+# ===================================
+# Keyset Pagination
+# ===================================
+
+# Largest page a history endpoint will return, whatever the client asks for
+MAX_PAGE_SIZE = 100
+
+def clamp_page_size(limit, default):
+    """Bound a client-supplied page size to 1..MAX_PAGE_SIZE"""
+    if limit is None:
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def encode_cursor(row):
+    """Opaque next-page token for the last row of a page"""
+    raw = json.dumps([row['timestamp'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Return the (timestamp, id) a cursor points at; ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        timestamp, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return timestamp, row_id
+
+def _fetch_page(first_query, page_query, user_id, limit, cursor, kind=None):
+    """Run a keyset page query and return (rows, next_cursor).
+
+    Fetches one extra row to learn whether another page exists, so the last
+    page returns next_cursor=None instead of an empty follow-up page. The
+    user's archived rows of `kind` that fall inside the page are merged in,
+    so history reads the same before and after archival, even where old
+    history imported later sits behind archived months.
+    """
+    conn = get_db_connection()
+    before = decode_cursor(cursor) if cursor else None
+    if before:
+        rows = conn.execute(HOT_QUERIES[page_query], (user_id, *before, limit + 1)).fetchall()
+    else:
+        rows = conn.execute(HOT_QUERIES[first_query], (user_id, limit + 1)).fetchall()
+
+    rows = [dict(row) for row in rows]
+    if kind:
+        # A full live page bounds the window: older archived rows can't make it
+        # in, and only chunks for the months in between are read
+        after = (rows[limit]['timestamp'], rows[limit]['id']) if len(rows) > limit else None
+        archived = list(islice(iter_archived_rows(user_id, kind, before, after=after), limit + 1))
+        if archived:
+            rows = sorted(rows + archived, key=lambda row: (row['timestamp'], row['id']), reverse=True)
+    
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    return page, next_cursor
+
+# ===================================
+# Password Hashing
 # ===================================
 
+# scrypt cost: 2**14 * 8 * 128 bytes = 16 MB and ~50 ms of CPU per hash
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 32
+
+# Concurrent hashes per process, and logins allowed to wait for a slot.
+# hashlib.scrypt releases the GIL, so a thread pool gives real parallelism
+# while capping how many cores a login burst can take from dashboard reads.
+KDF_WORKERS = 2
+KDF_MAX_QUEUE = 32
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool's queue is full"""
+
+class HashingPool:
+    """Bounded executor for CPU-heavy password hashing"""
+
+    def __init__(self, workers=KDF_WORKERS, max_queue=KDF_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kdf')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """Run func on the pool and wait for it; fails fast when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusyError("Too many concurrent password hashes")
+
+        with self._lock:
+            self.pending += 1
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': min(self.pending, self.workers),
+                'queue_depth': max(0, self.pending - self.workers),
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+hashing_pool = HashingPool()
+
+def _scrypt(password, salt, n, r, p, dklen):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r, dklen=dklen)
+
 def hash_password(password):
-    """Hash a password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash a password with salted scrypt, encoded as scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(16)
+    derived = hashing_pool.run(_scrypt, password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P, SCRYPT_DKLEN)
+    return '$'.join([
+        'scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        base64.b64encode(salt).decode(), base64.b64encode(derived).decode()
+    ])
+
+def verify_password(password, password_hash):
+    """Check a password against a stored scrypt or legacy SHA-256 hash; a
+    malformed scrypt hash never matches"""
+    if password_hash.startswith('scrypt$'):
+        try:
+            _, n, r, p, salt, expected = password_hash.split('$')
+            expected = base64.b64decode(expected, validate=True)
+            derived = hashing_pool.run(_scrypt, password, base64.b64decode(salt, validate=True),
+                                       int(n), int(r), int(p), len(expected))
+        except ValueError as e:
+            # Wrong field count, bad base64 or integers, or parameters scrypt rejects
+            print(f"Error verifying password: malformed hash ({e})")
+            return False
+        return hmac.compare_digest(derived, expected)
+
+    # Legacy: unsalted SHA-256 hex digest
+    legacy = hashlib.sha256(password.encode()).hexdigest()
+    return hmac.compare_digest(legacy, password_hash)
+
+# Checked against when a username does not exist, so the login costs the same
+# scrypt work either way and its timing doesn't reveal which usernames exist
+DUMMY_PASSWORD_HASH = '$'.join([
+    'scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+    base64.b64encode(bytes(16)).decode(), base64.b64encode(bytes(SCRYPT_DKLEN)).decode()
+])
+
+def needs_rehash(password_hash):
+    """Whether a stored hash is legacy or uses outdated scrypt parameters"""
+    return not password_hash.startswith(f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$')
+
+# ===================================
+# User Authentication Functions
+# ===================================
+
+# Per-process cache of user records by ID. Writes here invalidate it directly;
+# the TTL bounds how long another worker process's update can go unseen.
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60
+
+_user_cache = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+def invalidate_user(user_id):
+    """Drop a user's cached record after it changes"""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
 
+@metrics.timed_query
 def create_user(username, email, password):
     """Create a new user"""
     conn = get_db_connection()
@@ -93,162 +932,1025 @@ def create_user(username, email, password):
         )
         conn.commit()
         user_id = cursor.lastrowid
-        conn.close()
         return user_id
     except sqlite3.IntegrityError:
-        conn.close()
+        conn.rollback()
         return None
 
-def verify_user(username, password):
-    """Verify user credentials"""
+@metrics.timed_query
+def get_user_by_username(username):
+    """Get user by username"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    password_hash = hash_password(password)
-    cursor.execute(
-        'SELECT * FROM users WHERE username = ? AND password_hash = ?',
-        (username, password_hash)
-    )
-    
+    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
     user = cursor.fetchone()
-    conn.close()
     
     if user:
         return dict(user)
     return None
 
+@metrics.timed_query
+def verify_user(username, password):
+    """Verify user credentials"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
+    user = cursor.fetchone()
+    
+    if not user:
+        verify_password(password, DUMMY_PASSWORD_HASH)
+        return None
+    if not verify_password(password, user['password_hash']):
+        return None
+    
+    user = dict(user)
+    # Transparently upgrade legacy or weaker hashes now that we know the password
+    if needs_rehash(user['password_hash']):
+        user['password_hash'] = hash_password(password)
+        cursor.execute(
+            'UPDATE users SET password_hash = ? WHERE id = ?',
+            (user['password_hash'], user['id'])
+        )
+        conn.commit()
+        invalidate_user(user['id'])
+    return user
+
+@metrics.timed_query
 def get_user_by_id(user_id):
-    """Get user by ID"""
+    """Get user by ID, from the per-process user cache when fresh"""
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > now:
+            _user_cache.move_to_end(user_id)
+            metrics.record_cache('users', True)
+            return dict(cached[1])
+    metrics.record_cache('users', False)
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
     user = cursor.fetchone()
-    conn.close()
     
     if user:
+        user = dict(user)
+        with _user_cache_lock:
+            _user_cache[user_id] = (now + USER_CACHE_TTL, user)
+            _user_cache.move_to_end(user_id)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
         return dict(user)
     return None
 
 # ===================================
-# Mood Functions (Updated with user_id)
+# Session Store Functions
 # ===================================
 
-def add_mood(user_id, mood_type, intensity, notes=''):
-    """Add a new mood entry"""
+@metrics.timed_query
+def get_session(session_id, now):
+    """Return (data, expires_at) for an unexpired session, or None"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
+    row = conn.execute(
+        'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?', (session_id, now)
+    ).fetchone()
+    return (json.loads(row['data']), row['expires_at']) if row else None
+
+@metrics.timed_query
+def save_session(session_id, user_id, data, expires_at):
+    """Create or replace a session"""
+    conn = get_db_connection()
+    conn.execute(
+        'INSERT OR REPLACE INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+        (session_id, user_id, json.dumps(data), expires_at)
+    )
+    conn.commit()
+
+@metrics.timed_query
+def delete_session(session_id):
+    conn = get_db_connection()
+    conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+    conn.commit()
+
+@metrics.timed_query
+def delete_user_sessions(user_id):
+    """Revoke every session of a user; returns how many there were"""
+    conn = get_db_connection()
+    deleted = conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount
+    conn.commit()
+    return deleted
+
+@metrics.timed_query
+def purge_expired_sessions(now):
+    conn = get_db_connection()
+    deleted = conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+    conn.commit()
+    return deleted
+
+# ===================================
+# Rate Limit Functions
+# ===================================
+
+# Refills a token bucket for the time since its last update and takes one
+# token, in a single statement; no row comes back when the bucket is empty
+RATE_LIMIT_TAKE = '''
+    INSERT INTO rate_limits (key, tokens, updated_at) VALUES (:key, :burst - 1, :now)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = MIN(:burst, tokens + (:now - updated_at) * :rate) - 1,
+        updated_at = :now
+    WHERE MIN(:burst, tokens + (:now - updated_at) * :rate) >= 1
+    RETURNING tokens
+'''
+
+@metrics.timed_query
+def take_rate_limit_token(key, rate, burst, now):
+    """Take a token from a shared bucket refilling at `rate` per second up to
+    `burst`; returns (allowed, seconds until a token is available)"""
+    conn = get_db_connection()
+    params = {'key': key, 'rate': rate, 'burst': burst, 'now': now}
+    try:
+        taken = conn.execute(RATE_LIMIT_TAKE, params).fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if taken is not None:
+        return True, 0.0
     
+    row = conn.execute('SELECT tokens, updated_at FROM rate_limits WHERE key = ?', (key,)).fetchone()
+    tokens = min(burst, row['tokens'] + (now - row['updated_at']) * rate) if row else burst
+    return False, max(0.0, (1 - tokens) / rate)
+
+@metrics.timed_query
+def purge_rate_limits(prefix, before):
+    """Drop buckets under a key prefix untouched since before; by then they
+    have refilled, which is what a missing bucket means"""
+    conn = get_db_connection()
+    deleted = conn.execute(
+        "DELETE FROM rate_limits WHERE key LIKE ? || '%' AND updated_at < ?", (prefix, before)
+    ).rowcount
+    conn.commit()
+    return deleted
+
+# ===================================
+# Mood Functions (Updated with user_id)
+# ===================================
+
+def _insert_mood(conn, user_id, timestamp, mood_type, intensity, notes):
+    cursor = conn.cursor()
     cursor.execute(
         'INSERT INTO moods (user_id, timestamp, mood_type, intensity, notes) VALUES (?, ?, ?, ?, ?)',
         (user_id, timestamp, mood_type, intensity, notes)
     )
     
-    conn.commit()
-    mood_id = cursor.lastrowid
-    conn.close()
+    # Keep the stats rollup in step, in the same transaction
+    conn.execute(
+        MOOD_ROLLUP_UPSERT,
+        (user_id, timestamp[:10], mood_type, 1, intensity, intensity, intensity)
+    )
+    return cursor.lastrowid
+
+@metrics.timed_query
+def add_mood(user_id, mood_type, intensity, notes=''):
+    """Add a new mood entry"""
+    timestamp = datetime.now().isoformat()
+    mood_id = _write(_insert_mood, user_id, timestamp, mood_type, intensity, notes)
+    bump_user_version(user_id)
     return mood_id
 
+@metrics.timed_query
 def get_recent_moods(user_id, limit=10):
     """Get recent mood entries for a user"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        'SELECT * FROM moods WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-        (user_id, limit)
-    )
+    cursor.execute(HOT_QUERIES['recent_moods'], (user_id, limit))
     
     moods = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return moods
 
+@metrics.timed_query
+def get_moods_page(user_id, limit=10, cursor=None):
+    """Get one page of a user's mood history, newest first"""
+    return _fetch_page('recent_moods', 'moods_page', user_id, limit, cursor, 'moods')
+
+# Longest window /api/mood/stats accepts; also bounds its cache entries per user
+MAX_STATS_DAYS = 365
+
+@metrics.timed_query
 def get_mood_stats(user_id, days=7):
-    """Get mood statistics for the past N days"""
+    """Get mood statistics for the past N calendar days, today included.
+
+    Reads the per-day rollup by primary-key range, so the cost grows with the
+    number of days in the window rather than the user's total history.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
+    since_day = (datetime.now().date() - timedelta(days=days - 1)).isoformat()
     
-    cursor.execute('''
-        SELECT mood_type, COUNT(*) as count, AVG(intensity) as avg_intensity
-        FROM moods
-        WHERE user_id = ? AND datetime(timestamp) >= datetime('now', '-' || ? || ' days')
-        GROUP BY mood_type
-    ''', (user_id, days))
+    cursor.execute(HOT_QUERIES['mood_stats'], (user_id, since_day))
     
     stats = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return stats
 
 # ===================================
 # Journal Functions (Updated with user_id)
 # ===================================
 
-def add_journal_entry(user_id, content, mood_tags=None):
-    """Add a new journal entry"""
-    conn = get_db_connection()
+def _insert_journal_entry(conn, user_id, timestamp, content, mood_tags_json):
     cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    mood_tags_json = json.dumps(mood_tags) if mood_tags else None
-    
     cursor.execute(
         'INSERT INTO journal_entries (user_id, timestamp, content, mood_tags) VALUES (?, ?, ?, ?)',
         (user_id, timestamp, content, mood_tags_json)
     )
-    
-    conn.commit()
-    entry_id = cursor.lastrowid
-    conn.close()
+    return cursor.lastrowid
+
+@metrics.timed_query
+def add_journal_entry(user_id, content, mood_tags=None):
+    """Add a new journal entry"""
+    timestamp = datetime.now().isoformat()
+    mood_tags_json = json.dumps(mood_tags) if mood_tags else None
+    entry_id = _write(_insert_journal_entry, user_id, timestamp, content, mood_tags_json)
+    bump_user_version(user_id)
     return entry_id
 
+@metrics.timed_query
 def get_recent_journal_entries(user_id, limit=10):
     """Get recent journal entries for a user"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        'SELECT * FROM journal_entries WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-        (user_id, limit)
-    )
+    cursor.execute(HOT_QUERIES['recent_journal_entries'], (user_id, limit))
     
     entries = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return entries
 
+@metrics.timed_query
+def get_journal_entries_page(user_id, limit=10, cursor=None):
+    """Get one page of a user's journal entries, newest first"""
+    return _fetch_page('recent_journal_entries', 'journal_entries_page', user_id, limit, cursor, 'journal_entries')
+
+# Most terms a search query may contain
+MAX_SEARCH_TERMS = 16
+
+def build_search_query(user_id, text):
+    """Turn free text into an FTS5 MATCH expression scoped to one user.
+
+    Every word is quoted, so FTS5 operators typed by the user are matched as
+    plain text; a trailing * keeps its meaning as a prefix query ("anx*").
+    Raises ValueError when the text has no searchable words.
+    """
+    terms = re.findall(r'\w+\*?', text or '')[:MAX_SEARCH_TERMS]
+    if not terms:
+        raise ValueError("Search query is empty")
+
+    phrases = []
+    for term in terms:
+        if term.endswith('*'):
+            phrases.append(f'"{term[:-1]}"*')
+        else:
+            phrases.append(f'"{term}"')
+    return f'owner : "u{int(user_id)}" AND content : ({" ".join(phrases)})'
+
+@metrics.timed_query
+def search_journal_entries(user_id, text, limit=10):
+    """Search a user's journal entries, best BM25 match first.
+
+    Each result carries a `snippet` with matched terms wrapped in [brackets].
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(HOT_QUERIES['journal_search'], (build_search_query(user_id, text), limit))
+    
+    results = [dict(row) for row in cursor.fetchall()]
+    return results
+
+def rebuild_journal_index(conn=None):
+    """Rebuild the journal search index from journal_entries"""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+
+    try:
+        conn.execute("INSERT INTO journal_fts (journal_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO journal_fts (journal_fts) VALUES ('optimize')")
+        conn.commit()
+        return conn.execute('SELECT COUNT(*) FROM journal_entries').fetchone()[0]
+    finally:
+        if own_conn:
+            conn.close()
+
+@metrics.timed_query
+def get_journal_entries_by_ids(user_id, entry_ids):
+    """Get a user's journal entries by ID, in the order given; missing IDs are skipped"""
+    if not entry_ids:
+        return []
+    conn = get_db_connection()
+    placeholders = ', '.join('?' * len(entry_ids))
+    rows = conn.execute(
+        f'SELECT * FROM journal_entries WHERE user_id = ? AND id IN ({placeholders})',
+        (user_id, *entry_ids)
+    ).fetchall()
+    
+    by_id = {row['id']: dict(row) for row in rows}
+    return [by_id[entry_id] for entry_id in entry_ids if entry_id in by_id]
+
 # ===================================
-# Insights Functions (Updated with user_id)
+# Journal Embedding Functions
 # ===================================
 
-def add_insight(user_id, insight_text, related_entries=None):
-    """Add a new AI-generated insight"""
+@metrics.timed_query
+def get_last_embedded_entry(user_id, model):
+    """Highest journal entry ID embedded with a model (0 when none)"""
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT MAX(entry_id) FROM journal_embeddings WHERE user_id = ? AND model = ?',
+        (user_id, model)
+    ).fetchone()
+    return row[0] or 0
+
+@metrics.timed_query
+def save_journal_embeddings(user_id, model, vectors):
+    """Store (entry_id, vector_blob) pairs, replacing other models' vectors"""
     conn = get_db_connection()
+    try:
+        conn.executemany(
+            'INSERT OR REPLACE INTO journal_embeddings (entry_id, user_id, model, vector) VALUES (?, ?, ?, ?)',
+            ((entry_id, user_id, model, vector) for entry_id, vector in vectors)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(vectors)
+
+def iter_journal_embeddings_since(user_id, model, after_id):
+    """Yield (entry_id, vector_blob) for a user's entries embedded past after_id"""
+    cursor = get_db_connection().execute(HOT_QUERIES['journal_embeddings_since'], (user_id, model, after_id))
+    for row in cursor:
+        yield row['entry_id'], row['vector']
+
+# ===================================
+# Insights Functions (Updated with user_id)
+# ===================================
+
+def _insert_insight(conn, user_id, timestamp, insight_text, related_json, context_hash):
     cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
-    related_json = json.dumps(related_entries) if related_entries else None
-    
     cursor.execute(
-        'INSERT INTO insights (user_id, timestamp, insight_text, related_entries) VALUES (?, ?, ?, ?)',
-        (user_id, timestamp, insight_text, related_json)
+        'INSERT INTO insights (user_id, timestamp, insight_text, related_entries, context_hash) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (user_id, timestamp, insight_text, related_json, context_hash)
     )
-    
-    conn.commit()
-    insight_id = cursor.lastrowid
-    conn.close()
+    return cursor.lastrowid
+
+@metrics.timed_query
+def add_insight(user_id, insight_text, related_entries=None, context_hash=None):
+    """Add a new AI-generated insight, with the fingerprint of its input context"""
+    timestamp = datetime.now().isoformat()
+    related_json = json.dumps(related_entries) if related_entries else None
+    insight_id = _write(_insert_insight, user_id, timestamp, insight_text, related_json, context_hash)
+    bump_user_version(user_id)
     return insight_id
 
+@metrics.timed_query
+def get_insight_rate(user_id, since):
+    """(count, oldest timestamp) of the user's insights generated since a time"""
+    conn = get_db_connection()
+    row = conn.execute(HOT_QUERIES['insight_rate'], (user_id, since.isoformat())).fetchone()
+    return row['count'], row['oldest']
+
+@metrics.timed_query
 def get_recent_insights(user_id, limit=5):
     """Get recent insights for a user"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute(
-        'SELECT * FROM insights WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?',
-        (user_id, limit)
-    )
+    cursor.execute(HOT_QUERIES['recent_insights'], (user_id, limit))
     
     insights = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return insights
 
+@metrics.timed_query
+def get_insights_page(user_id, limit=5, cursor=None):
+    """Get one page of a user's insights, newest first"""
+    return _fetch_page('recent_insights', 'insights_page', user_id, limit, cursor, 'insights')
+
+# ===================================
+# Bulk Import / Export
+# ===================================
+
+@metrics.timed_query
+def insert_moods_batch(user_id, rows):
+    """Insert (timestamp, mood_type, intensity, notes) rows in one transaction.
+
+    The rollup is folded per (day, mood_type) in Python first, so a batch
+    costs one upsert per distinct day rather than one per mood.
+    """
+    conn = get_db_connection()
+    deltas = {}
+    for timestamp, mood_type, intensity, notes in rows:
+        key = (timestamp[:10], mood_type)
+        delta = deltas.get(key)
+        if delta is None:
+            deltas[key] = [1, intensity, intensity, intensity]
+        else:
+            delta[0] += 1
+            delta[1] += intensity
+            delta[2] = min(delta[2], intensity)
+            delta[3] = max(delta[3], intensity)
+
+    try:
+        conn.executemany(
+            'INSERT INTO moods (user_id, timestamp, mood_type, intensity, notes) VALUES (?, ?, ?, ?, ?)',
+            ((user_id, *row) for row in rows)
+        )
+        conn.executemany(
+            MOOD_ROLLUP_UPSERT,
+            ((user_id, day, mood_type, *delta) for (day, mood_type), delta in deltas.items())
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    bump_user_version(user_id)
+    return len(rows)
+
+@metrics.timed_query
+def insert_journal_batch(user_id, rows):
+    """Insert (timestamp, content, mood_tags_json) rows in one transaction"""
+    conn = get_db_connection()
+    try:
+        conn.executemany(
+            'INSERT INTO journal_entries (user_id, timestamp, content, mood_tags) VALUES (?, ?, ?, ?)',
+            ((user_id, *row) for row in rows)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    bump_user_version(user_id)
+    return len(rows)
+
+def _iter_rows(sql, params, batch_size=1000):
+    cursor = get_db_connection().cursor()
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+
+def _history_order(row):
+    return row['timestamp'], row['id']
+
+def iter_moods(user_id, batch_size=1000):
+    """Yield every mood for a user, archived and live merged, oldest first,
+    without loading them all"""
+    return heapq.merge(iter_archived_rows(user_id, 'moods', oldest_first=True),
+                       _iter_rows(HOT_QUERIES['export_moods'], (user_id,), batch_size),
+                       key=_history_order)
+
+def iter_journal_entries(user_id, batch_size=1000):
+    """Yield every journal entry for a user, archived and live merged, oldest first"""
+    return heapq.merge(iter_archived_rows(user_id, 'journal_entries', oldest_first=True),
+                       _iter_rows(HOT_QUERIES['export_journal_entries'], (user_id,), batch_size),
+                       key=_history_order)
+
+# ===================================
+# History Archive
+# ===================================
+
+# Moods, journal entries and insights past the retention horizon (see
+# retention.py) leave their tables for history_archive: one row per user,
+# table and month holding the rows as compressed JSON arrays, oldest first.
+# History pages and exports read through it, and SQL can expand a chunk with
+# json_each(archive_json(codec, data)). Rows are dropped from the full-text
+# and embedding indexes when archived, so search covers live rows only.
+
+# zstd when the zstandard package is installed; chunks record their codec,
+# so both kinds can be read back either way
+ARCHIVE_CODEC = 'zstd' if zstandard is not None else 'zlib'
+ARCHIVE_LEVEL = {'zlib': 9, 'zstd': 12}
+
+# Columns archived per table, in stored order; user_id is the chunk's
+ARCHIVE_COLUMNS = {
+    'moods': ('id', 'timestamp', 'mood_type', 'intensity', 'notes', 'created_at'),
+    'journal_entries': ('id', 'timestamp', 'content', 'mood_tags', 'created_at'),
+    'insights': ('id', 'timestamp', 'insight_text', 'related_entries', 'context_hash', 'created_at'),
+}
+
+# A user's moods, live and archived, as (id, timestamp, mood_type, intensity);
+# takes the user ID twice
+MOOD_HISTORY_SQL = '''
+    SELECT id, timestamp, mood_type, intensity FROM moods WHERE user_id = ?
+    UNION ALL
+    SELECT value ->> 0, value ->> 1, value ->> 2, value ->> 3
+    FROM history_archive, json_each(archive_json(codec, data))
+    WHERE user_id = ? AND kind = 'moods'
+'''
+
+def compress_archive(values):
+    """(codec, data, raw size) for a chunk's list of row value lists"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    if ARCHIVE_CODEC == 'zstd':
+        data = zstandard.ZstdCompressor(level=ARCHIVE_LEVEL['zstd']).compress(raw)
+    else:
+        data = zlib.compress(raw, ARCHIVE_LEVEL['zlib'])
+    return ARCHIVE_CODEC, data, len(raw)
+
+def decompress_archive(codec, data):
+    """A chunk's rows as JSON text"""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd archive chunks")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        raw = zlib.decompress(data)
+    return raw.decode('utf-8')
+
+def _archived_rows(user_id, kind, codec, data):
+    columns = ARCHIVE_COLUMNS[kind]
+    return [{'user_id': user_id, **dict(zip(columns, values))}
+            for values in json.loads(decompress_archive(codec, data))]
+
+def iter_archived_rows(user_id, kind, before=None, oldest_first=False, after=None):
+    """Yield a user's archived rows of one kind, newest first (oldest first
+    with oldest_first), starting below a (timestamp, id) keyset position and,
+    newest first only, stopping at or below `after`"""
+    if oldest_first:
+        cursor = get_db_connection().execute(HOT_QUERIES['export_archive_chunks'], (user_id, kind))
+    else:
+        newest = before[0][:7] if before else '9999'
+        oldest = after[0][:7] if after else ''
+        cursor = get_db_connection().execute(HOT_QUERIES['archive_chunks'], (user_id, kind, newest, oldest))
+    try:
+        for chunk in cursor:
+            rows = _archived_rows(user_id, kind, chunk['codec'], chunk['data'])
+            for row in (rows if oldest_first else reversed(rows)):
+                position = _history_order(row)
+                if after is not None and position <= after:
+                    return
+                if before is None or position < before:
+                    yield row
+    finally:
+        cursor.close()
+
+def _next_month(period):
+    year, month = map(int, period.split('-'))
+    return f'{year + month // 12:04d}-{month % 12 + 1:02d}'
+
+@metrics.timed_query
+def archive_history(user_id, kind, before, keep=0):
+    """
+    Move a user's rows of one kind timestamped before `before` (ISO text)
+    into their monthly archive chunks, always leaving the newest `keep` rows
+    live. One transaction per month, merged into any chunk already there.
+    Returns the number of rows archived.
+    """
+    conn = get_db_connection()
+    if keep:
+        row = conn.execute(
+            f'SELECT timestamp FROM {kind} WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?',
+            (user_id, keep - 1)
+        ).fetchone()
+        if row is None:
+            return 0
+        before = min(before, row['timestamp'])
+    
+    months = [row[0] for row in conn.execute(
+        f'SELECT DISTINCT substr(timestamp, 1, 7) FROM {kind} WHERE user_id = ? AND timestamp < ?',
+        (user_id, before)
+    )]
+    columns = ARCHIVE_COLUMNS[kind]
+    archived = 0
+    for period in months:
+        bounds = (user_id, period, min(before, _next_month(period)))
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                f'SELECT {", ".join(columns)} FROM {kind} WHERE user_id = ? AND timestamp >= ? AND timestamp < ?',
+                bounds
+            ).fetchall()
+            chunk = conn.execute(
+                'SELECT codec, data FROM history_archive WHERE user_id = ? AND kind = ? AND period = ?',
+                (user_id, kind, period)
+            ).fetchone()
+            values = json.loads(decompress_archive(chunk['codec'], chunk['data'])) if chunk else []
+            values += [list(row) for row in rows]
+            values.sort(key=lambda value: (value[1], value[0]))
+            codec, data, raw_bytes = compress_archive(values)
+            conn.execute(
+                'INSERT OR REPLACE INTO history_archive '
+                '(user_id, kind, period, row_count, raw_bytes, codec, data, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (user_id, kind, period, len(values), raw_bytes, codec, data, datetime.now().isoformat())
+            )
+            conn.execute(f'DELETE FROM {kind} WHERE user_id = ? AND timestamp >= ? AND timestamp < ?', bounds)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        archived += len(rows)
+    
+    if archived:
+        bump_user_version(user_id)
+    return archived
+
+@metrics.timed_query
+def get_archive_stats():
+    """Chunks, rows, and uncompressed and stored bytes in the archive"""
+    row = get_db_connection().execute(
+        'SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(raw_bytes), 0), '
+        'COALESCE(SUM(length(data)), 0) FROM history_archive'
+    ).fetchone()
+    return {'chunks': row[0], 'rows': row[1], 'raw_bytes': row[2], 'stored_bytes': row[3]}
+
+# ===================================
+# Context Summary Functions
+# ===================================
+
+@metrics.timed_query
+def get_context_summary(user_id):
+    """Get a user's rolling context summary and how far it has been folded"""
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT summary, last_mood_id, last_entry_id FROM user_context_summary WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    
+    if row:
+        return {'summary': json.loads(row['summary']),
+                'last_mood_id': row['last_mood_id'],
+                'last_entry_id': row['last_entry_id']}
+    return None
+
+@metrics.timed_query
+def save_context_summary(user_id, summary, last_mood_id, last_entry_id):
+    """Store a user's context summary, folded up to the given row IDs"""
+    conn = get_db_connection()
+    conn.execute(
+        '''
+        INSERT INTO user_context_summary (user_id, summary, last_mood_id, last_entry_id, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            summary = excluded.summary,
+            last_mood_id = excluded.last_mood_id,
+            last_entry_id = excluded.last_entry_id,
+            updated_at = excluded.updated_at
+        ''',
+        (user_id, json.dumps(summary), last_mood_id, last_entry_id, datetime.now().isoformat())
+    )
+    conn.commit()
+
+def iter_moods_since(user_id, after_id):
+    """Yield a user's moods with IDs above after_id, in ID order"""
+    return _iter_rows(
+        'SELECT id, timestamp, mood_type, intensity FROM moods WHERE user_id = ? AND id > ? ORDER BY id',
+        (user_id, after_id)
+    )
+
+def iter_journal_entries_since(user_id, after_id):
+    """Yield a user's journal entries with IDs above after_id, in ID order"""
+    return _iter_rows(
+        'SELECT id, timestamp, content FROM journal_entries WHERE user_id = ? AND id > ? ORDER BY id',
+        (user_id, after_id)
+    )
+
+# ===================================
+# AI Job Functions
+# ===================================
+
+@metrics.timed_query
+def enqueue_job(user_id, kind, payload):
+    """Persist a queued AI job and return its ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    now = datetime.now().isoformat()
+
+    cursor.execute(
+        'INSERT INTO ai_jobs (user_id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+        (user_id, kind, json.dumps(payload), 'queued', now, now)
+    )
+
+    conn.commit()
+    job_id = cursor.lastrowid
+    return job_id
+
+@metrics.timed_query
+def claim_next_job():
+    """Atomically mark the oldest queued job as running and return it"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    # The UPDATE takes the write lock, so two workers (or processes) can
+    # never claim the same row
+    cursor.execute('''
+        UPDATE ai_jobs SET status = 'running', attempts = attempts + 1, updated_at = ?
+        WHERE id = (SELECT id FROM ai_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING *
+    ''', (datetime.now().isoformat(),))
+
+    job = cursor.fetchone()
+    conn.commit()
+
+    if job:
+        job = dict(job)
+        job['payload'] = json.loads(job['payload'])
+        return job
+    return None
+
+@metrics.timed_query
+def finish_job(job_id, result=None, error=None, retry=False):
+    """Record a job's outcome, or put it back in the queue when retry is set"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    if retry:
+        status = 'queued'
+    else:
+        status = 'failed' if error else 'done'
+
+    cursor.execute(
+        'UPDATE ai_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+        (status, json.dumps(result) if result is not None else None, error,
+         datetime.now().isoformat(), job_id)
+    )
+
+    conn.commit()
+
+@metrics.timed_query
+def requeue_stale_jobs(lease_seconds, max_attempts):
+    """Requeue running jobs whose worker died (e.g. the process restarted).
+
+    The lost run counts as an attempt (claim_next_job counted it), so a job
+    that keeps taking its worker down is marked failed after max_attempts
+    instead of being retried forever.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    now = datetime.now()
+    cutoff = (now - timedelta(seconds=lease_seconds)).isoformat()
+
+    cursor.execute(
+        """
+        UPDATE ai_jobs SET
+            status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+            error = CASE WHEN attempts >= ? THEN 'Worker lost while running the job' ELSE error END,
+            updated_at = ?
+        WHERE status = 'running' AND updated_at < ?
+        """,
+        (max_attempts, max_attempts, now.isoformat(), cutoff)
+    )
+
+    conn.commit()
+    return cursor.rowcount
+
+@metrics.timed_query
+def get_job(job_id, user_id):
+    """Get a user's AI job by ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT * FROM ai_jobs WHERE id = ? AND user_id = ?', (job_id, user_id))
+    job = cursor.fetchone()
+
+    if job:
+        job = dict(job)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+    return None
+
+# ===================================
+# Suggestion Cache Functions
+# ===================================
+
+@metrics.timed_query
+def get_cached_suggestions(mood_type, intensity, since):
+    """Get cached suggestion variants created after `since` (unix time)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        'SELECT suggestion, created_at FROM suggestion_cache '
+        'WHERE mood_type = ? AND intensity = ? AND created_at >= ? ORDER BY created_at',
+        (mood_type, intensity, since)
+    )
+
+    return [(row['suggestion'], row['created_at']) for row in cursor.fetchall()]
+
+@metrics.timed_query
+def save_cached_suggestion(mood_type, intensity, suggestion, created_at, keep):
+    """Store a suggestion variant, keeping only the newest `keep` per key"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        'INSERT OR IGNORE INTO suggestion_cache (mood_type, intensity, suggestion, created_at) VALUES (?, ?, ?, ?)',
+        (mood_type, intensity, suggestion, created_at)
+    )
+    cursor.execute('''
+        DELETE FROM suggestion_cache
+        WHERE mood_type = ? AND intensity = ? AND suggestion NOT IN (
+            SELECT suggestion FROM suggestion_cache
+            WHERE mood_type = ? AND intensity = ?
+            ORDER BY created_at DESC LIMIT ?
+        )
+    ''', (mood_type, intensity, mood_type, intensity, keep))
+
+    conn.commit()
+
+# ===================================
+# Shared Cache and Per-User Versions
+# ===================================
+
+# 'sqlite' shares cached values and version counters between worker processes
+# through a cache file beside the database; 'memory' keeps them per process
+CACHE_BACKEND = 'sqlite'
+
+def cache_database_path():
+    """The shared cache file, following DATABASE_NAME when it is repointed"""
+    return os.path.splitext(DATABASE_NAME)[0] + '-cache.db'
+
+shared_cache = cache.Cache(cache.SQLiteTier(cache_database_path) if CACHE_BACKEND == 'sqlite' else None)
+
+def get_user_version(user_id):
+    """Current data version for a user; changes on every write for that user"""
+    return shared_cache.version(f'user:{user_id}')
+
+def bump_user_version(user_id):
+    """Invalidate everything cached for a user after a write, in every worker"""
+    shared_cache.bump(f'user:{user_id}')
+
+def get_dashboard_etag(user_id, version=None, day=None):
+    """Strong validator for the user's dashboard at the current version. The
+    day is part of it: the dashboard's 7-day stats window moves at midnight
+    whether or not the user writes."""
+    if version is None:
+        version = get_user_version(user_id)
+    if day is None:
+        day = datetime.now().date().isoformat()
+    return f"{user_id}-{shared_cache.epoch}-{version}-{day}"
+
+@metrics.timed_query
+def get_dashboard_data(user_id):
+    """Read everything the dashboard shows in a single read transaction"""
+    conn = get_db_connection()
+    conn.execute('BEGIN')
+    try:
+        return {
+            'moods': get_recent_moods(user_id, 20),
+            'journal_entries': get_recent_journal_entries(user_id, 5),
+            'insights': get_recent_insights(user_id, 3),
+            'stats': get_mood_stats(user_id, 7),
+        }
+    finally:
+        conn.rollback()
+
+def get_dashboard_snapshot(user_id):
+    """Return (etag, data) for the dashboard, computing it at most once per
+    version and day"""
+    version = get_user_version(user_id)
+    day = datetime.now().date().isoformat()
+    data = shared_cache.get_or_compute('dashboard', f'user:{user_id}', lambda: get_dashboard_data(user_id),
+                                       suffix=day, version=version)
+    return get_dashboard_etag(user_id, version, day), data
+
+def get_mood_stats_cached(user_id, days=7):
+    """get_mood_stats, recomputed only after a write or when the day changes"""
+    return shared_cache.get_or_compute('mood_stats', f'user:{user_id}', lambda: get_mood_stats(user_id, days),
+                                       suffix=f'{days}:{datetime.now().date().isoformat()}')
+
+# ===================================
+# Maintenance
+# ===================================
+
+@metrics.timed_query
+def prune_superseded_insights(before):
+    """Delete insights older than `before` that a newer insight of the same
+    user was generated from the same context for; returns how many"""
+    conn = get_db_connection()
+    try:
+        user_ids = [row[0] for row in conn.execute('''
+            DELETE FROM insights WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, timestamp,
+                           ROW_NUMBER() OVER (PARTITION BY user_id, context_hash ORDER BY id DESC) AS newer
+                    FROM insights
+                    WHERE context_hash IS NOT NULL
+                )
+                WHERE newer > 1 AND timestamp < ?
+            )
+            RETURNING user_id
+        ''', (before,)).fetchall()]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for user_id in set(user_ids):
+        bump_user_version(user_id)
+    return len(user_ids)
+
+@metrics.timed_query
+def purge_finished_jobs(before):
+    """Delete done and failed AI jobs last updated before a time; returns how many"""
+    conn = get_db_connection()
+    deleted = conn.execute(
+        "DELETE FROM ai_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (before,)
+    ).rowcount
+    conn.commit()
+    return deleted
+
+def get_storage_stats(conn=None):
+    """Page size, page and free-page counts, and auto_vacuum mode of the database"""
+    conn = conn or get_db_connection()
+    stats = {name: conn.execute(f'PRAGMA {name}').fetchone()[0]
+             for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')}
+    stats['bytes'] = stats['page_size'] * stats['page_count']
+    stats['free_bytes'] = stats['page_size'] * stats['freelist_count']
+    return stats
+
+def vacuum_database(step_pages=1000, pause=0.0, full=False):
+    """
+    Return free pages to the filesystem and return how many were released.
+    
+    In incremental auto_vacuum mode this frees step_pages at a time, each its
+    own short write transaction, pausing between steps so other writers get
+    the lock. A database created before that mode needs one full VACUUM to
+    switch to it (it rewrites the file under an exclusive lock); that only
+    happens with full=True, otherwise the free pages are left for reuse.
+    """
+    conn = _connect()
+    try:
+        before = get_storage_stats(conn)
+        if before['auto_vacuum'] != 2:
+            if not full:
+                return 0
+            # The pragma set by _connect takes effect on this VACUUM
+            conn.execute('VACUUM')
+        else:
+            while conn.execute('PRAGMA freelist_count').fetchone()[0]:
+                # execute() steps the pragma once, freeing a single page;
+                # executescript() runs it to completion
+                conn.executescript(f'PRAGMA incremental_vacuum({int(step_pages)})')
+                if pause:
+                    time.sleep(pause)
+        # Fold the WAL back in so the file actually shrinks
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return before['page_count'] - get_storage_stats(conn)['page_count']
+    finally:
+        conn.close()
+
+def analyze_database(analysis_limit=1000):
+    """Refresh the planner's statistics, sampling at most analysis_limit
+    rows per index"""
+    conn = _connect()
+    try:
+        conn.execute(f'PRAGMA analysis_limit = {int(analysis_limit)}')
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+# ===================================
+# Metrics
+# ===================================
+
+@metrics.registry.collector
+def collect_metrics():
+    """Pool, hashing and group-commit figures, read at scrape time"""
+    hashing = hashing_pool.stats()
+    writer = group_writer.stats()
+    return [
+        ('mindi_db_idle_connections', 'gauge', 'Idle pooled SQLite connections', (),
+         [((), _pool._idle.qsize())]),
+        ('mindi_kdf_in_flight', 'gauge', 'Password hashes running', (), [((), hashing['in_flight'])]),
+        ('mindi_kdf_queue_depth', 'gauge', 'Password hashes waiting for a worker', (),
+         [((), hashing['queue_depth'])]),
+        ('mindi_kdf_rejected_total', 'counter', 'Logins refused because the hashing queue was full', (),
+         [((), hashing['rejected'])]),
+        ('mindi_group_commit_batches_total', 'counter', 'Transactions committed by the group writer', (),
+         [((), writer['batches'])]),
+        ('mindi_group_commit_writes_total', 'counter', 'Writes applied by the group writer', (),
+         [((), writer['writes'])]),
+        ('mindi_cache_memory_entries', 'gauge', 'Entries in this process\'s shared-cache memory tier', (),
+         [((), shared_cache.stats()['memory_entries'])]),
+    ]
+
 if __name__ == '__main__':
+    import sys
+
     init_db()
+    if 'check' in sys.argv[1:]:
+        # python database.py check -> verify hot queries use their indexes
+        problems = check_query_plans()
+        for name, issues in problems.items():
+            print(f"{name}: {'; '.join(issues) if issues else 'OK'}")
+        sys.exit(1 if any(problems.values()) else 0)
+    if 'reindex' in sys.argv[1:]:
+        # python database.py reindex -> rebuild the journal search index
+        print(f"Indexed {rebuild_journal_index()} journal entries")
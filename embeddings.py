@@ -0,0 +1,265 @@
+import math
+import os
+import re
+import sys
+import threading
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+import database
+import metrics
+
+try:
+    import numpy as np
+except ImportError:  # fall back to pure-Python sparse scoring
+    np = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # hashed TF-IDF vectors only
+    SentenceTransformer = None
+
+# ===================================
+# Journal similarity
+#
+#     python embeddings.py        # backfill vectors for existing entries
+#
+# Every journal entry gets a vector, computed by a background job after it is
+# written and stored as int8 in journal_embeddings (one byte per dimension;
+# only a vector's direction matters for cosine similarity, so each is scaled
+# to fill the int8 range and no scale is kept). Search loads a user's vectors
+# once per process, appends newer ones incrementally, and ranks them against
+# the query with one matrix-vector product.
+#
+# Vectors come from a local sentence-transformers model when
+# EMBEDDING_MODEL_PATH names one and the package is installed, otherwise from
+# signed feature hashing of words and word pairs. Hashed vectors hold raw term
+# frequencies; IDF weights are derived from the user's own entries at search
+# time, so they stay current as the journal grows without re-embedding.
+# ===================================
+
+# Directory of a local sentence-transformers model; None uses hashed vectors
+EMBEDDING_MODEL_PATH = None
+
+# Dimensions of hashed vectors (a power of two)
+HASH_DIM = 1024
+
+# Entries embedded per batch (one encoder call and one transaction)
+EMBED_BATCH_SIZE = 256
+
+# Users whose vectors are kept in memory per process
+EMBEDDING_CACHE_USERS = 64
+
+# Results below this cosine similarity are not considered related
+MIN_SIMILARITY = 0.15
+
+# Similar entries returned by default
+SIMILAR_RESULTS = 5
+
+# ===================================
+# Encoders
+# ===================================
+
+WORD_PATTERN = re.compile(r"[a-z][a-z']+")
+
+def _terms(text):
+    """Words and adjacent word pairs; IDF discounts the common ones"""
+    words = WORD_PATTERN.findall(text.lower())
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+class HashingEncoder:
+    """Signed feature hashing of sublinear term frequencies"""
+
+    idf = True
+
+    def __init__(self, dim=HASH_DIM):
+        self.dim = dim
+        self.name = f'hash-tf-{dim}'
+
+    def encode_one(self, text):
+        vector = [0.0] * self.dim
+        for term, count in Counter(_terms(text)).items():
+            digest = zlib.crc32(term.encode('utf-8'))
+            # Low bits pick the bucket, the top bit its sign, so colliding
+            # terms tend to cancel instead of piling up
+            weight = 1.0 + math.log(count)
+            vector[digest % self.dim] += -weight if digest & 0x80000000 else weight
+        return vector
+
+    def encode(self, texts):
+        return [self.encode_one(text) for text in texts]
+
+class ModelEncoder:
+    """Dense vectors from a local sentence-transformers model, run on CPU"""
+
+    idf = False
+
+    def __init__(self, path):
+        self.model = SentenceTransformer(path, device='cpu')
+        self.name = f'model-{os.path.basename(os.path.normpath(path))}'
+
+    def encode(self, texts):
+        return [list(vector) for vector in self.model.encode(list(texts), normalize_embeddings=True)]
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def get_encoder():
+    """The process-wide encoder, loaded on first use"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                if EMBEDDING_MODEL_PATH and SentenceTransformer is not None:
+                    _encoder = ModelEncoder(EMBEDDING_MODEL_PATH)
+                else:
+                    _encoder = HashingEncoder()
+    return _encoder
+
+def quantize(vector):
+    """int8 bytes of a vector scaled so its largest component is ±127"""
+    peak = max((abs(value) for value in vector), default=0.0) or 1.0
+    return array('b', (round(value * 127 / peak) for value in vector)).tobytes()
+
+# ===================================
+# Background Embedding
+# ===================================
+
+@metrics.timed_query
+def embed_pending(user_id):
+    """Embed the user's journal entries written since the last run, in
+    batches; returns how many were embedded"""
+    encoder = get_encoder()
+    last_id = database.get_last_embedded_entry(user_id, encoder.name)
+    embedded = 0
+    while True:
+        batch = []
+        for entry in database.iter_journal_entries_since(user_id, last_id):
+            batch.append(entry)
+            if len(batch) == EMBED_BATCH_SIZE:
+                break
+        if not batch:
+            return embedded
+        vectors = encoder.encode(entry['content'] for entry in batch)
+        database.save_journal_embeddings(
+            user_id, encoder.name,
+            [(entry['id'], quantize(vector)) for entry, vector in zip(batch, vectors)]
+        )
+        embedded += len(batch)
+        last_id = batch[-1]['id']
+
+# ===================================
+# Search
+# ===================================
+
+class _UserVectors:
+    """A user's stored vectors: entry IDs and an int8 matrix (NumPy), or
+    sparse {dimension: value} rows without it. Never modified once cached;
+    extended() builds a new one, so readers need no lock."""
+
+    def __init__(self, model, last_id=0, ids=(), rows=None):
+        self.model = model
+        self.last_id = last_id
+        self.ids = list(ids)
+        if rows is None:
+            rows = np.zeros((0, 0), dtype=np.int8) if np is not None else []
+        self.rows = rows
+
+    def extended(self, user_id):
+        """These vectors plus any embedded since they were loaded (self if none)"""
+        new = list(database.iter_journal_embeddings_since(user_id, self.model, self.last_id))
+        if not new:
+            return self
+        if np is not None:
+            added = np.frombuffer(b''.join(blob for _, blob in new), dtype=np.int8).reshape(len(new), -1)
+            rows = added if not len(self.rows) else np.vstack((self.rows, added))
+        else:
+            rows = self.rows + [{i: value for i, value in enumerate(array('b', blob)) if value}
+                                for _, blob in new]
+        return _UserVectors(self.model, new[-1][0], self.ids + [entry_id for entry_id, _ in new], rows)
+
+_vectors = OrderedDict()
+_vectors_lock = threading.Lock()
+
+def _load_vectors(user_id, model):
+    # The lock only guards the cache itself; the database is read outside it,
+    # so one user's catch-up never stalls every other user's search
+    with _vectors_lock:
+        cached = _vectors.get(user_id)
+    if cached is None or cached.model != model:
+        cached = _UserVectors(model)
+    vectors = cached.extended(user_id)
+
+    with _vectors_lock:
+        current = _vectors.get(user_id)
+        # A concurrent load may have stored newer vectors meanwhile; keep those
+        if current is None or current.model != model or current.last_id < vectors.last_id:
+            _vectors[user_id] = vectors
+        _vectors.move_to_end(user_id)
+        while len(_vectors) > EMBEDDING_CACHE_USERS:
+            _vectors.popitem(last=False)
+    return vectors.ids, vectors.rows
+
+def _score_numpy(rows, query, idf):
+    """Cosine similarity of every row to the query"""
+    matrix = rows.astype(np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    if idf:
+        weights = np.log((1 + len(matrix)) / (1 + np.count_nonzero(matrix, axis=0))) + 1
+        matrix *= weights
+        query = query * weights
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return (matrix @ query) / np.where(norms == 0, 1, norms)
+
+def _score_python(rows, query, idf):
+    weights, unseen = {}, 1.0
+    if idf:
+        counts = Counter(i for row in rows for i in row)
+        weights = {i: math.log((1 + len(rows)) / (1 + count)) + 1 for i, count in counts.items()}
+        unseen = math.log(1 + len(rows)) + 1
+    query = {i: value * weights.get(i, unseen) for i, value in enumerate(query) if value}
+    query_norm = math.sqrt(sum(value * value for value in query.values()))
+    scores = []
+    for row in rows:
+        dot = norm = 0.0
+        for i, value in row.items():
+            value *= weights.get(i, 1.0)
+            norm += value * value
+            dot += value * query.get(i, 0.0)
+        scores.append(dot / (math.sqrt(norm) * query_norm) if norm and query_norm else 0.0)
+    return scores
+
+@metrics.timed_query
+def find_similar(user_id, text, limit=SIMILAR_RESULTS, exclude=()):
+    """The user's journal entries most similar to text, best first, each with
+    a `similarity` score; entries in exclude are skipped"""
+    encoder = get_encoder()
+    ids, rows = _load_vectors(user_id, encoder.name)
+    if not ids:
+        return []
+    query = encoder.encode([text])[0]
+
+    if np is not None:
+        scores = _score_numpy(rows, query, encoder.idf)
+        # Room for excluded IDs, then an O(n) partial sort for the top k
+        k = min(len(ids), limit + len(exclude))
+        top = np.argpartition(-scores, k - 1)[:k]
+        ranked = [(ids[i], float(scores[i])) for i in top[np.argsort(-scores[top])]]
+    else:
+        ranked = sorted(zip(ids, _score_python(rows, query, encoder.idf)), key=lambda item: -item[1])
+
+    excluded = set(exclude)
+    matches = [(entry_id, score) for entry_id, score in ranked
+               if score >= MIN_SIMILARITY and entry_id not in excluded][:limit]
+    scores = dict(matches)
+    entries = database.get_journal_entries_by_ids(user_id, [entry_id for entry_id, _ in matches])
+    for entry in entries:
+        entry['similarity'] = round(scores[entry['id']], 3)
+    return entries
+
+if __name__ == '__main__':
+    database.init_db()
+    user_ids = [row[0] for row in database.get_db_connection().execute('SELECT id FROM users ORDER BY id')]
+    total = sum(embed_pending(user_id) for user_id in user_ids)
+    print(f"Embedded {total} journal entries for {len(user_ids)} users with {get_encoder().name}",
+          file=sys.stderr)
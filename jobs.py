@@ -0,0 +1,136 @@
+import os
+import threading
+import database
+import ai_service
+import embeddings
+
+# Number of background threads running AI jobs per process
+JOB_WORKERS = 4
+
+# How often idle workers look for jobs enqueued by other processes (seconds)
+JOB_POLL_INTERVAL = 1.0
+
+# A running job not updated for this long is assumed orphaned and requeued.
+# Must comfortably exceed the longest upstream timeout in ai_service.
+JOB_LEASE_SECONDS = 120
+
+# Attempts before a job is marked failed
+JOB_MAX_ATTEMPTS = 3
+
+# ===================================
+# Job Handlers
+# ===================================
+
+def run_mood_suggestion(payload):
+    """Quick suggestion for a freshly logged mood"""
+    suggestion = ai_service.get_personalized_suggestion(payload['mood_type'], payload['intensity'])
+    return {'suggestion': suggestion}
+
+def run_journal_analysis(payload):
+    """Empathetic response to a freshly saved journal entry"""
+    analysis = ai_service.analyze_journal_entry(payload['content'])
+    return {'ai_response': analysis['response']}
+
+def run_journal_embeddings(payload):
+    """Embed every journal entry the user has written since the last run;
+    queued once per write, so most runs find the work already done"""
+    return {'embedded': embeddings.embed_pending(payload['user_id'])}
+
+JOB_HANDLERS = {
+    'mood_suggestion': run_mood_suggestion,
+    'journal_analysis': run_journal_analysis,
+    'journal_embeddings': run_journal_embeddings,
+}
+
+# ===================================
+# Worker Pool
+# ===================================
+
+class JobWorkerPool:
+    """Fixed-size pool of threads draining the ai_jobs table"""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self.workers = workers
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+
+    def ensure_started(self):
+        """Start the workers once per process (threads do not survive a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'ai-job-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+            self._pid = os.getpid()
+
+    def notify(self):
+        """Wake one idle worker after a job is enqueued"""
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def stop(self, timeout=None):
+        """Ask workers to exit after their current job and wait for them"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._pid = None
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                try:
+                    job = database.claim_next_job()
+                    if job is None:
+                        database.requeue_stale_jobs(JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+                        with self._wakeup:
+                            self._wakeup.wait(JOB_POLL_INTERVAL)
+                        continue
+                    self._execute(job)
+                except Exception as e:
+                    print(f"Error in AI job worker: {e}")
+                    self._stopping.wait(JOB_POLL_INTERVAL)
+        finally:
+            database.close_db_connection()
+
+    def _execute(self, job):
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            database.finish_job(job['id'], error=f"Unknown job kind: {job['kind']}")
+            return
+
+        try:
+            result = handler(job['payload'])
+        except Exception as e:
+            print(f"Error running AI job {job['id']}: {e}")
+            retry = job['attempts'] < JOB_MAX_ATTEMPTS
+            database.finish_job(job['id'], error=str(e), retry=retry)
+            return
+
+        database.finish_job(job['id'], result=result)
+
+pool = JobWorkerPool()
+
+def enqueue(user_id, kind, payload):
+    """Queue an AI job for background processing and return its ID"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_id = database.enqueue_job(user_id, kind, payload)
+    pool.ensure_started()
+    pool.notify()
+    return job_id
+
+def enqueue_embeddings(user_id):
+    """Queue embedding of the user's new journal entries"""
+    return enqueue(user_id, 'journal_embeddings', {'user_id': user_id})
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+import database
+import metrics
+
+# ===================================
+# Admission control for upstream LLM calls
+#
+# Three limits guard the OpenRouter quota:
+#   - a token bucket per user, checked by the routes before they queue or
+#     start LLM work, so one user cannot spend everyone's quota;
+#   - a global token bucket, checked by ai_service before every upstream call;
+#   - a cap on upstream calls in flight per process, with a short bounded wait
+#     queue in front of it.
+# A call refused by any of them is answered at once with the same canned reply
+# used when the upstream is down, instead of queueing behind a saturated
+# upstream for the length of a read timeout.
+# ===================================
+
+# 'memory' keeps buckets per process; 'sqlite' shares them between workers at
+# the cost of one small write per admitted call
+LIMITER_BACKEND = 'memory'
+
+# Per-user budget: USER_LLM_RATE calls per USER_LLM_WINDOW seconds, in bursts
+# of at most USER_LLM_BURST
+USER_LLM_RATE = 10
+USER_LLM_WINDOW = 60
+USER_LLM_BURST = 5
+
+# Budget for the whole deployment (or process, with the memory backend)
+GLOBAL_LLM_RATE = 300
+GLOBAL_LLM_WINDOW = 60
+GLOBAL_LLM_BURST = 30
+
+# Upstream calls in flight per process, callers allowed to wait for a slot,
+# and how long they wait (seconds) before taking the canned reply
+UPSTREAM_MAX_IN_FLIGHT = 16
+UPSTREAM_MAX_WAITING = 32
+UPSTREAM_QUEUE_TIMEOUT = 2.0
+
+# Buckets the memory backend keeps; evicting one just refills it
+MEMORY_BUCKET_LIMIT = 10000
+
+# Seconds between sweeps of idle buckets from the SQLite table
+PURGE_INTERVAL = 3600
+
+class MemoryTokenBucket:
+    """Token buckets per key, refilled lazily on each acquire"""
+
+    blocking = False
+
+    def __init__(self, name, rate, window, burst, limit=MEMORY_BUCKET_LIMIT):
+        self.name = name
+        self.rate = rate / window
+        self.burst = burst
+        self.limit = limit
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def acquire(self, key=''):
+        """Take a token; returns (allowed, seconds until one is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.limit:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / self.rate
+
+class SQLiteTokenBucket:
+    """Token buckets per key in the rate_limits table, shared by every worker"""
+
+    blocking = True
+
+    def __init__(self, name, rate, window, burst, purge_interval=PURGE_INTERVAL):
+        self.name = name
+        self.rate = rate / window
+        self.burst = burst
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def acquire(self, key=''):
+        now = time.time()
+        allowed, retry_after = database.take_rate_limit_token(f'{self.name}:{key}', self.rate, self.burst, now)
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            database.purge_rate_limits(f'{self.name}:', now - self.burst / self.rate)
+        return allowed, retry_after
+
+BUCKETS = {'memory': MemoryTokenBucket, 'sqlite': SQLiteTokenBucket}
+
+class ConcurrencyLimiter:
+    """
+    Cap on concurrent holders with a bounded FIFO wait queue
+
+    Shared by threads and coroutines: a released slot is handed straight to
+    the longest waiter, so neither kind can starve the other. acquire()
+    returns False, rather than waiting, once max_waiting callers are queued,
+    and after wait_timeout seconds in the queue.
+    """
+
+    def __init__(self, limit=UPSTREAM_MAX_IN_FLIGHT, max_waiting=UPSTREAM_MAX_WAITING,
+                 wait_timeout=UPSTREAM_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.in_flight = 0
+        self._waiters = deque()   # callables handing a released slot to a waiter
+        self._lock = threading.Lock()
+
+    def _enter(self, waker):
+        """Take a free slot (True), queue the waker (None), or refuse (False)"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                return True
+            if len(self._waiters) >= self.max_waiting:
+                return False
+            self._waiters.append(waker)
+            return None
+
+    def _leave_queue(self, waker):
+        """Withdraw a waiter; False if a slot was handed to it meanwhile"""
+        with self._lock:
+            try:
+                self._waiters.remove(waker)
+                return True
+            except ValueError:
+                return False
+
+    def acquire(self):
+        event = threading.Event()
+        entered = self._enter(event.set)
+        if entered is not None:
+            return entered
+        if event.wait(self.wait_timeout):
+            return True
+        return not self._leave_queue(event.set)
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        entered = self._enter(wake)
+        if entered is not None:
+            return entered
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return not self._leave_queue(wake)
+        except asyncio.CancelledError:
+            if not self._leave_queue(wake):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                self._waiters.popleft()()
+            else:
+                self.in_flight -= 1
+
+    def waiting(self):
+        with self._lock:
+            return len(self._waiters)
+
+user_llm = BUCKETS[LIMITER_BACKEND]('llm-user', USER_LLM_RATE, USER_LLM_WINDOW, USER_LLM_BURST)
+global_llm = BUCKETS[LIMITER_BACKEND]('llm-global', GLOBAL_LLM_RATE, GLOBAL_LLM_WINDOW, GLOBAL_LLM_BURST)
+upstream = ConcurrencyLimiter()
+
+def admit_user(user_id):
+    """Take one of the user's LLM tokens; returns (allowed, retry_after seconds)"""
+    allowed, retry_after = user_llm.acquire(str(user_id))
+    if not allowed:
+        metrics.llm_shed.inc('user')
+    return allowed, retry_after
+
+@metrics.registry.collector
+def collect_metrics():
+    """Upstream slots in use and callers waiting for one, read at scrape time"""
+    return [
+        ('mindi_llm_in_flight', 'gauge', 'Upstream LLM calls holding a concurrency slot', (),
+         [((), upstream.in_flight)]),
+        ('mindi_llm_waiting', 'gauge', 'Upstream LLM calls queued for a concurrency slot', (),
+         [((), upstream.waiting())]),
+    ]
@@ -0,0 +1,297 @@
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally, deque
+
+# ===================================
+# In-process metrics, exposed in the Prometheus text format at /metrics
+#
+# Counters and histograms are plain dicts behind a lock, so recording costs
+# about a microsecond. Figures that already live elsewhere (cache stats, pool
+# depths, breaker state) are pulled at scrape time by registered collectors
+# instead of being pushed on every event. Values are per process: scrape each
+# worker, or sum them in Prometheus.
+# ===================================
+
+# Histogram buckets (seconds) for request and upstream latency, and for queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+# Slow-request profiler (opt-in): requests slower than SLOW_REQUEST_SECONDS
+# have their stacks, sampled every PROFILE_INTERVAL seconds, reported
+SLOW_REQUEST_PROFILING = False
+SLOW_REQUEST_SECONDS = 1.0
+PROFILE_INTERVAL = 0.005
+PROFILE_REPORTS_KEPT = 20
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.labels, values, value) for values, value in self._values.items()]
+
+class Histogram:
+    """Bucketed observations per label set, with sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # One slot per bucket plus +Inf, then the running sum
+                series = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        bucket_labels = self.labels + ('le',)
+        samples = []
+        with self._lock:
+            for values, series in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', bucket_labels, values + (_format_value(bound),), cumulative))
+                samples.append((f'{self.name}_sum', self.labels, values, series[-1]))
+                samples.append((f'{self.name}_count', self.labels, values, cumulative))
+        return samples
+
+class Registry:
+    """The metrics and collectors rendered at /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        metric = Counter(name, documentation, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Register func() -> [(name, kind, documentation, labels, [(label_values, value)])]
+        to be called at scrape time. Usable as a decorator."""
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, values, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels, values)} {_format_value(value)}')
+
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Error collecting metrics from {collect.__name__}: {e}")
+                continue
+            for name, kind, documentation, labels, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for values, value in samples:
+                    lines.append(f'{name}{_format_labels(labels, values)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+# ===================================
+# Standard Metrics
+# ===================================
+
+request_latency = registry.histogram(
+    'mindi_http_request_duration_seconds', 'Time to produce a response, by route',
+    ('method', 'route', 'status'))
+json_latency = registry.histogram(
+    'mindi_json_serialize_duration_seconds', 'Time spent serializing JSON responses',
+    buckets=QUERY_BUCKETS)
+query_latency = registry.histogram(
+    'mindi_db_query_duration_seconds', 'Time spent in database functions',
+    ('function',), buckets=QUERY_BUCKETS)
+query_errors = registry.counter(
+    'mindi_db_query_errors_total', 'Database functions that raised', ('function',))
+llm_latency = registry.histogram(
+    'mindi_llm_request_duration_seconds', 'Upstream LLM call time including retries (to first byte when streaming)',
+    ('client', 'stream', 'outcome'))
+llm_errors = registry.counter(
+    'mindi_llm_errors_total', 'Failed upstream LLM attempts and calls, by reason', ('reason',))
+cache_requests = registry.counter(
+    'mindi_cache_requests_total', 'Cache lookups, by cache and result', ('cache', 'result'))
+slow_requests = registry.counter(
+    'mindi_slow_requests_total', 'Requests slower than the profiler threshold', ('route',))
+llm_shed = registry.counter(
+    'mindi_llm_shed_total', 'LLM calls refused by admission control and answered with a canned reply, by limit',
+    ('limit',))
+
+def timed_query(func):
+    """Decorator recording a database function's duration and failures"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            query_errors.inc(name)
+            raise
+        finally:
+            query_latency.observe(time.perf_counter() - start, name)
+    return wrapper
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache, 'hit' if hit else 'miss')
+
+@registry.collector
+def collect_cache_ratios():
+    ratios = []
+    with cache_requests._lock:
+        totals = dict(cache_requests._values)
+    for cache in sorted({cache for cache, _ in totals}):
+        hits = totals.get((cache, 'hit'), 0)
+        lookups = hits + totals.get((cache, 'miss'), 0)
+        ratios.append(((cache,), hits / lookups if lookups else 0.0))
+    return [('mindi_cache_hit_ratio', 'gauge', 'Cache hits / lookups since start', ('cache',), ratios)]
+
+# ===================================
+# Slow Request Profiler
+# ===================================
+
+def _fold_stack(frame):
+    """Collapse a frame's stack into 'outer;...;inner' (flamegraph format)"""
+    parts = []
+    while frame is not None and len(parts) < 64:
+        code = frame.f_code
+        parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler for slow requests
+
+    While enabled, a background thread samples the stack of every thread
+    serving a request each `interval` seconds. When a request finishes slower
+    than `threshold`, its folded stack counts are printed and kept in
+    `reports`; faster requests' samples are discarded.
+    """
+
+    def __init__(self, threshold=SLOW_REQUEST_SECONDS, interval=PROFILE_INTERVAL, keep=PROFILE_REPORTS_KEPT):
+        self.threshold = threshold
+        self.interval = interval
+        self.reports = deque(maxlen=keep)
+        self.enabled = False
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def enable(self):
+        self.enabled = True
+        if self._pid != os.getpid():
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def disable(self):
+        self.enabled = False
+
+    def start(self, route):
+        """Begin sampling the calling thread; returns a token for finish()"""
+        if not self.enabled:
+            return None
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = (route, time.perf_counter(), Tally())
+        return thread_id
+
+    def finish(self, token):
+        """Stop sampling; returns the report if the request was slow"""
+        if token is None:
+            return None
+        with self._lock:
+            record = self._active.pop(token, None)
+        if record is None:
+            return None
+        route, started, stacks = record
+        duration = time.perf_counter() - started
+        if duration < self.threshold:
+            return None
+
+        report = {'route': route, 'duration': duration, 'samples': sum(stacks.values()),
+                  'stacks': stacks.most_common(10)}
+        self.reports.append(report)
+        slow_requests.inc(route)
+        print(f"Slow request {route}: {duration:.2f}s, {report['samples']} samples")
+        for stack, count in report['stacks'][:5]:
+            print(f"  {count:>5} {stack}")
+        return report
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (_, _, stacks) in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_fold_stack(frame)] += 1
+        self._pid = None
+
+profiler = SlowRequestProfiler()
+if SLOW_REQUEST_PROFILING:
+    profiler.enable()
@@ -0,0 +1,249 @@
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+import database
+import context_builder
+import embeddings
+
+# ===================================
+# Data retention and compaction
+#
+#     python retention.py                # one run now, report on stderr
+#     python retention.py --full-vacuum  # also convert an older database to
+#                                        # incremental auto_vacuum (one-off)
+#
+# Run from cron, or set MAINTENANCE_INTERVAL to have a background thread in
+# each serving process compete for a marker in the shared cache tier every
+# interval. Either way a run:
+#   - prunes insights superseded by a newer one from the same context, and
+#     finished AI jobs;
+#   - moves moods, journal entries and insights older than RETENTION_DAYS into
+#     compressed monthly chunks in history_archive (database.archive_history),
+#     leaving each user's newest RETENTION_KEEP_RECENT rows of each kind live
+#     so dashboards and insight context never need the archive;
+#   - returns the freed pages to the filesystem with incremental VACUUM and
+#     refreshes planner statistics with ANALYZE;
+#   - reports the space reclaimed and how the hot queries' latency changed.
+# History pages, exports and analytics read archived rows back transparently.
+# Full-text search and related-entry lookups do not: an archived entry leaves
+# journal_fts and journal_embeddings with its live row. That is why archiving
+# is opt-in; see README.md.
+# ===================================
+
+# Rows older than this many days are archived
+RETENTION_DAYS = 365
+
+# Newest rows of each kind per user never archived, whatever their age
+# (at least database.MAX_PAGE_SIZE, so a first history page is always live)
+RETENTION_KEEP_RECENT = 100
+
+# Tables archived, in database.ARCHIVE_COLUMNS terms
+ARCHIVED_KINDS = ('moods', 'journal_entries', 'insights')
+
+# Superseded insights and finished AI jobs are deleted after this many days
+SUPERSEDED_INSIGHT_DAYS = 1
+FINISHED_JOB_DAYS = 7
+
+# Pages freed per incremental VACUUM step, and the pause between steps
+VACUUM_STEP_PAGES = 1000
+VACUUM_STEP_PAUSE = 0.05
+
+# Rows sampled per index by ANALYZE
+ANALYZE_LIMIT = 1000
+
+# Users with the longest histories timed on every hot query, and runs each
+PROBE_USERS = 3
+PROBE_RUNS = 5
+
+# Seconds between runs, e.g. 24 * 3600 (None, the default, disables the
+# in-process scheduler), and before a newly started process first competes
+MAINTENANCE_INTERVAL = None
+MAINTENANCE_START_DELAY = 300
+
+# ===================================
+# Query Latency Probes
+# ===================================
+
+def probe_users(count=PROBE_USERS):
+    """The users with the most live moods, whose queries are the slowest"""
+    rows = database.get_db_connection().execute(
+        'SELECT user_id FROM moods GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT ?', (count,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def _probe_params(user_id, now):
+    """Representative parameters for each hot query; others are not timed"""
+    cursor = (now.isoformat(), 2 ** 62)
+    return {
+        'recent_moods': (user_id, 20),
+        'recent_journal_entries': (user_id, 5),
+        'recent_insights': (user_id, 3),
+        'moods_page': (user_id, *cursor, 20),
+        'journal_entries_page': (user_id, *cursor, 20),
+        'insights_page': (user_id, *cursor, 20),
+        'journal_search': (database.build_search_query(user_id, 'day*'), 10),
+        'insight_rate': (user_id, (now - timedelta(hours=1)).isoformat()),
+        'journal_embeddings_since': (user_id, embeddings.get_encoder().name, 0),
+        'archive_chunks': (user_id, 'moods', '9999', ''),
+        'export_archive_chunks': (user_id, 'moods'),
+        'export_moods': (user_id,),
+        'export_journal_entries': (user_id,),
+        'mood_stats': (user_id, (now - timedelta(days=7)).date().isoformat()),
+    }
+
+def measure_queries(user_ids, runs=PROBE_RUNS):
+    """Median seconds per hot query across the users and runs"""
+    conn = database.get_db_connection()
+    now = datetime.now()
+    timings = {}
+    for user_id in user_ids:
+        for name, params in _probe_params(user_id, now).items():
+            sql = database.HOT_QUERIES.get(name)
+            if sql is None:
+                continue
+            for _ in range(runs):
+                started = time.perf_counter()
+                conn.execute(sql, params).fetchall()
+                timings.setdefault(name, []).append(time.perf_counter() - started)
+    return {name: statistics.median(samples) for name, samples in timings.items()}
+
+# ===================================
+# Maintenance Run
+# ===================================
+
+def archive_user(user_id, horizon):
+    """Archive one user's rows older than horizon; returns {kind: rows}"""
+    # Fold everything into the rolling summary first: it only reads live rows
+    context_builder.refresh_summary(user_id)
+    return {kind: database.archive_history(user_id, kind, horizon, RETENTION_KEEP_RECENT)
+            for kind in ARCHIVED_KINDS}
+
+def run_maintenance(days=RETENTION_DAYS, full_vacuum=False):
+    """One retention and compaction pass; returns a report dict (see format_report)"""
+    started = time.perf_counter()
+    now = datetime.now()
+    users = probe_users()
+    latency_before = measure_queries(users)
+    storage_before = database.get_storage_stats()
+
+    pruned_insights = database.prune_superseded_insights(
+        (now - timedelta(days=SUPERSEDED_INSIGHT_DAYS)).isoformat()
+    )
+    purged_jobs = database.purge_finished_jobs((now - timedelta(days=FINISHED_JOB_DAYS)).isoformat())
+
+    horizon = (now - timedelta(days=days)).isoformat()
+    archived = dict.fromkeys(ARCHIVED_KINDS, 0)
+    user_ids = [row[0] for row in database.get_db_connection().execute('SELECT id FROM users ORDER BY id')]
+    for user_id in user_ids:
+        for kind, count in archive_user(user_id, horizon).items():
+            archived[kind] += count
+
+    pages_released = database.vacuum_database(VACUUM_STEP_PAGES, VACUUM_STEP_PAUSE, full=full_vacuum)
+    database.analyze_database(ANALYZE_LIMIT)
+
+    storage_after = database.get_storage_stats()
+    return {
+        'horizon': horizon,
+        'pruned_insights': pruned_insights,
+        'purged_jobs': purged_jobs,
+        'archived': archived,
+        'archive': database.get_archive_stats(),
+        'storage_before': storage_before,
+        'storage_after': storage_after,
+        'reclaimed_bytes': storage_before['bytes'] - storage_after['bytes'],
+        'pages_released': pages_released,
+        'latency_before': latency_before,
+        'latency_after': measure_queries(users),
+        'plan_problems': {name: issues for name, issues in database.check_query_plans().items() if issues},
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+def _megabytes(size):
+    return f"{size / 1024 / 1024:.1f} MB"
+
+def format_report(report):
+    archived, archive = report['archived'], report['archive']
+    before, after = report['storage_before'], report['storage_after']
+    lines = [
+        f"Pruned {report['pruned_insights']} superseded insights and {report['purged_jobs']} finished jobs",
+        f"Archived {archived['moods']} moods, {archived['journal_entries']} journal entries and "
+        f"{archived['insights']} insights older than {report['horizon'][:10]} "
+        f"(archive holds {archive['rows']} rows: {_megabytes(archive['raw_bytes'])} "
+        f"stored in {_megabytes(archive['stored_bytes'])})",
+        f"Database {_megabytes(before['bytes'])} -> {_megabytes(after['bytes'])}: "
+        f"{_megabytes(report['reclaimed_bytes'])} reclaimed, {report['pages_released']} pages released, "
+        f"{after['freelist_count']} free pages left",
+    ]
+    for name, was in report['latency_before'].items():
+        now = report['latency_after'].get(name)
+        if now is not None:
+            change = f"{(now - was) / was * 100:+.0f}%" if was else 'n/a'
+            lines.append(f"  {name}: {was * 1000:.3f} ms -> {now * 1000:.3f} ms ({change})")
+    for name, issues in report['plan_problems'].items():
+        lines.append(f"  query plan problem in {name}: {'; '.join(issues)}")
+    lines.append(f"Finished in {report['seconds']}s")
+    return '\n'.join(lines)
+
+# ===================================
+# Scheduling
+# ===================================
+
+class MaintenanceScheduler:
+    """
+    Runs maintenance every `interval` seconds from a daemon thread
+
+    Every serving process starts one; a marker added to the shared cache tier
+    with the interval as its lifetime lets only the first process to ask run
+    it each interval. Without a shared tier every process runs its own.
+    """
+
+    def __init__(self, interval=MAINTENANCE_INTERVAL, delay=MAINTENANCE_START_DELAY):
+        self.interval = interval
+        self.delay = delay
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """Start the thread once per process (threads do not survive a fork)"""
+        if self.interval is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='maintenance', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _due(self):
+        shared = database.shared_cache.shared
+        return shared is None or shared.add('maintenance:due', b'1', self.interval)
+
+    def _run(self):
+        time.sleep(self.delay)
+        while True:
+            try:
+                if self._due():
+                    print(format_report(run_maintenance()))
+            except Exception as e:
+                print(f"Error running maintenance: {e}")
+            # Check well within the interval, so the next run starts soon
+            # after the marker expires, whichever process takes it
+            time.sleep(min(self.interval, 3600))
+
+scheduler = MaintenanceScheduler()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive old history, prune and compact the database')
+    parser.add_argument('--db', default=database.DATABASE_NAME)
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help='retention horizon in days')
+    parser.add_argument('--full-vacuum', action='store_true',
+                        help='allow the one-off full VACUUM that switches an older database to '
+                             'incremental auto_vacuum')
+    args = parser.parse_args()
+
+    database.DATABASE_NAME = args.db
+    database.init_db()
+    print(format_report(run_maintenance(args.days, full_vacuum=args.full_vacuum)), file=sys.stderr)
@@ -0,0 +1,176 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+import database
+
+# ===================================
+# Server-side sessions
+#
+# Session data lives in a store on the server; the cookie carries only a
+# signed random session ID. Logging out deletes the stored session, so a
+# copied cookie stops working (which a signed-cookie session cannot offer),
+# and all of a user's sessions can be revoked at once.
+# ===================================
+
+# 'sqlite' shares sessions between worker processes and survives restarts;
+# 'memory' is faster but per process, so only suits a single worker
+SESSION_BACKEND = 'sqlite'
+
+# Most sessions the memory backend keeps before evicting the oldest
+MEMORY_SESSION_LIMIT = 10000
+
+# Seconds between sweeps of expired sessions from the SQLite table
+PURGE_INTERVAL = 3600
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its store ID and whether it changed"""
+
+    def __init__(self, data=None, sid=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+
+        super().__init__(data, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        """Move the session to a fresh ID on save; call at login so an ID
+        planted before authentication cannot be reused afterwards"""
+        self.rotate = True
+        self.modified = True
+
+class MemorySessionStore:
+    """In-process session store with TTL and size-bounded eviction"""
+
+    def __init__(self, limit=MEMORY_SESSION_LIMIT):
+        self.limit = limit
+        self._sessions = OrderedDict()   # sid -> (user_id, data, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[2] <= time.time():
+                del self._sessions[sid]
+                return None
+            return dict(entry[1]), entry[2]
+
+    def save(self, sid, user_id, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (user_id, dict(data), expires_at)
+            self._sessions.move_to_end(sid)
+            # Saves arrive in expiry order (the TTL is fixed), so expired and
+            # least recently saved sessions are both at the front
+            now = time.time()
+            while self._sessions and (len(self._sessions) > self.limit
+                                      or next(iter(self._sessions.values()))[2] <= now):
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            revoked = [sid for sid, entry in self._sessions.items() if entry[0] == user_id]
+            for sid in revoked:
+                del self._sessions[sid]
+        return len(revoked)
+
+class SQLiteSessionStore:
+    """Session store backed by the sessions table"""
+
+    def __init__(self, purge_interval=PURGE_INTERVAL):
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+
+    def get(self, sid):
+        return database.get_session(sid, time.time())
+
+    def save(self, sid, user_id, data, expires_at):
+        database.save_session(sid, user_id, data, expires_at)
+        now = time.time()
+        if now - self._last_purge > self.purge_interval:
+            self._last_purge = now
+            database.purge_expired_sessions(now)
+
+    def delete(self, sid):
+        database.delete_session(sid)
+
+    def delete_user(self, user_id):
+        return database.delete_user_sessions(user_id)
+
+STORES = {'sqlite': SQLiteSessionStore, 'memory': MemorySessionStore}
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a session store"""
+
+    def __init__(self, store=None):
+        self.store = store or STORES[SESSION_BACKEND]()
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='mindi-session')
+
+    def load(self, app, cookie_value):
+        """The session a cookie value refers to; a new empty one if none"""
+        if not cookie_value:
+            return ServerSession()
+        try:
+            sid = self._signer(app).unsign(cookie_value).decode()
+        except BadSignature:
+            return ServerSession()
+        stored = self.store.get(sid)
+        if stored is None:
+            return ServerSession()
+        data, expires_at = stored
+        return ServerSession(data, sid, expires_at)
+
+    def open_session(self, app, request):
+        return self.load(app, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # Emptied (logout): delete the stored session as well as the cookie
+        if not session:
+            if session.sid is not None:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        # Unchanged sessions are only re-saved to slide their expiry forward
+        # once half their lifetime has passed
+        if not session.modified and session.sid is not None and session.expires_at - now > lifetime / 2:
+            return
+
+        if session.rotate and session.sid is not None:
+            self.store.delete(session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires_at = now + lifetime
+        self.store.save(session.sid, session.get('user_id'), dict(session), session.expires_at)
+
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session), httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app),
+            domain=domain, path=path,
+        )
+        response.vary.add('Cookie')
+
+    def revoke_user(self, user_id):
+        """End every session of a user, e.g. after a password change"""
+        return self.store.delete_user(user_id)
@@ -127,7 +127,7 @@ $(document).ready(function () {
     // ===================================
 
     function loadDashboardData() {
-        $.ajax({
+        return $.ajax({
             url: '/api/dashboard',
             method: 'GET',
             success: function (response) {
@@ -177,10 +177,18 @@ $(document).ready(function () {
             }),
             success: function (response) {
                 if (response.success) {
-                    // Show AI suggestion
-                    if (response.suggestion) {
-                        $('#suggestion-text').text(response.suggestion);
-                        $('#ai-suggestion').slideDown(300);
+                    // Show AI suggestion, inline when cached, else once the background job finishes
+                    const showSuggestion = function (result) {
+                        if (result.suggestion) {
+                            $('#suggestion-text').text(result.suggestion);
+                            $('#ai-suggestion').slideDown(300);
+                            setTimeout(() => $('#ai-suggestion').slideUp(300), 8000);
+                        }
+                    };
+                    if (response.job_id) {
+                        waitForJob(response.job_id, showSuggestion);
+                    } else {
+                        showSuggestion(response);
                     }
 
                     // Reset form
@@ -194,7 +202,6 @@ $(document).ready(function () {
                     // Reload data
                     setTimeout(() => {
                         loadDashboardData();
-                        $('#ai-suggestion').slideUp(300);
                     }, 5000);
 
                     showNotification('Mood saved! 🎉');
@@ -210,6 +217,24 @@ $(document).ready(function () {
         });
     }
 
+    // ===================================
+    // Background AI Jobs
+    // ===================================
+
+    function waitForJob(jobId, onDone, attempt = 0) {
+        $.ajax({
+            url: `/api/jobs/${jobId}`,
+            method: 'GET',
+            success: function (job) {
+                if (job.status === 'done') {
+                    onDone(job.result);
+                } else if (job.status !== 'failed' && attempt < 60) {
+                    setTimeout(() => waitForJob(jobId, onDone, attempt + 1), 1000);
+                }
+            }
+        });
+    }
+
     // ===================================
     // Journal
     // ===================================
@@ -239,10 +264,18 @@ $(document).ready(function () {
             }),
             success: function (response) {
                 if (response.success) {
-                    // Show AI response
-                    if (response.ai_response) {
-                        $('#response-text').text(response.ai_response);
-                        $('#ai-response').slideDown(300);
+                    // Show AI response, inline when answered at once, else once the background job finishes
+                    const showResponse = function (result) {
+                        if (result.ai_response) {
+                            $('#response-text').text(result.ai_response);
+                            $('#ai-response').slideDown(300);
+                            setTimeout(() => $('#ai-response').slideUp(300), 8000);
+                        }
+                    };
+                    if (response.job_id) {
+                        waitForJob(response.job_id, showResponse);
+                    } else {
+                        showResponse(response);
                     }
 
                     // Clear journal
@@ -252,7 +285,6 @@ $(document).ready(function () {
                     // Reload entries
                     setTimeout(() => {
                         loadDashboardData();
-                        $('#ai-response').slideUp(300);
                     }, 5000);
 
                     showNotification('Journal entry saved! 📝');
@@ -301,24 +333,74 @@ $(document).ready(function () {
     function generateInsights() {
         toggleButtonLoading('#generate-insights', true);
 
-        $.ajax({
-            url: '/api/insights',
-            method: 'POST',
-            contentType: 'application/json',
-            success: function (response) {
-                if (response.success) {
-                    loadDashboardData();
-                    showNotification('New insight generated! ✨');
+        // Render the insight as it streams in, ahead of the saved list
+        const container = $('#insights-container');
+        container.find('.empty-state').remove();
+        const card = $(`
+            <div class="insight-card">
+                <div class="insight-header">
+                    <span class="insight-icon">💡</span>
+                    <span class="insight-date">${formatDate(new Date().toISOString())}</span>
+                </div>
+                <div class="insight-text"></div>
+            </div>
+        `).prependTo(container);
+        const text = card.find('.insight-text');
+
+        fetch('/api/insights/stream', { method: 'POST' })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
                 }
-            },
-            error: function (xhr) {
+                return readEventStream(response, function (event, data) {
+                    if (event === 'done' && data.reused) {
+                        // Nothing new since the last insight: point at it rather than repeat it
+                        card.remove();
+                        loadDashboardData().then(() => highlightInsight(data.insight_id));
+                        showNotification('No new check-ins since your last insight');
+                    } else if (event === 'done') {
+                        loadDashboardData();
+                        showNotification('New insight generated! ✨');
+                    } else if (data.delta) {
+                        text.text(text.text() + data.delta);
+                    }
+                });
+            })
+            .catch(error => {
+                card.remove();
                 showNotification('Failed to generate insight');
-                console.error('Error:', xhr);
-            },
-            complete: function () {
-                toggleButtonLoading('#generate-insights', false);
-            }
-        });
+                console.error('Error:', error);
+            })
+            .finally(() => toggleButtonLoading('#generate-insights', false));
+    }
+
+    function readEventStream(response, onEvent) {
+        // Minimal SSE parser for fetch() bodies (EventSource can't POST)
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (done) return;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event:')) event = line.slice(6).trim();
+                        else if (line.startsWith('data:')) data += line.slice(5).trim();
+                    });
+                    if (data) onEvent(event, JSON.parse(data));
+                }
+                return pump();
+            });
+        }
+
+        return pump();
     }
 
     function renderInsights(insights) {
@@ -334,7 +416,7 @@ $(document).ready(function () {
             const date = formatDate(insight.timestamp);
 
             html += `
-                <div class="insight-card">
+                <div class="insight-card" data-insight-id="${insight.id}">
                     <div class="insight-header">
                         <span class="insight-icon">💡</span>
                         <span class="insight-date">${date}</span>
@@ -347,6 +429,14 @@ $(document).ready(function () {
         container.html(html);
     }
 
+    function highlightInsight(insightId) {
+        const card = $(`#insights-container .insight-card[data-insight-id="${insightId}"]`);
+        if (card.length === 0) return;
+        card.addClass('reused')
+            .append('<p class="insight-note">No new check-ins since this insight, so it still applies.</p>');
+        card[0].scrollIntoView({ behavior: 'smooth', block: 'nearest' });
+    }
+
     function renderOverviewInsights(insights) {
         const container = $('#overview-insights-list');
 
@@ -75,10 +75,18 @@ $(document).ready(function () {
             }),
             success: function (response) {
                 if (response.success) {
-                    // Show AI suggestion
-                    if (response.suggestion) {
-                        $('#suggestion-text').text(response.suggestion);
-                        $('#ai-suggestion').slideDown(300);
+                    // Show AI suggestion, inline when cached, else once the background job finishes
+                    const showSuggestion = function (result) {
+                        if (result.suggestion) {
+                            $('#suggestion-text').text(result.suggestion);
+                            $('#ai-suggestion').slideDown(300);
+                            setTimeout(() => $('#ai-suggestion').slideUp(300), 8000);
+                        }
+                    };
+                    if (response.job_id) {
+                        waitForJob(response.job_id, showSuggestion);
+                    } else {
+                        showSuggestion(response);
                     }
 
                     // Reset form
@@ -92,7 +100,6 @@ $(document).ready(function () {
                     // Reload dashboard
                     setTimeout(() => {
                         loadDashboardData();
-                        $('#ai-suggestion').slideUp(300);
                     }, 5000);
 
                     showNotification('Mood saved successfully! 🎉', 'success');
@@ -108,6 +115,24 @@ $(document).ready(function () {
         });
     }
 
+    // ===================================
+    // Background AI Jobs
+    // ===================================
+
+    function waitForJob(jobId, onDone, attempt = 0) {
+        $.ajax({
+            url: `/api/jobs/${jobId}`,
+            method: 'GET',
+            success: function (job) {
+                if (job.status === 'done') {
+                    onDone(job.result);
+                } else if (job.status !== 'failed' && attempt < 60) {
+                    setTimeout(() => waitForJob(jobId, onDone, attempt + 1), 1000);
+                }
+            }
+        });
+    }
+
     // ===================================
     // Journal
     // ===================================
@@ -138,10 +163,18 @@ $(document).ready(function () {
             }),
             success: function (response) {
                 if (response.success) {
-                    // Show AI response
-                    if (response.ai_response) {
-                        $('#response-text').text(response.ai_response);
-                        $('#ai-response').slideDown(300);
+                    // Show AI response, inline when answered at once, else once the background job finishes
+                    const showResponse = function (result) {
+                        if (result.ai_response) {
+                            $('#response-text').text(result.ai_response);
+                            $('#ai-response').slideDown(300);
+                            setTimeout(() => $('#ai-response').slideUp(300), 8000);
+                        }
+                    };
+                    if (response.job_id) {
+                        waitForJob(response.job_id, showResponse);
+                    } else {
+                        showResponse(response);
                     }
 
                     // Clear journal
@@ -151,7 +184,6 @@ $(document).ready(function () {
                     // Reload entries
                     setTimeout(() => {
                         loadJournalEntries();
-                        $('#ai-response').slideUp(300);
                     }, 5000);
 
                     showNotification('Journal entry saved! 📝', 'success');
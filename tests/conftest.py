@@ -0,0 +1,44 @@
+import contextlib
+import io
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import jobs
+import limits
+import retention
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh database (and shared cache file) for one test"""
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'test.db'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_db()
+    yield database
+    database.close_db_connection()
+
+@pytest.fixture(autouse=True)
+def fresh_limits(monkeypatch):
+    """Empty rate limit buckets, as user IDs repeat across fresh databases"""
+    for name in ('user_llm', 'global_llm'):
+        bucket = getattr(limits, name)
+        monkeypatch.setattr(limits, name, limits.MemoryTokenBucket(
+            bucket.name, bucket.rate, 1, bucket.burst
+        ))
+
+@pytest.fixture
+def app_client(db, monkeypatch):
+    """A Flask test client logged in as a freshly registered user, without
+    the background job workers and maintenance scheduler"""
+    import app
+    monkeypatch.setattr(jobs.pool, 'ensure_started', lambda: None)
+    monkeypatch.setattr(retention.scheduler, 'ensure_started', lambda: None)
+    client = app.app.test_client()
+    response = client.post('/api/register', json={
+        'username': 'tester', 'email': 'tester@example.com', 'password': 'secret123'
+    })
+    client.user_id = response.get_json()['user_id']
+    return client
@@ -0,0 +1,145 @@
+import asyncio
+import time
+import pytest
+import requests
+import ai_service
+import limits
+from benchmarks.fake_llm import FakeLLMServer
+
+MESSAGES = [{'role': 'user', 'content': 'hello'}]
+
+@pytest.fixture
+def upstream():
+    server = FakeLLMServer(latency=0.01).start()
+    yield server
+    server.stop()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(ai_service, 'backoff_delay', lambda attempt, retry_after=None: 0)
+
+def make_client(url, **kwargs):
+    kwargs.setdefault('breaker', ai_service.CircuitBreaker())
+    return ai_service.AIClient(api_url=url, limiter=limits.ConcurrencyLimiter(), **kwargs)
+
+def reply(body):
+    return body['choices'][0]['message']['content']
+
+def test_retries_5xx_then_succeeds(upstream):
+    upstream.fail_first = 2
+    client = make_client(upstream.url, max_retries=2)
+    assert reply(client.chat(MESSAGES)) == upstream.reply
+    assert upstream.requests == 3
+    assert client.breaker.state == 'closed'
+
+def test_gives_up_after_max_retries(upstream):
+    upstream.error_rate = 1.0
+    client = make_client(upstream.url, max_retries=2)
+    with pytest.raises(ai_service.AIUnavailableError):
+        client.chat(MESSAGES)
+    assert upstream.requests == 3
+
+def test_read_timeout_is_not_retried(upstream):
+    upstream.latency = 1.0
+    client = make_client(upstream.url, max_retries=2)
+    with pytest.raises(ai_service.AIUnavailableError):
+        client.chat(MESSAGES, read_timeout=0.1)
+    assert upstream.requests == 1
+
+def test_connect_error_is_retried(upstream, monkeypatch):
+    client = make_client(upstream.url, max_retries=2)
+    calls = []
+    post = client.session.post
+
+    def flaky_post(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectTimeout("connect timed out")
+        return post(**kwargs)
+
+    monkeypatch.setattr(client.session, 'post', flaky_post)
+    assert reply(client.chat(MESSAGES)) == upstream.reply
+    assert len(calls) == 2
+
+def test_breaker_opens_and_stops_calling_upstream(upstream):
+    upstream.error_rate = 1.0
+    breaker = ai_service.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    client = make_client(upstream.url, max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ai_service.AIUnavailableError):
+            client.chat(MESSAGES)
+    assert breaker.state == 'open'
+
+    with pytest.raises(ai_service.AIUnavailableError, match='circuit is open'):
+        client.chat(MESSAGES)
+    assert upstream.requests == 2
+
+def test_half_open_trial_success_closes_breaker(upstream):
+    upstream.error_rate = 1.0
+    breaker = ai_service.CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    client = make_client(upstream.url, max_retries=0, breaker=breaker)
+    with pytest.raises(ai_service.AIUnavailableError):
+        client.chat(MESSAGES)
+    time.sleep(0.15)
+    assert breaker.state == 'half-open'
+
+    upstream.error_rate = 0.0
+    assert reply(client.chat(MESSAGES)) == upstream.reply
+    assert breaker.state == 'closed'
+
+def test_half_open_trial_failure_reopens_breaker(upstream):
+    upstream.error_rate = 1.0
+    breaker = ai_service.CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    client = make_client(upstream.url, max_retries=0, breaker=breaker)
+    with pytest.raises(ai_service.AIUnavailableError):
+        client.chat(MESSAGES)
+    time.sleep(0.15)
+    with pytest.raises(ai_service.AIUnavailableError):
+        client.chat(MESSAGES)
+    assert breaker.state == 'open'
+    assert upstream.requests == 2
+
+def test_half_open_allows_a_single_trial():
+    breaker = ai_service.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+def test_async_client_retries_5xx_but_not_read_timeouts(upstream):
+    async def call(client, **kwargs):
+        try:
+            return await client.chat(MESSAGES, **kwargs)
+        finally:
+            await client.aclose()
+
+    def make_async_client():
+        return ai_service.AsyncAIClient(api_url=upstream.url, max_retries=2, breaker=ai_service.CircuitBreaker(),
+                                        limiter=limits.ConcurrencyLimiter())
+
+    upstream.fail_first = 1
+    assert reply(asyncio.run(call(make_async_client()))) == upstream.reply
+    assert upstream.requests == 2
+
+    upstream.latency = 1.0
+    with pytest.raises(ai_service.AIUnavailableError):
+        asyncio.run(call(make_async_client(), read_timeout=0.1))
+    assert upstream.requests == 3
+
+def test_shed_call_spends_no_global_token_and_frees_its_slot(upstream, monkeypatch):
+    bucket = limits.MemoryTokenBucket('llm-global', 1, 60, 1)
+    monkeypatch.setattr(limits, 'global_llm', bucket)
+    full = limits.ConcurrencyLimiter(limit=0, max_waiting=0)
+    with pytest.raises(ai_service.AIOverloadedError):
+        ai_service.AIClient(api_url=upstream.url, limiter=full).chat(MESSAGES)
+    with pytest.raises(ai_service.AIOverloadedError):
+        asyncio.run(ai_service.AsyncAIClient(api_url=upstream.url, limiter=full).chat(MESSAGES))
+    assert upstream.requests == 0
+
+    # The one token is still there; once it is spent, the refused call hands its slot back
+    client = make_client(upstream.url)
+    assert reply(client.chat(MESSAGES)) == upstream.reply
+    with pytest.raises(ai_service.AIOverloadedError):
+        client.chat(MESSAGES)
+    assert client.limiter.in_flight == 0
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+import pytest
+
+@pytest.fixture
+def user_id(db):
+    """A user whose 2023 moods are archived, then 2021 history imported live"""
+    user_id = db.create_user('archive-user', 'archive@example.com', 'secret123')
+    start = datetime(2023, 1, 1)
+    db.insert_moods_batch(user_id, [((start + timedelta(days=i)).isoformat(), 'calm', 5, '')
+                                    for i in range(60)])
+    db.insert_moods_batch(user_id, [(datetime.now().isoformat(), 'happy', 7, '')])
+    assert db.archive_history(user_id, 'moods', '2024-01-01T00:00:00') == 60
+
+    imported = datetime(2021, 6, 1)
+    db.insert_moods_batch(user_id, [((imported + timedelta(days=i)).isoformat(), 'sad', 3, '')
+                                    for i in range(30)])
+    return user_id
+
+def _key(row):
+    return row['timestamp'], row['id']
+
+def test_pages_merge_archive_behind_imported_history(db, user_id):
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.get_moods_page(user_id, limit=7, cursor=cursor)
+        seen += page
+        if cursor is None:
+            break
+    assert len(seen) == 91
+    assert [_key(row) for row in seen] == sorted((_key(row) for row in seen), reverse=True)
+    assert [row['mood_type'] for row in seen] == ['happy'] + ['calm'] * 60 + ['sad'] * 30
+
+def test_export_merges_archive_in_time_order(db, user_id):
+    rows = list(db.iter_moods(user_id))
+    assert [_key(row) for row in rows] == sorted(_key(row) for row in rows)
+    assert [row['mood_type'] for row in rows] == ['sad'] * 30 + ['calm'] * 60 + ['happy']
@@ -0,0 +1,30 @@
+import asyncio
+import json
+import pytest
+import asgi
+
+def _call(handler, user_id, body):
+    """Run an async route handler on one request body; returns (status, JSON)"""
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(handler(user_id, receive, send))
+    body = b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+    return sent[0]['status'], json.loads(body)
+
+@pytest.mark.parametrize('body', [b'{"content": ', b'not json', b'["a list"]'])
+def test_journal_stream_rejects_bad_body(db, body):
+    status, data = _call(asgi.add_journal_streaming, 1, body)
+    assert status == 400
+    assert 'error' in data
+
+def test_journal_stream_requires_content(db):
+    status, data = _call(asgi.add_journal_streaming, 1, b'{"content": "  "}')
+    assert status == 400
+    assert data == {'error': 'Journal content is required'}
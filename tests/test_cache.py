@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+import cache
+
+def _concurrently(func, threads=8):
+    """Run func on several threads released together; returns their results"""
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def run():
+        barrier.wait()
+        results.append(func())
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    return results
+
+class _Counted:
+    """A slow compute that records each call"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(0.2)
+        return {'calls': calls}
+
+@pytest.fixture
+def shared(tmp_path):
+    return cache.SQLiteTier(str(tmp_path / 'cache.db'))
+
+def test_concurrent_misses_compute_once_in_a_process():
+    local = cache.Cache()
+    compute = _Counted()
+    results = _concurrently(lambda: local.get_or_compute('stats', 'user:1', compute))
+    assert compute.calls == 1
+    assert results == [{'calls': 1}] * 8
+
+def test_concurrent_misses_compute_once_across_processes(shared):
+    # Two caches over one shared tier stand in for two worker processes
+    workers = [cache.Cache(shared), cache.Cache(shared)]
+    compute = _Counted()
+    turn = iter(range(8))
+    results = _concurrently(lambda: workers[next(turn) % 2].get_or_compute('stats', 'user:1', compute))
+    assert compute.calls == 1
+    assert results == [{'calls': 1}] * 8
+
+@pytest.mark.parametrize('tiers', ['memory', 'shared'])
+def test_bump_invalidates_only_its_scope(tiers, shared):
+    local = cache.Cache(shared if tiers == 'shared' else None)
+    compute = _Counted()
+    assert local.get_or_compute('stats', 'user:1', compute) == {'calls': 1}
+    assert local.get_or_compute('stats', 'user:2', compute) == {'calls': 2}
+    assert local.get_or_compute('stats', 'user:1', compute) == {'calls': 1}
+
+    local.bump('user:1')
+    assert local.get_or_compute('stats', 'user:1', compute) == {'calls': 3}
+    assert local.get_or_compute('stats', 'user:2', compute) == {'calls': 2}
+    assert compute.calls == 3
+
+def test_bump_in_one_process_invalidates_the_others(shared):
+    writer, reader = cache.Cache(shared), cache.Cache(shared)
+    compute = _Counted()
+    assert reader.get_or_compute('stats', 'user:1', compute) == {'calls': 1}
+    writer.bump('user:1')
+    assert reader.get_or_compute('stats', 'user:1', compute) == {'calls': 2}
+    assert writer.get_or_compute('stats', 'user:1', compute) == {'calls': 2}
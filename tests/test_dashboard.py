@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+def _frozen(monkeypatch, db, moment):
+    class Frozen(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment
+    monkeypatch.setattr(db, 'datetime', Frozen)
+
+def test_unchanged_dashboard_revalidates(app_client):
+    etag = app_client.get('/api/dashboard').headers['ETag']
+    assert app_client.get('/api/dashboard', headers={'If-None-Match': etag}).status_code == 304
+
+def test_write_invalidates_etag(app_client):
+    etag = app_client.get('/api/dashboard').headers['ETag']
+    app_client.post('/api/mood', json={'mood_type': 'calm', 'intensity': 5})
+    response = app_client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_stats_window_moves_at_midnight(app_client, db, monkeypatch):
+    today = datetime.now().replace(hour=12)
+    db.add_mood(app_client.user_id, 'calm', 5)
+    conn = db.get_db_connection()
+    # Logged six days ago: inside today's 7-day window, outside tomorrow's
+    day = (today - timedelta(days=6)).isoformat()
+    conn.execute('UPDATE moods SET timestamp = ? WHERE user_id = ?', (day, app_client.user_id))
+    conn.execute('UPDATE mood_daily_rollup SET day = ? WHERE user_id = ?', (day[:10], app_client.user_id))
+    conn.commit()
+    db.bump_user_version(app_client.user_id)
+
+    _frozen(monkeypatch, db, today)
+    response = app_client.get('/api/dashboard')
+    etag = response.headers['ETag']
+    assert [row['mood_type'] for row in response.get_json()['stats']] == ['calm']
+
+    _frozen(monkeypatch, db, today + timedelta(days=1))
+    response = app_client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['stats'] == []
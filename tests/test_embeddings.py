@@ -0,0 +1,32 @@
+import pytest
+import embeddings
+
+@pytest.fixture
+def user_id(db, monkeypatch):
+    monkeypatch.setattr(embeddings, '_vectors', embeddings.OrderedDict())
+    user_id = db.create_user('embed-user', 'embed@example.com', 'secret123')
+    db.add_journal_entry(user_id, 'walked by the river and felt calm')
+    db.add_journal_entry(user_id, 'deadline stress at work again')
+    embeddings.embed_pending(user_id)
+    return user_id
+
+def test_search_picks_up_entries_embedded_after_caching(db, user_id):
+    assert [entry['content'] for entry in embeddings.find_similar(user_id, 'calm river walk', limit=1)] == \
+        ['walked by the river and felt calm']
+
+    entry_id = db.add_journal_entry(user_id, 'gardening in the sun all afternoon')
+    embeddings.embed_pending(user_id)
+    matches = embeddings.find_similar(user_id, 'gardening in the sun', limit=1)
+    assert [entry['id'] for entry in matches] == [entry_id]
+
+def test_database_is_read_outside_the_cache_lock(db, user_id, monkeypatch):
+    iter_since = db.iter_journal_embeddings_since
+    locked = []
+
+    def spy(*args):
+        locked.append(embeddings._vectors_lock.locked())
+        return iter_since(*args)
+
+    monkeypatch.setattr(db, 'iter_journal_embeddings_since', spy)
+    embeddings.find_similar(user_id, 'river')
+    assert locked == [False]
@@ -0,0 +1,153 @@
+import sqlite3
+import threading
+import time
+import pytest
+
+def _insert(conn, value):
+    return conn.execute('INSERT INTO batch_test (value) VALUES (?)', (value,)).lastrowid
+
+def _fail(conn, value):
+    _insert(conn, value)
+    raise ValueError(f'bad write {value}')
+
+@pytest.fixture
+def table(db):
+    conn = db.get_db_connection()
+    conn.execute('CREATE TABLE batch_test (id INTEGER PRIMARY KEY, value TEXT)')
+    conn.commit()
+    return db
+
+def _values(db):
+    return [row[0] for row in db.get_db_connection().execute('SELECT value FROM batch_test ORDER BY id')]
+
+class _Blocked:
+    """Holds the writer inside a first write so later ones pile up in its queue"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.results = {}
+        self.threads = []
+        self.submit(self._gate, 'gate')
+        assert self.entered.wait(5)
+
+    def _gate(self, conn, value):
+        self.entered.set()
+        self.release.wait(5)
+        return _insert(conn, value)
+
+    def submit(self, func, value):
+        def run():
+            try:
+                self.results[value] = self.writer.submit(func, value)
+            except Exception as e:
+                self.results[value] = e
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+
+    def queue_up(self, func, values):
+        for value in values:
+            self.submit(func, value)
+            # One at a time, so the queue order is the submission order
+            _wait_for(lambda: self.writer._queue.qsize() >= len(self.threads) - 1)
+
+    def finish(self):
+        self.release.set()
+        for thread in self.threads:
+            thread.join(5)
+        return self.results
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+def test_batch_closes_at_max_batch(table):
+    writer = table.GroupCommitWriter(latency=60, max_batch=3)
+    blocked = _Blocked(writer)
+    values = [f'w{i}' for i in range(7)]
+    blocked.queue_up(_insert, values)
+    results = blocked.finish()
+    writer.stop(5)
+
+    # gate alone, then 3 + 3 + 1 despite the long latency
+    assert writer.stats()['batches'] == 4
+    assert writer.stats()['writes'] == 8
+    assert _values(table) == ['gate'] + values
+    assert [results[value] for value in values] == sorted(results[value] for value in values)
+
+def test_batch_closes_at_latency(table):
+    writer = table.GroupCommitWriter(latency=0, max_batch=100)
+    blocked = _Blocked(writer)
+    blocked.queue_up(_insert, ['a', 'b', 'c'])
+    blocked.finish()
+    writer.stop(5)
+
+    # With no latency budget each batch closes after its first write
+    assert writer.stats()['batches'] == 4
+    assert _values(table) == ['gate', 'a', 'b', 'c']
+
+def test_lone_write_commits_without_waiting_for_latency(table):
+    writer = table.GroupCommitWriter(latency=60, max_batch=100)
+    started = time.monotonic()
+    writer.submit(_insert, 'alone')
+    assert time.monotonic() - started < 5
+    writer.stop(5)
+    assert _values(table) == ['alone']
+
+def test_failed_write_is_rolled_back_alone(table):
+    writer = table.GroupCommitWriter(latency=60, max_batch=100)
+    blocked = _Blocked(writer)
+    blocked.queue_up(_insert, ['a'])
+    blocked.queue_up(_fail, ['b'])
+    blocked.queue_up(_insert, ['c'])
+    results = blocked.finish()
+    writer.stop(5)
+
+    assert writer.stats()['batches'] == 2
+    assert isinstance(results['b'], ValueError)
+    assert isinstance(results['a'], int) and isinstance(results['c'], int)
+    assert _values(table) == ['gate', 'a', 'c']
+
+class _FailingCommit:
+    """Connection whose COMMIT fails, as on a full disk"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        raise sqlite3.OperationalError('database or disk is full')
+
+def test_commit_error_reaches_every_waiter(table, monkeypatch):
+    connect = table._connect
+    monkeypatch.setattr(table, '_connect', lambda: _FailingCommit(connect()))
+    writer = table.GroupCommitWriter(latency=60, max_batch=100)
+    blocked = _Blocked(writer)
+    blocked.queue_up(_insert, ['a', 'b', 'c'])
+    results = blocked.finish()
+    writer.stop(5)
+
+    assert writer.stats()['batches'] == 2
+    for value in ('gate', 'a', 'b', 'c'):
+        assert isinstance(results[value], sqlite3.OperationalError)
+    assert _values(table) == []
+
+def test_stop_commits_queued_writes_first(table):
+    writer = table.GroupCommitWriter(latency=60, max_batch=2)
+    blocked = _Blocked(writer)
+    blocked.queue_up(_insert, ['a', 'b', 'c'])
+    stopper = threading.Thread(target=writer.stop, args=(5,))
+    stopper.start()
+    _wait_for(lambda: writer._queue.qsize() == 4)
+    results = blocked.finish()
+    stopper.join(5)
+
+    assert not writer._thread.is_alive()
+    assert all(isinstance(results[value], int) for value in ('gate', 'a', 'b', 'c'))
+    assert _values(table) == ['gate', 'a', 'b', 'c']
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+
+def _age_running_jobs(db, seconds):
+    conn = db.get_db_connection()
+    conn.execute("UPDATE ai_jobs SET updated_at = ? WHERE status = 'running'",
+                 ((datetime.now() - timedelta(seconds=seconds)).isoformat(),))
+    conn.commit()
+
+def test_stale_job_is_requeued_then_failed_after_max_attempts(db):
+    job_id = db.enqueue_job(1, 'mood_suggestion', {})
+
+    assert db.claim_next_job()['attempts'] == 1
+    _age_running_jobs(db, 600)
+    assert db.requeue_stale_jobs(120, max_attempts=2) == 1
+    assert db.get_job(job_id, 1)['status'] == 'queued'
+
+    assert db.claim_next_job()['attempts'] == 2
+    _age_running_jobs(db, 600)
+    db.requeue_stale_jobs(120, max_attempts=2)
+    job = db.get_job(job_id, 1)
+    assert job['status'] == 'failed'
+    assert job['error']
+    assert db.claim_next_job() is None
+
+def test_running_job_within_lease_is_left_alone(db):
+    job_id = db.enqueue_job(1, 'mood_suggestion', {})
+    db.claim_next_job()
+    assert db.requeue_stale_jobs(120, max_attempts=3) == 0
+    assert db.get_job(job_id, 1)['status'] == 'running'
@@ -0,0 +1,12 @@
+import contextlib
+import io
+
+def test_migrations_rerun_cleanly_after_partial_upgrade(db):
+    conn = db.get_db_connection()
+    # As if a version's steps ran but the process died before recording it
+    conn.execute('DELETE FROM schema_version WHERE version >= 8')
+    conn.commit()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert db.run_migrations() == db.MIGRATIONS[-1][0]
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(insights)')]
+    assert columns.count('context_hash') == 1
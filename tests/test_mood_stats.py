@@ -0,0 +1,20 @@
+import pytest
+
+def test_stats_cover_the_requested_days(app_client, db):
+    db.add_mood(app_client.user_id, 'calm', 6)
+    response = app_client.get('/api/mood/stats?days=30')
+    assert response.status_code == 200
+    assert response.get_json()['stats'][0]['mood_type'] == 'calm'
+
+def test_huge_window_is_clamped(app_client, db, monkeypatch):
+    seen = []
+    stats = db.get_mood_stats_cached
+    monkeypatch.setattr(db, 'get_mood_stats_cached', lambda user_id, days: seen.append(days) or stats(user_id, days))
+    assert app_client.get('/api/mood/stats?days=99999999999999').status_code == 200
+    assert seen == [db.MAX_STATS_DAYS]
+
+@pytest.mark.parametrize('days', ['0', '-3', 'abc', '1.5', ''])
+def test_bad_window_is_rejected(app_client, days):
+    response = app_client.get(f'/api/mood/stats?days={days}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
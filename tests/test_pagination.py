@@ -0,0 +1,41 @@
+import pytest
+import database
+
+def _pages(client, path, key, limit):
+    seen, cursor = [], None
+    while True:
+        query = f'{path}?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(query).get_json()
+        seen.append(body[key])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return seen
+
+def test_cursor_round_trip():
+    row = {'timestamp': '2024-03-01T10:00:00', 'id': 42}
+    assert database.decode_cursor(database.encode_cursor(row)) == ('2024-03-01T10:00:00', 42)
+
+def test_pages_cover_every_row_once_in_order(app_client, db):
+    # Equal timestamps: the id breaks ties, so none is skipped or repeated
+    db.insert_moods_batch(app_client.user_id, [('2024-03-01T10:00:00', 'calm', 5, '')] * 12
+                          + [('2024-03-02T10:00:00', 'sad', 3, '')] * 13)
+    pages = _pages(app_client, '/api/mood', 'moods', 10)
+    assert [len(page) for page in pages] == [10, 10, 5]
+    rows = [row for page in pages for row in page]
+    keys = [(row['timestamp'], row['id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert len(set(keys)) == 25
+
+@pytest.mark.parametrize('path', ['/api/mood', '/api/journal', '/api/insights'])
+@pytest.mark.parametrize('cursor', ['garbage', 'WzEsMl0', 'bm90IGpzb24'])
+def test_malformed_cursor_is_400(app_client, path, cursor):
+    response = app_client.get(f'{path}?cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+@pytest.mark.parametrize('limit, expected', [(1000, 100), (0, 1), (-5, 1), (7, 7)])
+def test_limit_is_clamped(app_client, db, limit, expected):
+    db.insert_moods_batch(app_client.user_id, [('2024-03-01T10:00:00', 'calm', 5, '')] * 120)
+    body = app_client.get(f'/api/mood?limit={limit}').get_json()
+    assert len(body['moods']) == expected
+    assert body['next_cursor'] is not None
@@ -0,0 +1,28 @@
+import pytest
+import database
+
+def test_scrypt_hash_round_trip():
+    stored = database.hash_password('correct horse')
+    assert database.verify_password('correct horse', stored)
+    assert not database.verify_password('wrong horse', stored)
+
+@pytest.mark.parametrize('stored', [
+    'scrypt$16384$8$1$c2FsdA==',                   # truncated: a field missing
+    'scrypt$16384$8$1$c2FsdA==$',                  # empty digest
+    'scrypt$lots$8$1$c2FsdA==$ZGlnZXN0',           # non-numeric parameter
+    'scrypt$16384$8$1$not base64!$ZGlnZXN0',       # bad salt encoding
+    'scrypt$3$8$1$c2FsdA==$ZGlnZXN0',              # n not a power of two
+])
+def test_malformed_scrypt_hash_is_rejected_not_raised(stored):
+    assert database.verify_password('anything', stored) is False
+
+def test_unknown_username_costs_a_full_scrypt(db, monkeypatch):
+    db.create_user('known', 'known@example.com', 'secret123')
+    calls = []
+    scrypt = db._scrypt
+    monkeypatch.setattr(db, '_scrypt', lambda *args: calls.append(args[2:]) or scrypt(*args))
+
+    assert db.verify_user('known', 'wrong password') is None
+    assert db.verify_user('nobody', 'wrong password') is None
+    expected = (db.SCRYPT_N, db.SCRYPT_R, db.SCRYPT_P, db.SCRYPT_DKLEN)
+    assert calls == [expected, expected]
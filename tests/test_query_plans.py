@@ -0,0 +1,3 @@
+def test_hot_queries_use_their_indexes(db):
+    problems = {name: issues for name, issues in db.check_query_plans().items() if issues}
+    assert problems == {}
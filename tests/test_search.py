@@ -0,0 +1,47 @@
+import pytest
+
+WALK = 'A calm walk NOT near the river'
+
+@pytest.fixture
+def users(db):
+    alice = db.create_user('alice', 'alice@example.com', 'secret123')
+    bob = db.create_user('bob', 'bob@example.com', 'secret123')
+    db.add_journal_entry(alice, 'Feeling anxious before the exam, anxiety everywhere')
+    db.add_journal_entry(alice, WALK)
+    db.add_journal_entry(alice, 'Took some time off')
+    db.add_journal_entry(bob, 'bob is anxious too')
+    return alice, bob
+
+def _contents(db, user_id, text):
+    return sorted(row['content'] for row in db.search_journal_entries(user_id, text))
+
+def test_prefix_query(db, users):
+    alice, _ = users
+    assert _contents(db, alice, 'anx*') == ['Feeling anxious before the exam, anxiety everywhere']
+    assert _contents(db, alice, 'anx') == []
+
+def test_terms_are_quoted_and_combined(db, users):
+    alice, _ = users
+    assert db.build_search_query(alice, 'calm walk') == f'owner : "u{alice}" AND content : ("calm" "walk")'
+    assert _contents(db, alice, 'calm walk') == [WALK]
+
+@pytest.mark.parametrize('text, expected', [
+    ('walk NOT river', [WALK]),          # NOT is a word in the entry, not an operator
+    ('NEAR(walk river)', [WALK]),
+    ('"walk', [WALK]),
+    ('walk OR exam', []),                # every word must match, OR included
+    ('content: walk', []),               # no column filter smuggled in
+    ('owner : u2 OR walk', []),
+])
+def test_operators_are_literal_text(db, users, text, expected):
+    alice, _ = users
+    assert _contents(db, alice, text) == expected
+
+def test_results_are_scoped_to_the_user(db, users):
+    alice, bob = users
+    assert _contents(db, bob, 'anxious') == ['bob is anxious too']
+    assert _contents(db, alice, 'bob') == []
+
+def test_no_searchable_words(db, users):
+    with pytest.raises(ValueError):
+        db.build_search_query(users[0], '*** ?!')
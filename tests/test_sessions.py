@@ -0,0 +1,44 @@
+import pytest
+
+CREDENTIALS = {'username': 'tester', 'password': 'secret123'}
+
+@pytest.fixture
+def cookie_name(app_client):
+    return app_client.application.config['SESSION_COOKIE_NAME']
+
+def _sid(client, name):
+    cookie = client.get_cookie(name)
+    return cookie.value if cookie else None
+
+def _replay(client, name, value):
+    """A fresh client presenting a copied session cookie"""
+    other = client.application.test_client()
+    other.set_cookie(name, value)
+    return other
+
+def test_login_moves_the_session_to_a_new_id(app_client, cookie_name):
+    registered = _sid(app_client, cookie_name)
+    assert app_client.post('/api/login', json=CREDENTIALS).status_code == 200
+    logged_in = _sid(app_client, cookie_name)
+
+    assert logged_in and logged_in != registered
+    assert _replay(app_client, cookie_name, registered).get('/api/dashboard').status_code == 401
+    assert _replay(app_client, cookie_name, logged_in).get('/api/dashboard').status_code == 200
+
+def test_logged_out_session_id_is_rejected(app_client, cookie_name):
+    copied = _sid(app_client, cookie_name)
+    assert app_client.get('/api/dashboard').status_code == 200
+    assert app_client.post('/api/logout').status_code == 200
+
+    assert _sid(app_client, cookie_name) is None
+    assert _replay(app_client, cookie_name, copied).get('/api/dashboard').status_code == 401
+
+def test_logout_everywhere_ends_other_sessions(app_client, cookie_name):
+    other = app_client.application.test_client()
+    assert other.post('/api/login', json=CREDENTIALS).status_code == 200
+    assert app_client.post('/api/logout').status_code == 200
+    assert other.get('/api/dashboard').status_code == 200
+
+    assert app_client.post('/api/login', json=CREDENTIALS).status_code == 200
+    assert app_client.post('/api/logout?all=1').status_code == 200
+    assert other.get('/api/dashboard').status_code == 401
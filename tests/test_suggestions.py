@@ -0,0 +1,79 @@
+import pytest
+import ai_service
+import limits
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ai_service.SuggestionCache(persist=False)
+    monkeypatch.setattr(ai_service, 'suggestion_cache', cache)
+    return cache
+
+@pytest.fixture
+def refills(monkeypatch):
+    """Keys whose refill was scheduled, without running any"""
+    scheduled = []
+    monkeypatch.setattr(ai_service._refill_executor, 'submit', lambda func, key: scheduled.append(key))
+    monkeypatch.setattr(ai_service, '_refilling', set())
+    return scheduled
+
+def test_suggestion_key_only_for_known_moods_with_clamped_intensity():
+    assert ai_service.suggestion_key(' Happy ', '7') == ('happy', 7)
+    assert ai_service.suggestion_key('sad', 99) == ('sad', 10)
+    assert ai_service.suggestion_key('sad', -3) == ('sad', 1)
+    assert ai_service.suggestion_key('made-up mood 1234', 5) is None
+    assert ai_service.suggestion_key('sad', 'lots') is None
+
+def test_unknown_mood_is_never_cached_or_refilled(cache, refills):
+    assert ai_service.get_cached_suggestion('made-up mood', 5) is None
+    assert refills == []
+    assert cache.stats()['keys'] == 0
+
+def test_miss_does_not_schedule_a_refill(cache, refills):
+    assert ai_service.get_cached_suggestion('sad', 5) is None
+    assert refills == []
+
+def test_hit_refills_within_the_user_budget(cache, refills, monkeypatch):
+    cache.add(('sad', 5), 'Go for a short walk.', save=False)
+    assert ai_service.get_cached_suggestion('sad', 5) == 'Go for a short walk.'
+    assert refills == []
+
+    monkeypatch.setattr(limits, 'admit_user', lambda user_id: (False, 30.0))
+    assert not ai_service.refill_suggestions(1, 'sad', 5)
+    assert refills == []
+
+    monkeypatch.setattr(limits, 'admit_user', lambda user_id: (True, 0.0))
+    assert ai_service.refill_suggestions(1, 'sad', 5)
+    assert refills == [('sad', 5)]
+
+def test_job_path_seeds_the_cache_without_a_refill(cache, refills, monkeypatch):
+    monkeypatch.setattr(ai_service, '_request_suggestion', lambda mood_type, intensity, **options: 'Breathe.')
+    assert ai_service.get_personalized_suggestion('sad', 5) == 'Breathe.'
+    assert ai_service.get_cached_suggestion('sad', 5) == 'Breathe.'
+    assert refills == []
+
+def test_refill_calls_are_shed_by_the_global_budget(cache, monkeypatch):
+    class Exhausted:
+        blocking = False
+
+        def acquire(self, key=''):
+            return False, 1.0
+
+    posts = []
+    monkeypatch.setattr(limits, 'global_llm', Exhausted())
+    monkeypatch.setattr(ai_service.client, '_post', lambda *args, **kwargs: posts.append(args))
+    ai_service._refill_suggestions(('sad', 5))
+    assert posts == []
+    assert cache.needs_refill(('sad', 5))
+
+def test_refill_makes_one_upstream_call_per_charged_token(cache, monkeypatch):
+    calls = []
+
+    def request(mood_type, intensity, **options):
+        calls.append(mood_type)
+        return f'Suggestion {len(calls)}.'
+
+    monkeypatch.setattr(ai_service, '_request_suggestion', request)
+    for expected in range(1, cache.variants + 2):
+        ai_service._refill_suggestions(('sad', 5))
+        assert len(calls) == min(expected, cache.variants)
+    assert not cache.needs_refill(('sad', 5))
@@ -0,0 +1,82 @@
+import io
+import json
+import transfer
+
+MOODS_CSV = '''timestamp,mood_type,intensity,notes
+2024-01-02T08:00:00,calm,6,morning tea
+2024-01-01T21:30:00+00:00,sad,3,
+not a date,happy,5,
+2024-01-03T09:00:00,,4,
+2024-01-04T09:00:00,angry,11,
+2024-01-05T09:00:00,tired,x,
+'''
+
+JOURNAL_NDJSON = '''{"timestamp": "2024-02-01T10:00:00", "content": "first entry", "mood_tags": ["calm", "hopeful"]}
+{"timestamp": "2024-02-02T10:00:00", "content": "second, with a comma"}
+not json
+
+{"timestamp": "2024-02-03T10:00:00", "content": "   "}
+["a", "list"]
+{"timestamp": "2024-02-04T10:00:00", "content": "bad tags", "mood_tags": 7}
+'''
+
+def _import(user_id, kind, text, fmt, batch_size=transfer.IMPORT_BATCH_SIZE):
+    return list(transfer.import_records(user_id, kind, io.StringIO(text), fmt, batch_size))[-1]
+
+def _export(user_id, kind, fmt):
+    return ''.join(transfer.export_records(user_id, kind, fmt))
+
+def _clear(db, user_id, kind):
+    conn = db.get_db_connection()
+    conn.execute(f"DELETE FROM {'moods' if kind == 'moods' else 'journal_entries'} WHERE user_id = ?",
+                 (user_id,))
+    conn.commit()
+
+def test_csv_import_reports_each_bad_line(db):
+    user_id = db.create_user('importer', 'importer@example.com', 'secret123')
+    summary = _import(user_id, 'moods', MOODS_CSV, 'csv')
+    assert summary['imported'] == 2
+    assert summary['skipped'] == 4
+    assert [error['line'] for error in summary['errors']] == [4, 5, 6, 7]
+    assert 'invalid timestamp' in summary['errors'][0]['error']
+    assert 'mood_type is required' in summary['errors'][1]['error']
+    assert 'between 1 and 10' in summary['errors'][2]['error']
+    assert 'invalid intensity' in summary['errors'][3]['error']
+    assert sorted(mood['mood_type'] for mood in db.iter_moods(user_id)) == ['calm', 'sad']
+
+def test_ndjson_import_reports_each_bad_line(db):
+    user_id = db.create_user('importer', 'importer@example.com', 'secret123')
+    summary = _import(user_id, 'journal', JOURNAL_NDJSON, 'ndjson')
+    assert summary['imported'] == 2
+    assert [(error['line'], error['error']) for error in summary['errors']] == [
+        (3, 'malformed record'), (5, 'content is required'), (6, 'malformed record'),
+        (7, 'mood_tags must be a list'),
+    ]
+
+def test_import_commits_in_batches(db):
+    user_id = db.create_user('importer', 'importer@example.com', 'secret123')
+    lines = 'timestamp,mood_type,intensity\n' + ''.join(
+        f'2024-03-{day:02d}T12:00:00,calm,5\n' for day in range(1, 6))
+    # The summary is a running total, so read it as each batch commits
+    progress = [summary['imported'] for summary in
+                transfer.import_records(user_id, 'moods', io.StringIO(lines), 'csv', batch_size=2)]
+    assert progress == [2, 4, 5]
+
+def test_export_round_trips(db):
+    source = db.create_user('source', 'source@example.com', 'secret123')
+    target = db.create_user('target', 'target@example.com', 'secret123')
+    _import(source, 'moods', MOODS_CSV, 'csv')
+    _import(source, 'journal', JOURNAL_NDJSON, 'ndjson')
+
+    for kind in ('moods', 'journal'):
+        for fmt in ('csv', 'ndjson'):
+            exported = _export(source, kind, fmt)
+            assert _import(target, kind, exported, fmt)['skipped'] == 0
+            assert _export(target, kind, fmt) == exported
+            _clear(db, target, kind)
+
+    rows = [json.loads(line) for line in _export(source, 'journal', 'ndjson').splitlines()]
+    assert rows == [
+        {'timestamp': '2024-02-01T10:00:00', 'content': 'first entry', 'mood_tags': ['calm', 'hopeful']},
+        {'timestamp': '2024-02-02T10:00:00', 'content': 'second, with a comma', 'mood_tags': []},
+    ]
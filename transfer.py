@@ -0,0 +1,250 @@
+import contextlib
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+import database
+
+# Rows per executemany transaction during an import
+IMPORT_BATCH_SIZE = 10000
+
+# Rows per chunk handed to the response during an export
+EXPORT_CHUNK_SIZE = 1000
+
+# Invalid rows described in the import summary; later ones are only counted
+MAX_REPORTED_ERRORS = 20
+
+FORMATS = ('csv', 'ndjson')
+
+# ===================================
+# Streaming import / export of mood and journal history
+#
+#     python transfer.py import moods daylio.csv --user alice
+#     python transfer.py export journal --user alice --format ndjson -o journal.ndjson
+#
+# Everything is a generator: input is parsed line by line, validated and
+# written IMPORT_BATCH_SIZE rows per transaction, and exports are streamed
+# from a database cursor, so memory stays flat for any file size.
+# ===================================
+
+class ImportRowError(ValueError):
+    """A record that cannot be imported"""
+
+# ===================================
+# Validation
+# ===================================
+
+def parse_timestamp(value):
+    """Normalize an ISO 8601 timestamp to the naive local form stored in the database"""
+    if not value:
+        raise ImportRowError("timestamp is required")
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ImportRowError(f"invalid timestamp: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+def validate_mood(record):
+    """Return a (timestamp, mood_type, intensity, notes) row"""
+    mood_type = str(record.get('mood_type') or '').strip()
+    if not mood_type:
+        raise ImportRowError("mood_type is required")
+
+    try:
+        intensity = int(record.get('intensity', 5))
+    except (TypeError, ValueError):
+        raise ImportRowError(f"invalid intensity: {record.get('intensity')!r}")
+    if not 1 <= intensity <= 10:
+        raise ImportRowError(f"intensity must be between 1 and 10, got {intensity}")
+
+    return parse_timestamp(record.get('timestamp')), mood_type, intensity, record.get('notes') or ''
+
+def validate_journal_entry(record):
+    """Return a (timestamp, content, mood_tags_json) row"""
+    content = record.get('content') or ''
+    if not isinstance(content, str) or not content.strip():
+        raise ImportRowError("content is required")
+
+    # A list in NDJSON; a JSON array or comma-separated string in CSV
+    tags = record.get('mood_tags') or []
+    if isinstance(tags, str):
+        tags = tags.strip()
+        if tags.startswith('['):
+            try:
+                tags = json.loads(tags)
+            except ValueError:
+                raise ImportRowError(f"invalid mood_tags: {tags!r}")
+        else:
+            tags = [tag.strip() for tag in tags.split(',') if tag.strip()]
+    if not isinstance(tags, list):
+        raise ImportRowError("mood_tags must be a list")
+
+    return parse_timestamp(record.get('timestamp')), content, json.dumps(tags) if tags else None
+
+# kind -> (export columns, validator, batch writer, exporter)
+KINDS = {
+    'moods': (
+        ('timestamp', 'mood_type', 'intensity', 'notes'),
+        validate_mood, database.insert_moods_batch, database.iter_moods,
+    ),
+    'journal': (
+        ('timestamp', 'content', 'mood_tags'),
+        validate_journal_entry, database.insert_journal_batch, database.iter_journal_entries,
+    ),
+}
+
+def get_kind(kind):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown data kind: {kind}")
+    return KINDS[kind]
+
+def guess_format(filename, default='csv'):
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return default
+
+# ===================================
+# Import
+# ===================================
+
+def read_records(lines, fmt):
+    """Yield (line_number, record) pairs; record is None for unparseable lines"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+def import_records(user_id, kind, lines, fmt='csv', batch_size=IMPORT_BATCH_SIZE):
+    """Import records from an iterable of text lines.
+
+    A generator: yields the running summary ({'imported', 'skipped', 'errors'})
+    after every committed batch, the last one being final. Invalid rows are
+    skipped and reported; batches already committed stay committed.
+    """
+    _, validate, write_batch, _ = get_kind(kind)
+    summary = {'imported': 0, 'skipped': 0, 'errors': []}
+    batch = []
+
+    for line_number, record in read_records(lines, fmt):
+        try:
+            if record is None:
+                raise ImportRowError("malformed record")
+            batch.append(validate(record))
+        except ImportRowError as e:
+            summary['skipped'] += 1
+            if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                summary['errors'].append({'line': line_number, 'error': str(e)})
+            continue
+
+        if len(batch) >= batch_size:
+            summary['imported'] += write_batch(user_id, batch)
+            batch = []
+            yield summary
+
+    if batch:
+        summary['imported'] += write_batch(user_id, batch)
+    yield summary
+
+# ===================================
+# Export
+# ===================================
+
+def export_records(user_id, kind, fmt='csv'):
+    """Yield a user's history as CSV or NDJSON text chunks"""
+    columns, _, _, exporter = get_kind(kind)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+
+    for count, row in enumerate(exporter(user_id, EXPORT_CHUNK_SIZE), 1):
+        if kind == 'journal':
+            row['mood_tags'] = json.loads(row['mood_tags']) if row['mood_tags'] else []
+        if writer:
+            if kind == 'journal':
+                row['mood_tags'] = ','.join(row['mood_tags'])
+            writer.writerow([row[column] for column in columns])
+        else:
+            buffer.write(json.dumps({column: row[column] for column in columns}) + '\n')
+
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# ===================================
+# Command Line
+# ===================================
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Import or export Mindi mood and journal history')
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path', nargs='?', default='-', help="input file for import ('-' for stdin)")
+    parser.add_argument('--user', required=True, help='username to import into / export from')
+    parser.add_argument('--format', choices=FORMATS, help='defaults to the file extension, else csv')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument('-o', '--output', default='-', help="export destination ('-' for stdout)")
+    parser.add_argument('--db', help='database file (defaults to database.DATABASE_NAME)')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.DATABASE_NAME = args.db
+    # Keep stdout clean for exports piped elsewhere
+    with contextlib.redirect_stdout(sys.stderr):
+        database.init_db()
+
+    user = database.get_user_by_username(args.user)
+    if user is None:
+        parser.error(f"no such user: {args.user}")
+
+    try:
+        if args.action == 'import':
+            fmt = args.format or guess_format(args.path)
+            source = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8-sig')
+            try:
+                for summary in import_records(user['id'], args.kind, source, fmt, args.batch_size):
+                    print(f"\rimported {summary['imported']:,}, skipped {summary['skipped']:,}",
+                          end='', file=sys.stderr, flush=True)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            print(file=sys.stderr)
+            for error in summary['errors']:
+                print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+        else:
+            fmt = args.format or guess_format(args.output)
+            target = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+            try:
+                for chunk in export_records(user['id'], args.kind, fmt):
+                    target.write(chunk)
+            finally:
+                if target is not sys.stdout:
+                    target.close()
+    finally:
+        database.close_db_connection()
+
+if __name__ == '__main__':
+    main()